@@ -0,0 +1,390 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import platform
+import sys
+import time
+from collections import OrderedDict
+from limesurveyrc2api import __version__
+from limesurveyrc2api._concurrency import bounded_map
+from limesurveyrc2api.limesurvey import LimeSurvey
+from limesurveyrc2api.testing import RemoteControl, StandInServer
+from limesurveyrc2api.transport import HTTPTransport
+
+try:
+    import resource
+except ImportError:  # Windows.
+    resource = None
+
+# Work done per run, for a full benchmark or a quick check.
+SIZES = {
+    "full": {"calls": 2000, "pages": 200, "page_size": 100, "rows": 10000,
+             "chunk_size": 500, "listing": 100000, "repeat": 3},
+    "quick": {"calls": 50, "pages": 5, "page_size": 50, "rows": 200,
+              "chunk_size": 50, "listing": 2000, "repeat": 1},
+}
+BENCHMARKS = ("query", "list_participants", "add_participants", "listing_rss")
+# Transports: pooled keep-alive connections, a new connection per request,
+# JSON-RPC batch requests, or the asyncio client.
+TRANSPORTS = ("pooled", "no_keep_alive", "batch", "async")
+WORKERS = (1, 8)
+# Decoding of listings: a list, a ResultStream, or a ParticipantTable.
+DECODINGS = ("list", "stream", "table")
+
+
+def _client(url, transport="pooled", workers=1):
+    """
+    Open a client for a benchmark, with a session key per worker.
+    """
+    api = LimeSurvey(url, "admin", transport=HTTPTransport(
+        pool_maxsize=max(workers, 10),
+        keep_alive=transport != "no_keep_alive"))
+    api.open("admin", sessions=workers)
+    return api
+
+
+def _timed(func, repeat):
+    """
+    Run func repeat times.
+
+    Return
+    :return: list of the seconds taken by each run.
+    """
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        runs.append(time.perf_counter() - start)
+    return runs
+
+
+def _rate(benchmark, mode, unit, count, runs):
+    best = min(runs)
+    return OrderedDict([
+        ("benchmark", benchmark), ("mode", mode), ("unit", unit),
+        ("count", count), ("seconds", runs),
+        ("value", count / best if best else None)])
+
+
+def _peak_rss():
+    """Peak resident set size of this process in bytes, or None."""
+    # On Linux, ru_maxrss of a process started by fork and exec includes the
+    # parent's peak, so VmHWM (the peak since exec) is used where available.
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def bench_query(url, sizes, transport, workers):
+    """
+    Calls per second of LimeSurvey.query, for a small result.
+    """
+    calls = sizes["calls"]
+    if transport == "async":
+        return _async_query(url, calls, workers, sizes["repeat"])
+    api = _client(url, transport, workers)
+    params = OrderedDict([("sSessionKey", api.session_key)])
+
+    def call(_):
+        return api.query("list_surveys", params)
+
+    def run():
+        if transport == "batch":
+            with api.batch(max_size=100, max_workers=workers) as batch:
+                pending = [batch.survey.list_surveys()
+                           for _ in range(calls)]
+            for x in pending:
+                x.result()
+        elif workers == 1:
+            for i in range(calls):
+                call(i)
+        else:
+            for _ in bounded_map(call, range(calls), max_workers=workers):
+                pass
+    try:
+        runs = _timed(run, sizes["repeat"])
+    finally:
+        api.close()
+    return _rate("query", {"transport": transport, "workers": workers},
+                 "calls/s", calls, runs)
+
+
+def _async_query(url, calls, workers, repeat):
+    from limesurveyrc2api.aio import AsyncLimeSurvey
+
+    async def main():
+        api = AsyncLimeSurvey(url, "admin")
+        await api.open("admin")
+        params = OrderedDict([("sSessionKey", api.session_key)])
+        semaphore = asyncio.Semaphore(workers)
+
+        async def call():
+            async with semaphore:
+                return await api.query("list_surveys", params)
+        runs = []
+        try:
+            for _ in range(repeat):
+                start = time.perf_counter()
+                await asyncio.gather(*[call() for _ in range(calls)])
+                runs.append(time.perf_counter() - start)
+        finally:
+            await api.close()
+        return runs
+    runs = asyncio.run(main())
+    return _rate("query", {"transport": "async", "workers": workers},
+                 "calls/s", calls, runs)
+
+
+def bench_list_participants(url, survey_id, sizes, decoding, workers):
+    """
+    Pages per second of list_participants, fetched one after another (1
+    worker, with iter_participants) or concurrently (export_participants or
+    export_participants_table).
+    """
+    pages, page_size = sizes["pages"], sizes["page_size"]
+    api = _client(url, workers=workers)
+    token = api.token
+
+    def run():
+        if decoding == "table":
+            table = token.export_participants_table(
+                survey_id, page_size=page_size, max_workers=workers)
+            count = len(table)
+        elif workers == 1:
+            count = sum(1 for _ in token.iter_participants(
+                survey_id, page_size=page_size,
+                stream=decoding == "stream"))
+        else:
+            count = sum(1 for _ in token.export_participants(
+                survey_id, page_size=page_size, max_workers=workers))
+        assert count == pages * page_size, count
+    try:
+        runs = _timed(run, sizes["repeat"])
+    finally:
+        api.close()
+    return _rate(
+        "list_participants", {"decoding": decoding, "workers": workers},
+        "pages/s", pages, runs)
+
+
+def bench_add_participants(url, remote_control, sizes, workers):
+    """
+    Rows per second of add_participants_bulk, into a new survey each run.
+    """
+    rows, chunk_size = sizes["rows"], sizes["chunk_size"]
+    data = [{"email": "p{0}@example.com".format(i), "firstname": "P",
+             "lastname": str(i)} for i in range(rows)]
+    api = _client(url, workers=workers)
+
+    def run():
+        survey = remote_control.add_survey()
+        result = api.token.add_participants_bulk(
+            survey.sid, data, chunk_size=chunk_size, max_workers=workers)
+        assert result.ok, result.errors
+    try:
+        runs = _timed(run, sizes["repeat"])
+    finally:
+        api.close()
+    return _rate("add_participants", {"workers": workers}, "rows/s", rows,
+                 runs)
+
+
+def _measure_listing(url, survey_id, rows, decoding):
+    """
+    Get a listing of rows participants in one call, in this process.
+
+    Return
+    :return: (number of participants, peak RSS before, peak RSS after).
+    """
+    api = _client(url)
+    try:
+        before = _peak_rss()
+        token = api.token
+        if decoding == "stream":
+            count = sum(1 for _ in token.list_participants(
+                survey_id, limit=rows, stream=True))
+        elif decoding == "table":
+            count = len(token.export_participants_table(
+                survey_id, page_size=rows, max_workers=1))
+        else:
+            count = len(token.list_participants(survey_id, limit=rows))
+        return count, before, _peak_rss()
+    finally:
+        api.close()
+
+
+def bench_listing_rss(url, survey_id, sizes, decoding):
+    """
+    Peak RSS growth while getting a large listing in one call. Each listing
+    runs in a new process (without the server's data), since the peak RSS
+    of a process never goes down.
+    """
+    if _peak_rss() is None:
+        return None
+    rows = sizes["listing"]
+    with multiprocessing.get_context("spawn").Pool(1) as pool:
+        count, before, after = pool.apply(
+            _measure_listing, (url, survey_id, rows, decoding))
+    assert count == rows, count
+    return OrderedDict([
+        ("benchmark", "listing_rss"), ("mode", {"decoding": decoding}),
+        ("unit", "bytes"), ("count", rows), ("peak_rss", after),
+        ("value", after - before)])
+
+
+def run_benchmarks(size="full", benchmarks=BENCHMARKS, latency=0,
+                   progress=None):
+    """
+    Run the benchmarks against a StandInServer.
+
+    Parameters
+    :param size: Key of SIZES, for the amount of work per run.
+    :type size: String
+    :param benchmarks: Names of the benchmarks to run.
+    :type benchmarks: Iterable[String]
+    :param latency: Seconds the server waits before each response.
+    :type latency: Float
+    :param progress: Function to call with each result as it is measured.
+    :type progress: Callable[[Dict], None]
+
+    Return
+    :return: dict of "meta" (environment) and "results" (one dict per
+      benchmark and mode, with the "value" measured in its "unit").
+    """
+    sizes = SIZES[size]
+    remote_control = RemoteControl()
+    listed = remote_control.add_survey(
+        participants=sizes["pages"] * sizes["page_size"])
+    large = remote_control.add_survey(participants=sizes["listing"])
+    results = []
+    with StandInServer(remote_control, latency=latency, batch=True) as server:
+        url = server.url
+        cases = []
+        if "query" in benchmarks:
+            cases += [(bench_query, (url, sizes, transport, workers))
+                      for transport in TRANSPORTS for workers in WORKERS]
+        if "list_participants" in benchmarks:
+            cases += [(bench_list_participants,
+                       (url, listed.sid, sizes, decoding, workers))
+                      for decoding in DECODINGS for workers in WORKERS
+                      if not (decoding == "stream" and 1 < workers)]
+        if "add_participants" in benchmarks:
+            cases += [(bench_add_participants,
+                       (url, remote_control, sizes, workers))
+                      for workers in WORKERS]
+        if "listing_rss" in benchmarks:
+            cases += [(bench_listing_rss, (url, large.sid, sizes, decoding))
+                      for decoding in DECODINGS]
+        for func, args in cases:
+            result = func(*args)
+            if result is None:
+                continue
+            results.append(result)
+            if progress is not None:
+                progress(result)
+    meta = OrderedDict([
+        ("version", __version__),
+        ("python", platform.python_version()),
+        ("platform", platform.platform()),
+        ("cpus", os.cpu_count()),
+        ("time", time.strftime("%Y-%m-%dT%H:%M:%S%z")),
+        ("size", size), ("latency", latency)])
+    return OrderedDict([("meta", meta), ("results", results)])
+
+
+def _key(result):
+    return result["benchmark"], tuple(sorted(result["mode"].items()))
+
+
+def compare(results, baseline, tolerance=0.2):
+    """
+    Find the results that are worse than in a baseline run: a rate lower, or
+    a memory use higher, by more than the tolerance.
+
+    Parameters
+    :param results: Results of run_benchmarks.
+    :type results: Dict
+    :param baseline: Results of an earlier run_benchmarks.
+    :type baseline: Dict
+    :param tolerance: Fraction of the baseline value allowed as noise.
+    :type tolerance: Float
+
+    Return
+    :return: list of (result, baseline value) for each regression.
+    """
+    old = {_key(x): x["value"] for x in baseline["results"]}
+    regressions = []
+    for result in results["results"]:
+        value, before = result["value"], old.get(_key(result))
+        if value is None or not before:
+            continue
+        if result["unit"] == "bytes":
+            worse = before * (1 + tolerance) < value
+        else:
+            worse = value < before * (1 - tolerance)
+        if worse:
+            regressions.append((result, before))
+    return regressions
+
+
+def _describe(result):
+    mode = ", ".join("{0}={1}".format(k, v)
+                     for k, v in sorted(result["mode"].items()))
+    return "{0} ({1})".format(result["benchmark"], mode)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Benchmark the client against a local stand-in server.")
+    parser.add_argument("--quick", action="store_true",
+                        help="Run a small amount of work, as a check.")
+    parser.add_argument("--benchmark", action="append", choices=BENCHMARKS,
+                        help="Benchmark to run (default all); repeatable.")
+    parser.add_argument("--latency", type=float, default=0,
+                        help="Server latency per response, in seconds.")
+    parser.add_argument("--output", help="File to write the JSON results to.")
+    parser.add_argument("--baseline",
+                        help="JSON results of an earlier run to compare to.")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Fraction worse than the baseline allowed.")
+    args = parser.parse_args(argv)
+
+    def progress(result):
+        print("{0}: {1:.1f} {2}".format(
+            _describe(result), result["value"], result["unit"]),
+            file=sys.stderr)
+    results = run_benchmarks(
+        size="quick" if args.quick else "full",
+        benchmarks=args.benchmark or BENCHMARKS, latency=args.latency,
+        progress=progress)
+    text = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for result, before in regressions:
+            print("Regression: {0}: {1:.1f} {2}, was {3:.1f}".format(
+                _describe(result), result["value"], result["unit"], before),
+                file=sys.stderr)
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,286 @@
+import asyncio
+import threading
+import time
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.tracing import start_span
+from limesurveyrc2api._concurrency import (
+    async_bounded_map, bounded_map, chunked)
+
+# LimeSurveyError statuses from query for a failed HTTP exchange, rather than
+# an error status returned by the API method.
+HTTP_ERROR_STATUSES = ("Not response.ok", "Not 0 < len(response.content)")
+
+# HTTP status codes for a request refused as too large, before it was run.
+TOO_LARGE_STATUS_CODES = (413, 414, 431)
+
+
+def is_payload_failure(error):
+    """
+    Check if an error could have been caused by a too large request.
+
+    That is, a HTTP error (e.g. post_max_size or PHP memory limit exceeded),
+    a connection error or timeout, or an unparseable (e.g. truncated) body,
+    but not an error status returned by the API method.
+
+    Parameters
+    :param error: Exception raised by the request.
+    :type error: Exception
+    """
+    if isinstance(error, LimeSurveyError):
+        return error.status in HTTP_ERROR_STATUSES
+    return isinstance(error, (OSError, ValueError, asyncio.TimeoutError))
+
+
+def is_unprocessed_failure(error, is_connect_error=None):
+    """
+    Check if an error shows the request was not run, so it can be resent.
+
+    That is, the connection could not be made, or the server refused the
+    request as too large (e.g. HTTP 413). Other failures, like a HTTP 500 or
+    a read timeout, may happen after the server has run the request, so
+    resending could e.g. add the same participants twice.
+
+    Parameters
+    :param error: Exception raised by the request.
+    :type error: Exception
+    :param is_connect_error: Function to check if a transport error happened
+      while connecting, e.g. transport.is_connect_error.
+    :type is_connect_error: Callable
+
+    Return
+    :return: Bool
+    """
+    if isinstance(error, LimeSurveyError):
+        # Args are (method, status, status_code, content) for HTTP errors.
+        status_code = error.args[2] if 2 < len(error.args) else None
+        return (error.status == "Not response.ok" and
+                status_code in TOO_LARGE_STATUS_CODES)
+    return is_connect_error is not None and is_connect_error(error)
+
+
+class BulkResult(object):
+    """
+    Outcome of a chunked bulk operation, which may have partly failed.
+
+    Attributes
+    :ivar results: Result items from all the chunks that succeeded, or the
+      result dict of each chunk, for methods that return a dict.
+    :type results: List
+    :ivar errors: One dict per failed chunk, with keys "chunk" (chunk index),
+      "start" (input index of the chunk's first item), "items" (the chunk's
+      input items, to retry with) and "error" (the exception raised).
+    :type errors: List[Dict]
+    :ivar skipped: Number of input items that were not sent, e.g. because
+      they were duplicates.
+    :type skipped: Integer
+    """
+
+    def __init__(self):
+        self.results = []
+        self.errors = []
+        self.skipped = 0
+
+    def add_result(self, response):
+        if isinstance(response, list):
+            self.results.extend(response)
+        else:
+            self.results.append(response)
+
+    def add_error(self, index, start, items, error):
+        self.errors.append({
+            "chunk": index, "start": start, "items": items, "error": error})
+
+    @property
+    def ok(self):
+        """True if no chunk failed."""
+        return not self.errors
+
+    @property
+    def tokens(self):
+        """Mapping of token ID to token key, for participant results."""
+        return {
+            x["tid"]: x["token"] for x in self.results
+            if isinstance(x, dict) and "tid" in x}
+
+
+class AdaptiveChunkSize(object):
+    """
+    Chunk size which adapts to the observed latency and failures of calls.
+
+    The size grows while calls with a full size chunk complete within the
+    target latency, shrinks towards the target when calls are slower, and is
+    halved when a call fails in a way that may be due to the request size.
+    The current value (size) can be read to find a setting for a server.
+
+    Parameters
+    :param initial: Chunk size to start from.
+    :type initial: Integer
+    :param minimum: Smallest chunk size to shrink to.
+    :type minimum: Integer
+    :param maximum: Largest chunk size to grow to.
+    :type maximum: Integer
+    :param target_latency: Seconds a call should take at most.
+    :type target_latency: Float
+    :param growth: Factor to grow the size by after a fast call.
+    :type growth: Float
+    """
+
+    def __init__(self, initial=100, minimum=1, maximum=10000,
+                 target_latency=5.0, growth=1.5):
+        self.size = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.target_latency = target_latency
+        self.growth = growth
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        return self.size
+
+    def record_success(self, size, elapsed):
+        """
+        Adjust the size after a call with a chunk of size took elapsed secs.
+        """
+        with self._lock:
+            if elapsed > self.target_latency:
+                scaled = int(size * self.target_latency / elapsed)
+                self.size = max(self.minimum, min(self.size, scaled))
+            elif size >= self.size:
+                grown = max(size + 1, int(size * self.growth))
+                self.size = min(self.maximum, grown)
+
+    def record_failure(self, size):
+        """
+        Adjust the size after a call with a chunk of size failed.
+        """
+        with self._lock:
+            self.size = max(self.minimum, min(self.size, size // 2))
+
+
+def _send_chunk(call, chunk, start, sizer, is_connect_error=None):
+    """
+    Call with a chunk, splitting and resending it if it was refused as too
+    large, or shrinking the size for later chunks if it may have been.
+
+    Return
+    :return: list of (start, items, response, error) for each sent part.
+    """
+    began = time.monotonic()
+    try:
+        response = call(chunk)
+    except Exception as e:
+        if sizer is None or not is_payload_failure(e):
+            return [(start, chunk, None, e)]
+        sizer.record_failure(len(chunk))
+        if len(chunk) == 1 or not is_unprocessed_failure(e, is_connect_error):
+            return [(start, chunk, None, e)]
+        middle = len(chunk) // 2
+        return (
+            _send_chunk(call, chunk[:middle], start, sizer, is_connect_error) +
+            _send_chunk(
+                call, chunk[middle:], start + middle, sizer, is_connect_error))
+    if sizer is not None:
+        sizer.record_success(len(chunk), time.monotonic() - began)
+    return [(start, chunk, response, None)]
+
+
+async def _send_chunk_async(call, chunk, start, sizer, is_connect_error=None):
+    """
+    Async version of _send_chunk, for a coroutine function.
+    """
+    began = time.monotonic()
+    try:
+        response = await call(chunk)
+    except Exception as e:
+        if sizer is None or not is_payload_failure(e):
+            return [(start, chunk, None, e)]
+        sizer.record_failure(len(chunk))
+        if len(chunk) == 1 or not is_unprocessed_failure(e, is_connect_error):
+            return [(start, chunk, None, e)]
+        middle = len(chunk) // 2
+        return (
+            await _send_chunk_async(
+                call, chunk[:middle], start, sizer, is_connect_error) +
+            await _send_chunk_async(
+                call, chunk[middle:], start + middle, sizer, is_connect_error))
+    if sizer is not None:
+        sizer.record_success(len(chunk), time.monotonic() - began)
+    return [(start, chunk, response, None)]
+
+
+def _chunk_attributes(index, start, chunk):
+    return {"chunk.index": index, "chunk.start": start,
+            "chunk.size": len(chunk)}
+
+
+def run_bulk(call, items, chunk_size, max_workers, result=None,
+             is_connect_error=None):
+    """
+    Call with chunks of items on a bounded thread pool, collecting results.
+
+    If there's a span in progress (see tracing), each chunk is sent in a
+    "chunk" span nested under it.
+
+    Parameters
+    :param call: Function to call with each chunk (a list of items).
+    :type call: Callable
+    :param items: Items to split into chunks, read lazily.
+    :type items: Iterable
+    :param chunk_size: Fixed number of items per chunk, or an
+      AdaptiveChunkSize to adjust it as calls complete.
+    :type chunk_size: Integer or AdaptiveChunkSize
+    :param max_workers: Maximum number of chunks to send at once.
+    :type max_workers: Integer
+    :param result: Result to add to, or None for a new one.
+    :type result: BulkResult
+    :param is_connect_error: Function to check if a transport error happened
+      while connecting, so an adaptive chunk can be split and resent.
+    :type is_connect_error: Callable
+
+    Return
+    :return: BulkResult
+    """
+    sizer = chunk_size if isinstance(chunk_size, AdaptiveChunkSize) else None
+
+    def send(item):
+        index, start, chunk = item
+        with start_span("chunk", _chunk_attributes(index, start, chunk)):
+            return index, _send_chunk(
+                call, chunk, start, sizer, is_connect_error)
+
+    if result is None:
+        result = BulkResult()
+    chunks = chunked(items, chunk_size)
+    for index, parts in bounded_map(send, chunks, max_workers, ordered=False):
+        for start, chunk, response, error in parts:
+            if error is None:
+                result.add_result(response)
+            else:
+                result.add_error(index, start, chunk, error)
+    return result
+
+
+async def run_bulk_async(call, items, chunk_size, max_workers, result=None,
+                         is_connect_error=None):
+    """
+    Async version of run_bulk, for a coroutine function.
+    """
+    sizer = chunk_size if isinstance(chunk_size, AdaptiveChunkSize) else None
+
+    async def send(item):
+        index, start, chunk = item
+        with start_span("chunk", _chunk_attributes(index, start, chunk)):
+            return index, await _send_chunk_async(
+                call, chunk, start, sizer, is_connect_error)
+
+    if result is None:
+        result = BulkResult()
+    chunks = chunked(items, chunk_size)
+    async for index, parts in async_bounded_map(
+            send, chunks, max_workers, ordered=False):
+        for start, chunk, response, error in parts:
+            if error is None:
+                result.add_result(response)
+            else:
+                result.add_error(index, start, chunk, error)
+    return result
@@ -0,0 +1,64 @@
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api._stream import ResultStream
+
+
+def check_response(method, response, error_messages, response_type):
+    """
+    Check a RC2API result for an error status, or an unexpected type.
+
+    Parameters
+    :param method: Name of API method that was called.
+    :type method: String
+    :param response: Result of the API call.
+    :param error_messages: Status messages that mean the call failed.
+    :type error_messages: List[String]
+    :param response_type: Expected type(s) of a successful result.
+    :type response_type: Type or Tuple[Type]
+
+    Return
+    :return: the response, unchanged.
+    :raise: LimeSurveyError if the response status is an error message.
+    """
+    if type(response) is dict and "status" in response:
+        status = response["status"]
+        for message in error_messages:
+            if status == message:
+                raise LimeSurveyError(method, status)
+    else:
+        assert isinstance(response, response_type)
+    return response
+
+
+class _Component(object):
+    """Base for a group of RC2API methods, which queries through the api."""
+
+    def __init__(self, api):
+        self.api = api
+
+    def _query(self, method, params, error_messages, response_type):
+        cache = self.api.cache
+        if cache is not None and cache.caches(method):
+            hit, response = cache.get(method, params)
+            if hit:
+                return response
+        response = self.api.query(method=method, params=params)
+        check_response(method, response, error_messages, response_type)
+        if cache is not None:
+            cache.set(method, params, response)
+        return response
+
+    def _query_stream(self, method, params, error_messages):
+        """
+        Query a method that returns an array, decoding it as it is read.
+
+        Return
+        :return: iterator of the array elements.
+        """
+        response = self.api.query(method=method, params=params, stream=True)
+        if isinstance(response, ResultStream):
+            if response.kind == "array":
+                return response
+            response.close()
+            raise LimeSurveyError(method, "Unexpected result type")
+        check_response(method, response, error_messages, list)
+        return iter(response)
@@ -0,0 +1,99 @@
+import asyncio
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
+
+
+def chunked(iterable, size):
+    """
+    Yield (index, start, items) for consecutive chunks of an iterable.
+
+    The iterable is read lazily, one chunk at a time.
+
+    Parameters
+    :param iterable: Items to split into chunks.
+    :type iterable: Iterable
+    :param size: Maximum number of items per chunk, or a function returning
+      it, which is called for each chunk.
+    :type size: Integer or Callable
+    """
+    items = iter(iterable)
+    index = start = 0
+    while True:
+        chunk = list(islice(items, size() if callable(size) else size))
+        if not chunk:
+            return
+        yield index, start, chunk
+        index += 1
+        start += len(chunk)
+
+
+def bounded_map(func, iterable, max_workers=8, ordered=True):
+    """
+    Yield func(item) for each item, with up to max_workers calls in flight.
+
+    Items are taken from the iterable only as calls complete, so a lazy
+    iterable is never read more than max_workers items ahead. If a call
+    raises, the exception is raised to the caller and pending calls are
+    cancelled. Calls run in a copy of the caller's context, so they see its
+    context variables (e.g. the span in progress).
+
+    Parameters
+    :param func: Function to call with each item, from a worker thread.
+    :type func: Callable
+    :param iterable: Items to call func with.
+    :type iterable: Iterable
+    :param max_workers: Maximum number of concurrent calls.
+    :type max_workers: Integer
+    :param ordered: If True, yield results in the order of the items. If
+      False, yield results as soon as they complete.
+    :type ordered: Bool
+    """
+    items = iter(iterable)
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        pending = deque(
+            executor.submit(contextvars.copy_context().run, func, item)
+            for item in islice(items, max_workers))
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                done, not_done = wait(pending, return_when=FIRST_COMPLETED)
+                pending = deque(not_done)
+            for future in done:
+                for item in islice(items, 1):
+                    pending.append(executor.submit(
+                        contextvars.copy_context().run, func, item))
+                yield future.result()
+    finally:
+        executor.shutdown(wait=True, cancel_futures=True)
+
+
+async def async_bounded_map(func, iterable, max_workers=8, ordered=True):
+    """
+    Yield await func(item) for each item, with up to max_workers in flight.
+
+    Async generator version of bounded_map, for a coroutine function.
+    """
+    items = iter(iterable)
+    pending = deque(
+        asyncio.ensure_future(func(item))
+        for item in islice(items, max_workers))
+    try:
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+                await asyncio.wait(done)
+            else:
+                done, not_done = await asyncio.wait(
+                    pending, return_when=asyncio.FIRST_COMPLETED)
+                pending = deque(not_done)
+            for task in done:
+                for item in islice(items, 1):
+                    pending.append(asyncio.ensure_future(func(item)))
+                yield task.result()
+    finally:
+        for task in pending:
+            task.cancel()
@@ -0,0 +1,224 @@
+import base64
+import binascii
+import os
+from collections import OrderedDict
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.parsing import parse_responses_csv
+from limesurveyrc2api._component import _Component, check_response
+from limesurveyrc2api._stream import ResultStream
+from limesurveyrc2api.tracing import traced
+
+NO_RESPONSES = "No Response found for Token"
+EXPORT_ERROR_MESSAGES = [
+    "Invalid surveyid",
+    "Error: Invalid survey ID",
+    "No Data, survey table does not exist.",
+    "No Data, could not get max id.",
+    "Language code not found for this survey.",
+    NO_RESPONSES,
+    "No permission",
+    "Invalid session key",
+    "Invalid Session Key"
+]
+
+
+def write_base64(pieces, destination):
+    """
+    Decode base64 text pieces, writing the data as each piece is decoded.
+
+    Parameters
+    :param pieces: Base64 text, in pieces of any length.
+    :type pieces: Iterable[String]
+    :param destination: Path of file to write, or binary file to write to.
+    :type destination: String or File
+
+    Return
+    :return: Number of bytes written.
+    :raise: binascii.Error if the text is not valid base64.
+    """
+    if isinstance(destination, (str, os.PathLike)):
+        with open(destination, "wb") as output:
+            return write_base64(pieces, output)
+    written = 0
+    remainder = ""
+    for piece in pieces:
+        text = remainder + piece
+        cut = len(text) - len(text) % 4
+        remainder = text[cut:]
+        if cut:
+            data = base64.b64decode(text[:cut], validate=True)
+            destination.write(data)
+            written += len(data)
+    if remainder:
+        raise binascii.Error("Incomplete base64 data")
+    return written
+
+
+class _Responses(_Component):
+
+    def _export(self, method, params, destination):
+        """
+        Query an export method, and decode the base64 result.
+
+        If destination is given, the result is decoded while the response is
+        read, to bound memory use.
+        """
+        if destination is None:
+            response = self._query(method, params, EXPORT_ERROR_MESSAGES, str)
+            return base64.b64decode(response)
+        response = self.api.query(method=method, params=params, stream=True)
+        if isinstance(response, ResultStream):
+            try:
+                if response.kind == "string":
+                    return write_base64(response, destination)
+            finally:
+                response.close()
+            raise LimeSurveyError(method, "Unexpected result type")
+        return check_response(method, response, EXPORT_ERROR_MESSAGES, str)
+
+    def export_responses(
+            self, survey_id, document_type="csv", language_code=None,
+            completion_status="all", heading_type="code",
+            response_type="short", from_response_id=None,
+            to_response_id=None, fields=None, destination=None):
+        """
+        Export responses from the specified survey, as a file.
+
+        The RC2API returns the file base64 encoded. If a destination is
+        given, the file is decoded in chunks and written to it while the
+        response is read, so that only about one chunk is in memory at a time
+        (see _stream.STREAM_CHUNK_SIZE). Otherwise the file is returned.
+
+        Parameters
+        :param survey_id: ID of survey to export responses from.
+        :type survey_id: Integer
+        :param document_type: Format of the file: pdf, csv, xls, doc or json.
+        :type document_type: String
+        :param language_code: Language to export, or None for the default.
+        :type language_code: String
+        :param completion_status: Responses to export: "complete",
+          "incomplete" or "all".
+        :type completion_status: String
+        :param heading_type: Column headings: "code", "full" or "abbreviated".
+        :type heading_type: String
+        :param response_type: Answers: "short" (codes) or "long" (text).
+        :type response_type: String
+        :param from_response_id: First response ID to export, or None.
+        :type from_response_id: Integer
+        :param to_response_id: Last response ID to export, or None.
+        :type to_response_id: Integer
+        :param fields: Fields to export, or None for all.
+        :type fields: List[String]
+        :param destination: Path of file to write, or binary file to write
+          to, or None to return the file.
+        :type destination: String or File
+
+        Return
+        :return: the file as bytes, or if a destination is given, the number
+          of bytes written to it.
+        """
+        method = "export_responses"
+        params = OrderedDict([
+            ("sSessionKey", self.api.session_key),
+            ("iSurveyID", survey_id),
+            ("sDocumentType", document_type),
+            ("sLanguageCode", language_code),
+            ("sCompletionStatus", completion_status),
+            ("sHeadingType", heading_type),
+            ("sResponseType", response_type),
+            ("iFromResponseID", from_response_id),
+            ("iToResponseID", to_response_id),
+            ("aFields", fields)
+        ])
+        return self._export(method, params, destination)
+
+    def export_responses_by_token(
+            self, survey_id, token, document_type="csv", language_code=None,
+            completion_status="all", heading_type="code",
+            response_type="short", fields=None, destination=None):
+        """
+        Export the responses of a participant (by token), as a file.
+
+        See export_responses for the file and destination.
+
+        Parameters
+        :param survey_id: ID of survey to export responses from.
+        :type survey_id: Integer
+        :param token: Token of the participant to export responses for.
+        :type token: String
+        :param document_type: Format of the file: pdf, csv, xls, doc or json.
+        :type document_type: String
+        :param language_code: Language to export, or None for the default.
+        :type language_code: String
+        :param completion_status: Responses to export: "complete",
+          "incomplete" or "all".
+        :type completion_status: String
+        :param heading_type: Column headings: "code", "full" or "abbreviated".
+        :type heading_type: String
+        :param response_type: Answers: "short" (codes) or "long" (text).
+        :type response_type: String
+        :param fields: Fields to export, or None for all.
+        :type fields: List[String]
+        :param destination: Path of file to write, or binary file to write
+          to, or None to return the file.
+        :type destination: String or File
+
+        Return
+        :return: the file as bytes, or if a destination is given, the number
+          of bytes written to it.
+        """
+        method = "export_responses_by_token"
+        params = OrderedDict([
+            ("sSessionKey", self.api.session_key),
+            ("iSurveyID", survey_id),
+            ("sDocumentType", document_type),
+            ("sToken", token),
+            ("sLanguageCode", language_code),
+            ("sCompletionStatus", completion_status),
+            ("sHeadingType", heading_type),
+            ("sResponseType", response_type),
+            ("aFields", fields)
+        ])
+        return self._export(method, params, destination)
+
+    @traced
+    def export_responses_columns(
+            self, survey_id, path, completion_status="all",
+            from_response_id=None, to_response_id=None, fields=None,
+            max_workers=None):
+        """
+        Export responses to a CSV file, and parse it into typed columns.
+
+        The export is streamed to path, then parsed in chunks by a process
+        pool with parse_responses_csv, typing the columns from the survey's
+        list_questions.
+
+        Parameters
+        :param survey_id: ID of survey to export responses from.
+        :type survey_id: Integer
+        :param path: Path of the CSV file to write.
+        :type path: String
+        :param completion_status: Responses to export: "complete",
+          "incomplete" or "all".
+        :type completion_status: String
+        :param from_response_id: First response ID to export, or None.
+        :type from_response_id: Integer
+        :param to_response_id: Last response ID to export, or None.
+        :type to_response_id: Integer
+        :param fields: Fields to export, or None for all.
+        :type fields: List[String]
+        :param max_workers: Number of processes to parse with, or None for
+          the CPU count.
+        :type max_workers: Integer
+
+        Return
+        :return: OrderedDict of column name (question code): column values.
+        """
+        self.export_responses(
+            survey_id, document_type="csv",
+            completion_status=completion_status,
+            heading_type="code", response_type="short",
+            from_response_id=from_response_id, to_response_id=to_response_id,
+            fields=fields, destination=path)
+        questions = self.api.survey.list_questions(survey_id)
+        return parse_responses_csv(path, questions, max_workers=max_workers)
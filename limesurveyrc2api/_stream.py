@@ -0,0 +1,280 @@
+import codecs
+import json
+from limesurveyrc2api.exceptions import LimeSurveyError
+
+# Bytes to read from the response at a time when streaming.
+STREAM_CHUNK_SIZE = 64 * 1024
+WHITESPACE = " \t\n\r"
+
+
+class ResultStream(object):
+    """
+    Iterator over the elements of an array result, or the text of a string
+    result in pieces, decoded as the response is read.
+
+    The response is closed when the iterator is exhausted or closed. If
+    reading it failed, the error is kept in the error attribute.
+
+    Parameters
+    :param items: Iterator of the elements or pieces.
+    :type items: Generator
+    :param kind: Either "array" or "string".
+    :type kind: String
+    """
+
+    def __init__(self, items, kind):
+        self.kind = kind
+        self._items = items
+        self._on_close = []
+        self.error = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        try:
+            return next(self._items)
+        except StopIteration:
+            self.close()
+            raise
+        except BaseException as e:
+            self.error = e
+            self.close()
+            raise
+
+    def on_close(self, func):
+        """Call func when the stream is closed."""
+        self._on_close.append(func)
+
+    def close(self):
+        self._items.close()
+        while self._on_close:
+            self._on_close.pop()()
+
+
+class JSONStream(object):
+    """
+    Incremental reader of a JSON document, from chunks of bytes.
+
+    Only as many chunks are read as needed to parse the next token or value,
+    so that about one value (plus one chunk) of text is held in memory, no
+    matter how large the document is.
+
+    Parameters
+    :param chunks: Chunks of the UTF-8 encoded document.
+    :type chunks: Iterable[Bytes]
+    """
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder("utf-8")()
+        self._json = json.JSONDecoder()
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self, size=0):
+        """
+        Read chunks until the unparsed buffer is longer than size.
+
+        Return
+        :return: False if the end of the input was reached first.
+        """
+        text = [self.buffer[self.pos:]]
+        length = len(text[0])
+        while length <= size or length == len(text[0]):
+            chunk = next(self._chunks, None)
+            if chunk is None:
+                self.eof = True
+                text.append(self._text.decode(b"", final=True))
+                break
+            text.append(self._text.decode(chunk))
+            length += len(text[-1])
+        self.buffer = "".join(text)
+        self.pos = 0
+        return not self.eof
+
+    def peek(self):
+        """
+        Return the next character that is not whitespace, or "" at the end.
+        """
+        while True:
+            buffer = self.buffer
+            while self.pos < len(buffer) and buffer[self.pos] in WHITESPACE:
+                self.pos += 1
+            if self.pos < len(buffer):
+                return buffer[self.pos]
+            if self.eof or not self._fill():
+                return ""
+
+    def expect(self, chars):
+        """
+        Read the next character, which must be one of chars.
+        """
+        char = self.peek()
+        if not char or char not in chars:
+            raise ValueError("Expected one of {0!r}, got {1!r}".format(
+                chars, char))
+        self.pos += 1
+        return char
+
+    def read_value(self):
+        """
+        Read and decode the next complete value.
+        """
+        self.peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self.buffer, self.pos)
+            except ValueError:
+                # Read at least as much again, so large values are re-parsed
+                # a logarithmic number of times.
+                if self.eof:
+                    raise
+                self._fill(2 * (len(self.buffer) - self.pos))
+                continue
+            if (end == len(self.buffer) and not self.eof and
+                    type(value) in (int, float)):
+                self._fill(end - self.pos)  # The number may continue.
+                continue
+            self.pos = end
+            return value
+
+    def iter_array(self):
+        """
+        Yield the values of the array at the current position.
+        """
+        self.expect("[")
+        if self.peek() == "]":
+            self.pos += 1
+            return
+        while True:
+            yield self.read_value()
+            if self.expect(",]") == "]":
+                return
+
+    def iter_string(self, size=STREAM_CHUNK_SIZE):
+        """
+        Yield the text of the string at the current position, unescaped, in
+        pieces of at least size characters (except the last).
+        """
+        self.expect('"')
+        pieces = []
+        length = 0
+        while True:
+            buffer = self.buffer
+            end = self._string_end(buffer, self.pos)
+            final = 0 <= end
+            text, cut = self._unescape(
+                buffer, self.pos, end if final else len(buffer), final)
+            pieces.append(text)
+            length += len(text)
+            if final:
+                self.pos = end + 1
+                yield "".join(pieces)
+                return
+            self.pos = cut
+            if size <= length:
+                yield "".join(pieces)
+                pieces = []
+                length = 0
+            if not self._fill():
+                raise ValueError("Unterminated string")
+
+    @staticmethod
+    def _string_end(buffer, pos):
+        """Index of the closing quote of a string, or -1 if not in buffer."""
+        start = pos
+        while True:
+            quote = buffer.find('"', pos)
+            if quote < 0:
+                return quote
+            backslashes = quote
+            while start < backslashes and buffer[backslashes - 1] == "\\":
+                backslashes -= 1
+            if (quote - backslashes) % 2 == 0:
+                return quote
+            pos = quote + 1
+
+    def _unescape(self, buffer, start, end, final):
+        """
+        Unescape string text, leaving out an escape sequence (or surrogate
+        pair) cut off at the end, unless final.
+
+        Return
+        :return: tuple of (text, end of the text used).
+        """
+        limit = end - 12  # Longest escape is a \u surrogate pair.
+        while True:
+            try:
+                text = self._json.decode('"' + buffer[start:end] + '"')
+            except ValueError:
+                if final or end <= max(start, limit):
+                    raise
+                end -= 1
+                continue
+            if not final and text and "\ud800" <= text[-1] <= "\udbff":
+                end -= 6  # High surrogate, wait for its low surrogate.
+                continue
+            return text, end
+
+    def iter_object(self):
+        """
+        Yield the keys of the object at the current position. After each key
+        is yielded, the reader is at its value, which must be read.
+        """
+        self.expect("{")
+        if self.peek() == "}":
+            self.pos += 1
+            return
+        while True:
+            key = self.read_value()
+            self.expect(":")
+            yield key
+            if self.expect(",}") == "}":
+                return
+
+
+def decode_response_stream(method, status_code, chunks):
+    """
+    Check a JSON-RPC response, and decode its result while it is read.
+
+    The same errors are raised as by decode_response.
+
+    Parameters
+    :param method: Name of API method that was called.
+    :type method: String
+    :param status_code: HTTP status code of the response.
+    :type status_code: Integer
+    :param chunks: Chunks of the response body.
+    :type chunks: Iterable[Bytes]
+
+    Return
+    :return: result of API call, or if it is an array or a string, a
+      ResultStream of its elements or text, decoded as it is consumed.
+    :raise: LimeSurveyError if the response is a http error, is empty, or
+        has no result.
+    """
+    if not status_code < 400:
+        content = b"".join(chunks)
+        raise LimeSurveyError(
+            method, "Not response.ok", status_code, content)
+
+    reader = JSONStream(chunks)
+    if not reader.peek():
+        raise LimeSurveyError(
+            method, "Not 0 < len(response.content)", status_code, b"")
+
+    for key in reader.iter_object():
+        if not key == "result":
+            reader.read_value()
+        elif reader.peek() == "[":
+            return ResultStream(reader.iter_array(), "array")
+        elif reader.peek() == '"':
+            return ResultStream(reader.iter_string(), "string")
+        else:
+            return reader.read_value()
+
+    raise LimeSurveyError(
+        method, "Key 'result' not in response json", status_code,
+        reader.buffer)
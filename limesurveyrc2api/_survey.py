@@ -1,11 +1,8 @@
 from collections import OrderedDict
-from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api._component import _Component
 
 
-class _Survey(object):
-
-    def __init__(self, api):
-        self.api = api
+class _Survey(_Component):
 
     def list_surveys(self, username=None):
         """
@@ -20,22 +17,12 @@ class _Survey(object):
             ("sSessionKey", self.api.session_key),
             ("iSurveyID", username or self.api.username)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Invalid user",
-                "No surveys found",
-                "Invalid session key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is list
-        return response
+        error_messages = [
+            "Invalid user",
+            "No surveys found",
+            "Invalid session key"
+        ]
+        return self._query(method, params, error_messages, list)
 
     def list_questions(self, survey_id,
                        group_id=None, language=None):
@@ -57,22 +44,12 @@ class _Survey(object):
             ("iGroupID", group_id),
             ("sLanguage", language)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Error: Invalid survey ID",
-                "Error: Invalid language",
-                "Error: IMissmatch in surveyid and groupid",
-                "No questions found",
-                "No permission",
-                "Invalid session key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is list
-        return response
+        error_messages = [
+            "Error: Invalid survey ID",
+            "Error: Invalid language",
+            "Error: IMissmatch in surveyid and groupid",
+            "No questions found",
+            "No permission",
+            "Invalid session key"
+        ]
+        return self._query(method, params, error_messages, list)
@@ -1,11 +1,400 @@
+import math
+import re
+import time
 from collections import OrderedDict
 from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api._bulk import AdaptiveChunkSize, BulkResult, run_bulk
+from limesurveyrc2api._component import _Component
+from limesurveyrc2api._concurrency import bounded_map
+from limesurveyrc2api.table import flatten_participant, ParticipantTable
+from limesurveyrc2api.tracing import start_span, traced
 
+NO_PARTICIPANTS = "No survey participants found."
+NO_CANDIDATES = "Error: No candidate tokens"
+LEFT_TO_SEND = re.compile(r"^(-?\d+) left to send$")
+# get_participant_properties statuses meaning there is no single match.
+NO_MATCH = (
+    "Error: No results were found based on your attributes.",
+    "Error: More than 1 result was found based on your attributes.",
+    "Error: Invalid tokenid",
+)
+# Properties that list_participants returns without asking for attributes.
+LISTED_PROPERTIES = ("tid", "token", "firstname", "lastname", "email")
+# Assumed cost of fetching a page of participants, in single lookups.
+SWEEP_PAGE_COST = 10
 
-class _Token(object):
+
+def emails_left(response):
+    """
+    Number of emails left to send, from an invite or remind result status.
+
+    Parameters
+    :param response: Result of invite_participants or remind_participants.
+    :type response: Dict
+
+    Return
+    :return: Integer, or None if the status is not "N left to send".
+    """
+    match = LEFT_TO_SEND.match(str(response.get("status", "")))
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def lookup_key(token_query):
+    """
+    Key for a token ID or query dict, in get_participant_properties_bulk
+    results. A query dict's key is the tuple of its sorted items.
+    """
+    if isinstance(token_query, dict):
+        return tuple(sorted(token_query.items()))
+    return token_query
+
+
+def participant_key(participant, key_fields):
+    """
+    Key to find duplicate participants by, from a participant dict.
+
+    Values are compared as stripped strings, and emails ignoring case.
+
+    Parameters
+    :param participant: Participant properties, e.g. from
+      flatten_participant, or participant data to add.
+    :type participant: Dict
+    :param key_fields: Names of the properties that identify a participant.
+    :type key_fields: Tuple[String]
+
+    Return
+    :return: tuple of values, or None if they are all empty.
+    """
+    values = []
+    for field in key_fields:
+        value = participant.get(field)
+        value = "" if value is None else str(value).strip()
+        if field == "email":
+            value = value.casefold()
+        values.append(value)
+    if not any(values):
+        return None
+    return tuple(values)
+
+
+def unique_participants(participant_data, existing, key_fields, result):
+    """
+    Yield the participants whose key is not in existing, or yielded before.
+
+    Parameters
+    :param participant_data: Participant detail dictionaries.
+    :type participant_data: Iterable[Dict]
+    :param existing: Keys of the participants already in the survey, which
+      is updated with the keys of the yielded participants.
+    :type existing: Set[Tuple]
+    :param key_fields: Names of the properties that identify a participant.
+    :type key_fields: Tuple[String]
+    :param result: Result to count the skipped participants in.
+    :type result: BulkResult
+    """
+    for participant in participant_data:
+        key = participant_key(participant, key_fields)
+        if key is not None:
+            if key in existing:
+                result.skipped += 1
+                continue
+            existing.add(key)
+        yield participant
+
+
+def plan_sweep(token_queries, token_properties):
+    """
+    Plan a list_participants sweep to find participants by token ID or query.
+
+    Parameters
+    :param token_queries: Token IDs and / or query dicts.
+    :type token_queries: List
+    :param token_properties: Keys that will be returned for each participant.
+    :type token_properties: List[String]
+
+    Return
+    :return: tuple of (attributes, conditions) for list_participants.
+    """
+    needed = set(token_properties or [])
+    for query in token_queries:
+        if isinstance(query, dict):
+            needed.update(query)
+    attributes = sorted(needed.difference(LISTED_PROPERTIES)) or False
+    conditions = None
+    if token_queries and not any(isinstance(x, dict) for x in token_queries):
+        conditions = {"tid": [">=", min(int(x) for x in token_queries)]}
+    elif all(isinstance(x, dict) for x in token_queries):
+        # Items common to all queries can be filtered on by the server.
+        common = set(lookup_key(token_queries[0]))
+        for query in token_queries[1:]:
+            common.intersection_update(lookup_key(query))
+        conditions = dict(common) or None
+    return attributes, conditions
+
+
+def sweep_pays(token_count, page_size, lookups):
+    """
+    Check if listing all participants costs less than looking each one up.
+
+    Parameters
+    :param token_count: Number of participants in the survey.
+    :type token_count: Integer
+    :param page_size: Number of participants per list_participants page.
+    :type page_size: Integer
+    :param lookups: Number of participants to look up.
+    :type lookups: Integer
+    """
+    pages = math.ceil(token_count / page_size)
+    return pages * SWEEP_PAGE_COST < lookups
+
+
+def lookup_args(token_query):
+    """
+    The token_id and token_query_properties to find a participant by token
+    ID or query dict with get_participant_properties.
+    """
+    if isinstance(token_query, dict):
+        return None, token_query
+    return token_query, None
+
+
+def lookup_results(token_queries, results):
+    """
+    Key the properties found for each token ID or query by lookup_key,
+    leaving out those that were not found (None).
+    """
+    return {lookup_key(query): properties
+            for query, properties in zip(token_queries, results)
+            if properties is not None}
+
+
+def page_span(start, page_size):
+    """Attributes of the span for the list_participants page from start."""
+    return {"chunk.index": start // page_size, "page.start": start}
+
+
+def page_starts(token_count, page_size):
+    """Offsets of the pages to list token_count participants in."""
+    return range(0, token_count, page_size)
+
+
+def next_page_start(start, count, page_size):
+    """
+    Offset of the page after the one from start, or None if that one was
+    short (count < page_size), so was the last.
+    """
+    if count < page_size:
+        return None
+    return start + page_size
+
+
+class UniqueFilter(object):
+    """
+    Filters out participants to add that are already in a survey, or were
+    earlier in the input.
+
+    Parameters
+    :param key: Names of the properties that identify a participant.
+    :type key: Iterable[String]
+    """
+
+    def __init__(self, key):
+        self.key = tuple(key)
+        # Attributes to list the existing participants with.
+        self.attributes = [
+            x for x in self.key if x not in LISTED_PROPERTIES] or False
+        self.existing = set()
+
+    def add_existing(self, participant):
+        """
+        Add the key of a participant from list_participants.
+        """
+        key = participant_key(flatten_participant(participant), self.key)
+        if key is not None:
+            self.existing.add(key)
+
+    def unique(self, participant_data, result):
+        """
+        Yield the participants to add, counting those skipped in result.
+        """
+        return unique_participants(
+            participant_data, self.existing, self.key, result)
+
+
+class SweepMatcher(object):
+    """
+    Finds participants by token ID or query among swept participants.
+
+    Parameters
+    :param token_queries: Token IDs and / or query dicts.
+    :type token_queries: List
+    :param token_properties: Keys to return for each participant, or None
+      for all that were listed.
+    :type token_properties: List[String]
+    """
+
+    def __init__(self, token_queries, token_properties=None):
+        self.token_properties = token_properties
+        self._tids = {str(x): lookup_key(x) for x in token_queries
+                      if not isinstance(x, dict)}
+        self._queries = {lookup_key(x): x for x in token_queries
+                         if isinstance(x, dict)}
+        self._found = {}
+        self._ambiguous = set()
+
+    @property
+    def done(self):
+        """True if all token IDs are found, and there are no queries."""
+        return not (self._tids or self._queries)
+
+    def add(self, participant):
+        """
+        Match a participant from list_participants.
+        """
+        flat = flatten_participant(participant)
+        if self.token_properties:
+            properties = {k: flat.get(k) for k in self.token_properties}
+        else:
+            properties = flat
+        key = self._tids.pop(str(flat.get("tid")), None)
+        if key is not None:
+            self._found[key] = properties
+        for key, query in self._queries.items():
+            if all(str(flat.get(k)) == str(v) for k, v in query.items()):
+                if key in self._found:
+                    self._ambiguous.add(key)
+                self._found[key] = properties
+
+    def results(self):
+        """
+        Return
+        :return: dict of lookup_key(query): properties, for each query that
+          matched exactly one participant.
+        """
+        return {k: v for k, v in self._found.items()
+                if k not in self._ambiguous}
+
+
+class SendAllResults(object):
+    """
+    Results of the repeated email sending calls of send_all, and whether to
+    stop.
+
+    Parameters
+    :param method: Name of API method that the calls make.
+    :type method: String
+    :param max_rate: Maximum emails to send per second, or None.
+    :type max_rate: Float
+    :param progress: Function to call after each batch with the number of
+      emails sent so far and the number left.
+    :type progress: Callable[[Integer, Integer], None]
+    """
+
+    def __init__(self, method, max_rate=None, progress=None):
+        self.method = method
+        self.max_rate = max_rate
+        self.progress = progress
+        self.results = {}
+        self.status = None
+
+    def finished_by(self, error):
+        """
+        Check if a call's error means there was nothing left to send: no
+        candidate tokens, after the first call.
+        """
+        return error.status == NO_CANDIDATES and self.status is not None
+
+    def add(self, response):
+        """
+        Add the result of a call.
+
+        Return
+        :return: True if there is nothing left to send.
+        :raise: LimeSurveyError if the status is not "N left to send".
+        """
+        left = emails_left(response)
+        self.status = response.pop("status", None)
+        if left is None:
+            raise LimeSurveyError(
+                self.method, "Unexpected status", self.status)
+        if not response or set(response).issubset(self.results):
+            return True  # No new participants were sent to.
+        self.results.update(response)
+        if self.progress is not None:
+            self.progress(len(self.results), max(left, 0))
+        return left <= 0
+
+    def wait(self, response, began):
+        """
+        Seconds to wait before the next call, to keep under max_rate, after a
+        call that began at the time.monotonic() began.
+        """
+        if not self.max_rate:
+            return 0
+        return len(response) / self.max_rate - (time.monotonic() - began)
+
+    def result(self):
+        """
+        Return
+        :return: dict of the per-token results from all calls, and the
+          "status" of the last call.
+        """
+        self.results["status"] = self.status
+        return self.results
+
+
+def send_all(method, call, max_rate=None, progress=None):
+    """
+    Repeat an email sending call until nothing is left to send.
+
+    The next call is made as soon as the previous one returns, unless
+    that would exceed max_rate. If the first call finds no candidate
+    tokens the error is raised, but on later calls it means all are sent.
+
+    Parameters
+    :param method: Name of API method that call makes.
+    :type method: String
+    :param call: Function which sends one batch and returns the result.
+    :type call: Callable[[], Dict]
+    :param max_rate: Maximum emails to send per second, or None.
+    :type max_rate: Float
+    :param progress: Function to call after each batch with the number of
+      emails sent so far and the number left.
+    :type progress: Callable[[Integer, Integer], None]
+
+    Return
+    :return: dict of the per-token results from all calls, and the
+      "status" of the last call.
+    """
+    sender = SendAllResults(method, max_rate, progress)
+    while True:
+        began = time.monotonic()
+        try:
+            response = call()
+        except LimeSurveyError as e:
+            if sender.finished_by(e):
+                break
+            raise
+        if sender.add(response):
+            break
+        wait = sender.wait(response, began)
+        if 0 < wait:
+            time.sleep(wait)
+    return sender.result()
+
+
+class _Token(_Component):
 
     def __init__(self, api):
-        self.api = api
+        super().__init__(api)
+        # Adaptive chunk sizes for bulk methods, kept between calls.
+        self.chunk_sizes = {
+            "add_participants": AdaptiveChunkSize(),
+            "delete_participants": AdaptiveChunkSize(initial=500),
+            "invite_participants": AdaptiveChunkSize(),
+        }
 
     def add_participants(
             self, survey_id, participant_data, create_token_key=True):
@@ -28,22 +417,105 @@ class _Token(object):
             ("aParticipantData", participant_data),
             ("bCreateToken", create_token_key)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Error: Invalid survey ID",
-                "No token table",
-                "No permission"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is list
-        return response
+        error_messages = [
+            "Error: Invalid survey ID",
+            "No token table",
+            "No permission"
+        ]
+        return self._query(method, params, error_messages, list)
+
+    @traced
+    def add_participants_bulk(
+            self, survey_id, participant_data, create_token_key=True,
+            chunk_size=None, max_workers=4):
+        """
+        Add participants to the specified survey, in concurrent chunks.
+
+        The participant data is read lazily, so it can be a generator (e.g.
+        reading a CSV file), and only about max_workers chunks are held in
+        memory at once. A failed chunk does not stop the others; it is
+        reported in the result errors instead of being raised.
+
+        Parameters
+        :param survey_id: ID of survey to add participants to.
+        :type survey_id: Integer
+        :param participant_data: Participant detail dictionaries.
+        :type participant_data: Iterable[Dict]
+        :param create_token_key: If True, generate the new token instead of
+          using a provided value.
+        :type create_token_key: Bool
+        :param chunk_size: Number of participants to add per request. If None,
+          the adaptive size in chunk_sizes["add_participants"] is used.
+        :type chunk_size: Integer or AdaptiveChunkSize
+        :param max_workers: Maximum number of chunks to send at once.
+        :type max_workers: Integer
+
+        Return
+        :return: BulkResult with the added participants as results.
+        """
+        def call(chunk):
+            return self.add_participants(
+                survey_id=survey_id, participant_data=chunk,
+                create_token_key=create_token_key)
+        chunk_size = chunk_size or self.chunk_sizes["add_participants"]
+        return run_bulk(
+            call, participant_data, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
+
+    @traced
+    def add_participants_unique(
+            self, survey_id, participant_data, key=("email",),
+            create_token_key=True, chunk_size=None, max_workers=4,
+            page_size=1000):
+        """
+        Add the participants that are not already in the specified survey.
+
+        The keys of the existing participants are read in one sweep of
+        list_participants, into a set. Then each participant to add is
+        skipped if its key is in the set (or was earlier in the input), and
+        the rest are added as in add_participants_bulk. Participants whose
+        key values are all empty are always added. Participants added to the
+        survey by someone else during the import are not checked for.
+
+        Parameters
+        :param survey_id: ID of survey to add participants to.
+        :type survey_id: Integer
+        :param participant_data: Participant detail dictionaries.
+        :type participant_data: Iterable[Dict]
+        :param key: Names of the properties that identify a participant, e.g.
+          ("email",) or ("email", "attribute_1").
+        :type key: Tuple[String]
+        :param create_token_key: If True, generate the new token instead of
+          using a provided value.
+        :type create_token_key: Bool
+        :param chunk_size: Number of participants to add per request. If None,
+          the adaptive size in chunk_sizes["add_participants"] is used.
+        :type chunk_size: Integer or AdaptiveChunkSize
+        :param max_workers: Maximum number of pages or chunks to send at once.
+        :type max_workers: Integer
+        :param page_size: Number of participants to list per request.
+        :type page_size: Integer
+
+        Return
+        :return: BulkResult with the added participants as results, and the
+          number of duplicates skipped.
+        """
+        unique = UniqueFilter(key)
+        for participant in self.export_participants(
+                survey_id, page_size=page_size, max_workers=max_workers,
+                ordered=False, attributes=unique.attributes):
+            unique.add_existing(participant)
+
+        def call(chunk):
+            return self.add_participants(
+                survey_id=survey_id, participant_data=chunk,
+                create_token_key=create_token_key)
+        chunk_size = chunk_size or self.chunk_sizes["add_participants"]
+        result = BulkResult()
+        participants = unique.unique(participant_data, result)
+        return run_bulk(
+            call, participants, chunk_size, max_workers, result,
+            is_connect_error=self.api.transport.is_connect_error)
 
     def delete_participants(self, survey_id, token_ids):
         """
@@ -61,23 +533,43 @@ class _Token(object):
             ("iSurveyID", survey_id),
             ("aTokenIDs", token_ids)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Error: Invalid survey ID",
-                "Error: No token table",
-                "No permission",
-                "Invalid Session Key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is dict
-        return response
+        error_messages = [
+            "Error: Invalid survey ID",
+            "Error: No token table",
+            "No permission",
+            "Invalid Session Key"
+        ]
+        return self._query(method, params, error_messages, dict)
+
+    @traced
+    def delete_participants_bulk(
+            self, survey_id, token_ids, chunk_size=None, max_workers=4):
+        """
+        Delete participants (by token) from the specified survey, in chunks.
+
+        See add_participants_bulk for how chunks are sent and errors handled.
+
+        Parameters
+        :param survey_id: ID of survey to delete participants from.
+        :type survey_id: Integer
+        :param token_ids: Token IDs for participants to delete.
+        :type token_ids: Iterable[Integer]
+        :param chunk_size: Number of participants to delete per request. If
+          None, the adaptive size in chunk_sizes["delete_participants"] is used.
+        :type chunk_size: Integer or AdaptiveChunkSize
+        :param max_workers: Maximum number of chunks to send at once.
+        :type max_workers: Integer
+
+        Return
+        :return: BulkResult with the result dict of each chunk as results.
+        """
+        def call(chunk):
+            return self.delete_participants(
+                survey_id=survey_id, token_ids=chunk)
+        chunk_size = chunk_size or self.chunk_sizes["delete_participants"]
+        return run_bulk(
+            call, token_ids, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
 
     def get_participant_properties(
             self, survey_id, token_id, token_query_properties=None,
@@ -119,27 +611,85 @@ class _Token(object):
             ("aTokenQueryProperties", token_query_properties),
             ("aTokenProperties", token_properties)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Error: Invalid survey ID",
-                "Error: No token table",
-                "Error: No results were found based on your attributes.",
-                "Error: More than 1 result was found based on your attributes.",
-                "Error: Invalid tokenid",
-                "No valid Data",
-                "No permission",
-                "Invalid Session Key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is dict
-        return response
+        error_messages = [
+            "Error: Invalid survey ID",
+            "Error: No token table",
+            "Error: No results were found based on your attributes.",
+            "Error: More than 1 result was found based on your attributes.",
+            "Error: Invalid tokenid",
+            "No valid Data",
+            "No permission",
+            "Invalid Session Key"
+        ]
+        return self._query(method, params, error_messages, dict)
+
+    @traced
+    def get_participant_properties_bulk(
+            self, survey_id, token_queries, token_properties=None,
+            max_workers=8, page_size=1000, sweep=None):
+        """
+        Get participant properties for many participants at once.
+
+        Each participant is found by token ID or by query dict, as in
+        get_participant_properties. Unless sweep is given, the cheaper way
+        is chosen from the survey's token count: for a few participants,
+        get_participant_properties is called for each, by up to max_workers
+        threads at once; for many, all participants are listed with
+        list_participants (filtered where the queries allow it) and matched
+        locally, asking for the attributes that the queries and
+        token_properties need. A sweep returns only those listed properties,
+        so pass token_properties to get the same keys either way.
+
+        Parameters
+        :param survey_id: ID of survey to get participant properties for.
+        :type survey_id: Integer
+        :param token_queries: Token IDs and / or query dicts.
+        :type token_queries: Iterable
+        :param token_properties: Keys to return for each participant.
+        :type token_properties: List[String]
+        :param max_workers: Maximum number of single lookups at once.
+        :type max_workers: Integer
+        :param page_size: Number of participants per list_participants page.
+        :type page_size: Integer
+        :param sweep: True to list all participants, False to look up each
+          participant, or None to choose.
+        :type sweep: Bool
+
+        Return
+        :return: dict of properties, keyed by token ID or lookup_key(query),
+          for each that matched exactly one participant.
+        """
+        token_queries = list(token_queries)
+        if not token_queries:
+            return {}
+        if sweep is None:
+            token_count = int(
+                self.get_summary(survey_id, stat_name="token_count"))
+            sweep = sweep_pays(token_count, page_size, len(token_queries))
+        if sweep:
+            attributes, conditions = plan_sweep(
+                token_queries, token_properties)
+            matcher = SweepMatcher(token_queries, token_properties)
+            for participant in self.iter_participants(
+                    survey_id, page_size=page_size, attributes=attributes,
+                    conditions=conditions):
+                matcher.add(participant)
+                if matcher.done:
+                    break
+            return matcher.results()
+
+        def lookup(token_query):
+            token_id, query = lookup_args(token_query)
+            try:
+                return self.get_participant_properties(
+                    survey_id, token_id, query, token_properties)
+            except LimeSurveyError as e:
+                if e.status in NO_MATCH:
+                    return None
+                raise
+
+        results = bounded_map(lookup, token_queries, max_workers)
+        return lookup_results(token_queries, results)
 
     def get_summary(self, survey_id, stat_name="all"):
         """
@@ -159,6 +709,7 @@ class _Token(object):
 
         :return: dict with keys "token_count", "token_invalid", "token_sent",
             "token_opted_out", and "token_completed" with strings as values.
+            If a single stat_name is given, just the value of that stat.
         """
         method = "get_summary"
         params = OrderedDict([
@@ -166,24 +717,15 @@ class _Token(object):
             ("iSurveyID", survey_id),
             ("sStatName", stat_name)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Invalid surveyid",
-                "Invalid summary key",
-                "No available data",
-                "No permission",
-                "Invalid session key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is dict
-        return response
+        error_messages = [
+            "Invalid surveyid",
+            "Invalid summary key",
+            "No available data",
+            "No permission",
+            "Invalid session key"
+        ]
+        response_type = dict if stat_name == "all" else (str, int)
+        return self._query(method, params, error_messages, response_type)
 
     def invite_participants(self, survey_id, token_ids, uninvited_only=True):
         """
@@ -205,28 +747,54 @@ class _Token(object):
             ("aTokenIDs", token_ids),
             ("bEmail", uninvited_only)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Invalid session key",
-                "Error: Invalid survey ID",
-                "Error: No token table",
-                "Error: No candidate tokens",
-                "No permission",
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is dict
-        return response
+        error_messages = [
+            "Invalid session key",
+            "Error: Invalid survey ID",
+            "Error: No token table",
+            NO_CANDIDATES,
+            "No permission",
+        ]
+        return self._query(method, params, error_messages, dict)
+
+    @traced
+    def invite_participants_bulk(
+            self, survey_id, token_ids, uninvited_only=True, chunk_size=None,
+            max_workers=1):
+        """
+        Send invitation emails for the specified participants, in chunks.
+
+        See add_participants_bulk for how chunks are sent and errors handled.
+        Each chunk result has its own "N left to send" status.
+
+        Parameters
+        :param survey_id: ID of survey to invite participants from.
+        :type survey_id: Integer
+        :param token_ids: Token IDs for participants to invite.
+        :type token_ids: Iterable[Integer]
+        :param uninvited_only: If True, only send emails for participants that
+          have not been invited. If False, send an invite even if already sent.
+        :type uninvited_only: Bool
+        :param chunk_size: Number of participants to invite per request. If
+          None, the adaptive size in chunk_sizes["invite_participants"] is used.
+        :type chunk_size: Integer or AdaptiveChunkSize
+        :param max_workers: Maximum number of chunks to send at once.
+        :type max_workers: Integer
+
+        Return
+        :return: BulkResult with the result dict of each chunk as results.
+        """
+        def call(chunk):
+            return self.invite_participants(
+                survey_id=survey_id, token_ids=chunk,
+                uninvited_only=uninvited_only)
+        chunk_size = chunk_size or self.chunk_sizes["invite_participants"]
+        return run_bulk(
+            call, token_ids, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
 
     def list_participants(
             self, survey_id, start=0, limit=1000, ignore_token_used=False,
-            attributes=False, conditions=None):
+            attributes=False, conditions=None, stream=False):
         """
         List participants in a survey.
 
@@ -245,6 +813,9 @@ class _Token(object):
         :param conditions: Key(s) / value(s) to use for finding the
           participant among all those that are in the survey.
         :type conditions: List[Dict]
+        :param stream: If True, return an iterator of the participants,
+          decoded as the response is read, instead of a list.
+        :type stream: Bool
         """
         method = "list_participants"
         conditions = conditions or []
@@ -257,26 +828,261 @@ class _Token(object):
             ("aAttributes", attributes),
             ("aConditions", conditions)
         ])
-        response = self.api.query(method=method, params=params)
-        response_type = type(response)
-
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = [
-                "Error: Invalid survey ID",
-                "Error: No token table",
-                "No survey participants found.",
-                "Invalid session key",
-                "No permission",
-                "Invalid Session Key"
-            ]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is list
-        return response
+        error_messages = [
+            "Error: Invalid survey ID",
+            "Error: No token table",
+            NO_PARTICIPANTS,
+            "Invalid session key",
+            "No permission",
+            "Invalid Session Key"
+        ]
+        if stream:
+            return self._query_stream(method, params, error_messages)
+        return self._query(method, params, error_messages, list)
+
+    @traced
+    def iter_participants(
+            self, survey_id, page_size=1000, ignore_token_used=False,
+            attributes=False, conditions=None, stream=False):
+        """
+        Iterate over all participants in a survey, fetching pages lazily.
+
+        Each page is requested with list_participants only when the previous
+        one has been consumed, so about one page is held in memory at a time,
+        or with stream, about one participant. Iteration stops at the first
+        short page, or when the API reports that no (more) participants were
+        found.
+
+        Parameters
+        :param survey_id: ID of survey to list participants from.
+        :type survey_id: Integer
+        :param page_size: Number of tokens to retrieve per request.
+        :type page_size: Integer
+        :param ignore_token_used: If True, tokens that have been used are not
+          returned.
+        :type ignore_token_used: Bool
+        :param attributes: The extended attributes to include in the response.
+        :type attributes: List[String]
+        :param conditions: Key(s) / value(s) to use for finding the
+          participant among all those that are in the survey.
+        :type conditions: List[Dict]
+        :param stream: If True, decode each page as its response is read.
+        :type stream: Bool
+        """
+        start = 0
+        while start is not None:
+            try:
+                with start_span("page", page_span(start, page_size)):
+                    page = self.list_participants(
+                        survey_id=survey_id, start=start, limit=page_size,
+                        ignore_token_used=ignore_token_used,
+                        attributes=attributes, conditions=conditions,
+                        stream=stream)
+            except LimeSurveyError as e:
+                if e.status == NO_PARTICIPANTS:
+                    return
+                raise
+            count = 0
+            try:
+                for participant in page:
+                    count += 1
+                    yield participant
+            finally:
+                # A streamed page holds its connection until it is closed,
+                # even if the caller stops iterating.
+                if hasattr(page, "close"):
+                    page.close()
+            start = next_page_start(start, count, page_size)
 
-    def remind_participants(self):
-        # TODO
-        raise NotImplementedError
+    @traced
+    def export_participants(
+            self, survey_id, page_size=1000, max_workers=8, ordered=True,
+            ignore_token_used=False, attributes=False, conditions=None):
+        """
+        Iterate over all participants in a survey, fetching pages concurrently.
+
+        The page offsets are planned from the get_summary "token_count", then
+        the pages are fetched with list_participants by up to max_workers
+        threads at once. At most max_workers pages are held in memory, plus
+        the page being yielded from. Participants added after the plan is
+        made may not be included.
+
+        Parameters
+        :param survey_id: ID of survey to list participants from.
+        :type survey_id: Integer
+        :param page_size: Number of tokens to retrieve per request.
+        :type page_size: Integer
+        :param max_workers: Maximum number of pages to fetch at once.
+        :type max_workers: Integer
+        :param ordered: If True, yield pages in token order. If False, yield
+          pages as soon as they are fetched.
+        :type ordered: Bool
+        :param ignore_token_used: If True, tokens that have been used are not
+          returned.
+        :type ignore_token_used: Bool
+        :param attributes: The extended attributes to include in the response.
+        :type attributes: List[String]
+        :param conditions: Key(s) / value(s) to use for finding the
+          participant among all those that are in the survey.
+        :type conditions: List[Dict]
+        """
+        token_count = int(self.get_summary(survey_id, stat_name="token_count"))
+
+        def fetch_page(start):
+            try:
+                with start_span("page", page_span(start, page_size)):
+                    return self.list_participants(
+                        survey_id=survey_id, start=start, limit=page_size,
+                        ignore_token_used=ignore_token_used,
+                        attributes=attributes, conditions=conditions)
+            except LimeSurveyError as e:
+                if e.status == NO_PARTICIPANTS:
+                    return []
+                raise
+
+        starts = page_starts(token_count, page_size)
+        pages = bounded_map(fetch_page, starts, max_workers, ordered)
+        for page in pages:
+            yield from page
+
+    @traced
+    def export_participants_table(
+            self, survey_id, fields=None, page_size=1000, max_workers=8,
+            ignore_token_used=False, attributes=False, conditions=None):
+        """
+        Get all participants in a survey, as a columnar ParticipantTable.
+
+        The pages are fetched as in export_participants, and each page is
+        added to the table as it arrives, so only the columns are kept,
+        rather than a dict per participant.
+
+        Parameters
+        :param survey_id: ID of survey to list participants from.
+        :type survey_id: Integer
+        :param fields: Fields to keep, in order, or None to keep all.
+        :type fields: List[String]
+        :param page_size: Number of tokens to retrieve per request.
+        :type page_size: Integer
+        :param max_workers: Maximum number of pages to fetch at once.
+        :type max_workers: Integer
+        :param ignore_token_used: If True, tokens that have been used are not
+          returned.
+        :type ignore_token_used: Bool
+        :param attributes: The extended attributes to include in the response.
+        :type attributes: List[String]
+        :param conditions: Key(s) / value(s) to use for finding the
+          participant among all those that are in the survey.
+        :type conditions: List[Dict]
+
+        Return
+        :return: ParticipantTable
+        """
+        return ParticipantTable(self.export_participants(
+            survey_id, page_size=page_size, max_workers=max_workers,
+            ignore_token_used=ignore_token_used, attributes=attributes,
+            conditions=conditions), fields=fields)
+
+    def remind_participants(
+            self, survey_id, min_days_between=None, max_reminders=None,
+            token_ids=None):
+        """
+        Send reminder emails for the specified survey participants.
+
+        The server sends at most its email batch size per call, and the
+        result status says how many are left, e.g. "10 left to send".
+
+        Parameters
+        :param survey_id: ID of survey to remind participants from.
+        :type survey_id: Integer
+        :param min_days_between: Only remind participants that were invited or
+          last reminded at least this many days ago.
+        :type min_days_between: Integer
+        :param max_reminders: Only remind participants that have had fewer
+          than this many reminders.
+        :type max_reminders: Integer
+        :param token_ids: List of token IDs for participants to remind, or
+          None for all participants.
+        :type token_ids: List[Integer]
+        """
+        method = "remind_participants"
+        params = OrderedDict([
+            ("sSessionKey", self.api.session_key),
+            ("iSurveyID", survey_id),
+            ("iMinDaysBetween", min_days_between),
+            ("iMaxReminders", max_reminders),
+            ("aTokenIds", token_ids or False)
+        ])
+        error_messages = [
+            "Invalid session key",
+            "Error: Invalid survey ID",
+            "Error: No token table",
+            NO_CANDIDATES,
+            "No permission",
+        ]
+        return self._query(method, params, error_messages, dict)
+
+    @traced
+    def invite_participants_all(
+            self, survey_id, token_ids=None, max_rate=None, progress=None):
+        """
+        Send invitation emails to all uninvited participants, in batches.
+
+        Calls invite_participants until the server reports nothing is left to
+        send. See the send_all function for details.
+
+        Parameters
+        :param survey_id: ID of survey to invite participants from.
+        :type survey_id: Integer
+        :param token_ids: List of token IDs for participants to invite, or
+          None for all participants.
+        :type token_ids: List[Integer]
+        :param max_rate: Maximum emails to send per second, or None.
+        :type max_rate: Float
+        :param progress: Function to call after each batch with the number of
+          emails sent so far and the number left.
+        :type progress: Callable[[Integer, Integer], None]
+        """
+        def call():
+            return self.invite_participants(
+                survey_id=survey_id, token_ids=token_ids,
+                uninvited_only=True)
+        return send_all(
+            "invite_participants", call, max_rate=max_rate, progress=progress)
+
+    @traced
+    def remind_participants_all(
+            self, survey_id, min_days_between=None, max_reminders=None,
+            token_ids=None, max_rate=None, progress=None):
+        """
+        Send reminder emails to all eligible participants, in batches.
+
+        Calls remind_participants until the server reports nothing is left to
+        send. See the send_all function for details. Without
+        min_days_between, the server may consider participants reminded in
+        an earlier batch eligible again, in which case sending stops at the
+        first repeated batch.
+
+        Parameters
+        :param survey_id: ID of survey to remind participants from.
+        :type survey_id: Integer
+        :param min_days_between: Only remind participants that were invited or
+          last reminded at least this many days ago.
+        :type min_days_between: Integer
+        :param max_reminders: Only remind participants that have had fewer
+          than this many reminders.
+        :type max_reminders: Integer
+        :param token_ids: List of token IDs for participants to remind, or
+          None for all participants.
+        :type token_ids: List[Integer]
+        :param max_rate: Maximum emails to send per second, or None.
+        :type max_rate: Float
+        :param progress: Function to call after each batch with the number of
+          emails sent so far and the number left.
+        :type progress: Callable[[Integer, Integer], None]
+        """
+        def call():
+            return self.remind_participants(
+                survey_id=survey_id, min_days_between=min_days_between,
+                max_reminders=max_reminders, token_ids=token_ids)
+        return send_all(
+            "remind_participants", call, max_rate=max_rate, progress=progress)
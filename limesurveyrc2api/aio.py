@@ -0,0 +1,740 @@
+import asyncio
+import base64
+import itertools
+import time
+import weakref
+from collections import OrderedDict
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.limesurvey import (
+    check_released, decode_response, encode_request, release_params,
+    RELEASE_METHOD)
+from limesurveyrc2api.metrics import RequestInfo
+from limesurveyrc2api.policy import retry_delay
+from limesurveyrc2api.session import is_invalid_session
+from limesurveyrc2api._bulk import BulkResult, run_bulk_async
+from limesurveyrc2api._component import check_response
+from limesurveyrc2api.parsing import parse_responses_csv
+from limesurveyrc2api._concurrency import async_bounded_map
+from limesurveyrc2api._responses import (
+    _Responses, write_base64, EXPORT_ERROR_MESSAGES)
+from limesurveyrc2api._survey import _Survey
+from limesurveyrc2api.table import ParticipantTable
+from limesurveyrc2api.tracing import (
+    query_span, start_span, tag_result, traced)
+from limesurveyrc2api._token import (
+    _Token, lookup_args, lookup_results, next_page_start, page_span,
+    page_starts, plan_sweep, sweep_pays, SendAllResults, SweepMatcher,
+    UniqueFilter, NO_MATCH, NO_PARTICIPANTS)
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Session store: (event loop, asyncio.Lock) serialising opens with the store.
+_store_locks = weakref.WeakKeyDictionary()
+
+
+def _store_lock(store):
+    """The asyncio.Lock for opening sessions with a store, in this loop."""
+    loop = asyncio.get_running_loop()
+    entry = _store_locks.get(store)
+    if entry is None or entry[0] is not loop:
+        entry = _store_locks[store] = (loop, asyncio.Lock())
+    return entry[1]
+
+
+def _store_key(store, url, username, session_key):
+    """
+    Store a new session key, unless another process stored one after it was
+    looked up, and return the stored key.
+    """
+    with store.lock(url, username):
+        stored = store.get(url, username)
+        if stored is None:
+            store.set(url, username, session_key)
+            stored = session_key
+    return stored
+
+
+class AsyncHTTPTransport(object):
+    """
+    Pooled, keep-alive asyncio HTTP transport for the RC2API.
+
+    The aiohttp.ClientSession is created on first use, inside the running
+    event loop, and is re-created if used again after close().
+
+    Parameters
+    :param limit: Maximum number of open connections in the pool.
+    :type limit: Integer
+    :param limit_per_host: Maximum number of open connections per host, or 0
+      for no per-host limit.
+    :type limit_per_host: Integer
+    :param timeout: Seconds to wait for the server, either one number, or a
+      (connect, read) tuple. None means wait forever.
+    :type timeout: Float or Tuple[Float, Float]
+    :param keep_alive: If False, close the connection after each request.
+    :type keep_alive: Bool
+    :param keepalive_timeout: Seconds to keep an idle connection open.
+    :type keepalive_timeout: Float
+    """
+
+    # Exceptions raised by post() for a failed request.
+    errors = (asyncio.TimeoutError, ) + (
+        (aiohttp.ClientError, ) if aiohttp is not None else ())
+
+    def __init__(self, limit=100, limit_per_host=0, timeout=None,
+                 keep_alive=True, keepalive_timeout=15):
+        if aiohttp is None:
+            raise ImportError(
+                "AsyncHTTPTransport requires aiohttp, install it with: "
+                "pip install limesurveyrc2api[async]")
+        self.limit = limit
+        self.limit_per_host = limit_per_host
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self.keepalive_timeout = keepalive_timeout
+        self._session = None
+
+    def _make_session(self):
+        if self.keep_alive:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                keepalive_timeout=self.keepalive_timeout)
+        else:
+            connector = aiohttp.TCPConnector(
+                limit=self.limit, limit_per_host=self.limit_per_host,
+                force_close=True)
+        if isinstance(self.timeout, tuple):
+            connect, read = self.timeout
+            timeout = aiohttp.ClientTimeout(
+                total=None, sock_connect=connect, sock_read=read)
+        else:
+            timeout = aiohttp.ClientTimeout(total=self.timeout)
+        return aiohttp.ClientSession(connector=connector, timeout=timeout)
+
+    async def post(self, url, data, headers=None):
+        """
+        Send a POST request using a pooled connection.
+
+        Parameters
+        :param url: URL to send the request to.
+        :type url: String
+        :param data: Request body.
+        :type data: String
+        :param headers: Extra request headers.
+        :type headers: Dict[String, String]
+
+        Return
+        :return: tuple of the response status code and body.
+        :raise: aiohttp.ClientError
+        """
+        if self._session is None or self._session.closed:
+            self._session = self._make_session()
+        async with self._session.post(
+                url, data=data, headers=headers) as response:
+            content = await response.read()
+            return response.status, content
+
+    @staticmethod
+    def is_connect_error(error):
+        """
+        Check if a post() error happened while connecting, so the request
+        was not sent.
+        """
+        return isinstance(error, aiohttp.ClientConnectorError)
+
+    async def close(self):
+        """
+        Close all pooled connections.
+        """
+        session, self._session = self._session, None
+        if session is not None:
+            await session.close()
+
+
+async def send_all_async(method, call, max_rate=None, progress=None):
+    """
+    Repeat an email sending call until nothing is left to send.
+
+    Async version of the send_all function, for a coroutine function.
+    """
+    sender = SendAllResults(method, max_rate, progress)
+    while True:
+        began = time.monotonic()
+        try:
+            response = await call()
+        except LimeSurveyError as e:
+            if sender.finished_by(e):
+                break
+            raise
+        if sender.add(response):
+            break
+        wait = sender.wait(response, began)
+        if 0 < wait:
+            await asyncio.sleep(wait)
+    return sender.result()
+
+
+class _AsyncComponent(object):
+    """Mixin to make the methods of a _Component return coroutines."""
+
+    async def _query(self, method, params, error_messages, response_type):
+        cache = self.api.cache
+        if cache is not None and cache.caches(method):
+            hit, response = cache.get(method, params)
+            if hit:
+                return response
+        response = await self.api.query(method=method, params=params)
+        check_response(method, response, error_messages, response_type)
+        if cache is not None:
+            cache.set(method, params, response)
+        return response
+
+    async def _query_stream(self, method, params, error_messages):
+        """
+        Query a method that returns an array.
+
+        The async transport reads the whole response, so the array is
+        decoded after it is read, and returned as a list.
+        """
+        return await self._query(method, params, error_messages, list)
+
+
+class _AsyncSurvey(_AsyncComponent, _Survey):
+    pass
+
+
+class _AsyncResponses(_AsyncComponent, _Responses):
+
+    async def _export(self, method, params, destination):
+        """
+        Query an export method, and decode the base64 result.
+
+        The async transport reads the whole response, so the result is
+        decoded after it is read, even if a destination is given.
+        """
+        response = await self._query(
+            method, params, EXPORT_ERROR_MESSAGES, str)
+        if destination is None:
+            return base64.b64decode(response)
+        return write_base64([response], destination)
+
+    @traced
+    async def export_responses_columns(
+            self, survey_id, path, completion_status="all",
+            from_response_id=None, to_response_id=None, fields=None,
+            max_workers=None):
+        """
+        Export responses to a CSV file, and parse it into typed columns.
+
+        Async version of _Responses.export_responses_columns. The parsing
+        runs in the default executor.
+        """
+        await self.export_responses(
+            survey_id, document_type="csv",
+            completion_status=completion_status,
+            heading_type="code", response_type="short",
+            from_response_id=from_response_id, to_response_id=to_response_id,
+            fields=fields, destination=path)
+        questions = await self.api.survey.list_questions(survey_id)
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, parse_responses_csv, path, questions, max_workers)
+
+
+class _AsyncToken(_AsyncComponent, _Token):
+
+    @traced
+    async def add_participants_bulk(
+            self, survey_id, participant_data, create_token_key=True,
+            chunk_size=None, max_workers=4):
+        """
+        Add participants to the specified survey, in concurrent chunks.
+
+        Async version of _Token.add_participants_bulk.
+        """
+        async def call(chunk):
+            return await self.add_participants(
+                survey_id=survey_id, participant_data=chunk,
+                create_token_key=create_token_key)
+        chunk_size = chunk_size or self.chunk_sizes["add_participants"]
+        return await run_bulk_async(
+            call, participant_data, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
+
+    @traced
+    async def add_participants_unique(
+            self, survey_id, participant_data, key=("email",),
+            create_token_key=True, chunk_size=None, max_workers=4,
+            page_size=1000):
+        """
+        Add the participants that are not already in the specified survey.
+
+        Async version of _Token.add_participants_unique.
+        """
+        unique = UniqueFilter(key)
+        async for participant in self.export_participants(
+                survey_id, page_size=page_size, max_workers=max_workers,
+                ordered=False, attributes=unique.attributes):
+            unique.add_existing(participant)
+
+        async def call(chunk):
+            return await self.add_participants(
+                survey_id=survey_id, participant_data=chunk,
+                create_token_key=create_token_key)
+        chunk_size = chunk_size or self.chunk_sizes["add_participants"]
+        result = BulkResult()
+        participants = unique.unique(participant_data, result)
+        return await run_bulk_async(
+            call, participants, chunk_size, max_workers, result,
+            is_connect_error=self.api.transport.is_connect_error)
+
+    @traced
+    async def delete_participants_bulk(
+            self, survey_id, token_ids, chunk_size=None, max_workers=4):
+        """
+        Delete participants (by token) from the specified survey, in chunks.
+
+        Async version of _Token.delete_participants_bulk.
+        """
+        async def call(chunk):
+            return await self.delete_participants(
+                survey_id=survey_id, token_ids=chunk)
+        chunk_size = chunk_size or self.chunk_sizes["delete_participants"]
+        return await run_bulk_async(
+            call, token_ids, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
+
+    @traced
+    async def get_participant_properties_bulk(
+            self, survey_id, token_queries, token_properties=None,
+            max_workers=8, page_size=1000, sweep=None):
+        """
+        Get participant properties for many participants at once.
+
+        Async version of _Token.get_participant_properties_bulk.
+        """
+        token_queries = list(token_queries)
+        if not token_queries:
+            return {}
+        if sweep is None:
+            token_count = int(
+                await self.get_summary(survey_id, stat_name="token_count"))
+            sweep = sweep_pays(token_count, page_size, len(token_queries))
+        if sweep:
+            attributes, conditions = plan_sweep(
+                token_queries, token_properties)
+            matcher = SweepMatcher(token_queries, token_properties)
+            async for participant in self.iter_participants(
+                    survey_id, page_size=page_size, attributes=attributes,
+                    conditions=conditions):
+                matcher.add(participant)
+                if matcher.done:
+                    break
+            return matcher.results()
+
+        async def lookup(token_query):
+            token_id, query = lookup_args(token_query)
+            try:
+                return await self.get_participant_properties(
+                    survey_id, token_id, query, token_properties)
+            except LimeSurveyError as e:
+                if e.status in NO_MATCH:
+                    return None
+                raise
+
+        results = []
+        async for properties in async_bounded_map(
+                lookup, token_queries, max_workers):
+            results.append(properties)
+        return lookup_results(token_queries, results)
+
+    @traced
+    async def invite_participants_bulk(
+            self, survey_id, token_ids, uninvited_only=True, chunk_size=None,
+            max_workers=1):
+        """
+        Send invitation emails for the specified participants, in chunks.
+
+        Async version of _Token.invite_participants_bulk.
+        """
+        async def call(chunk):
+            return await self.invite_participants(
+                survey_id=survey_id, token_ids=chunk,
+                uninvited_only=uninvited_only)
+        chunk_size = chunk_size or self.chunk_sizes["invite_participants"]
+        return await run_bulk_async(
+            call, token_ids, chunk_size, max_workers,
+            is_connect_error=self.api.transport.is_connect_error)
+
+    @traced
+    async def invite_participants_all(
+            self, survey_id, token_ids=None, max_rate=None, progress=None):
+        """
+        Send invitation emails to all uninvited participants, in batches.
+
+        Async version of _Token.invite_participants_all.
+        """
+        async def call():
+            return await self.invite_participants(
+                survey_id=survey_id, token_ids=token_ids,
+                uninvited_only=True)
+        return await send_all_async(
+            "invite_participants", call, max_rate=max_rate, progress=progress)
+
+    @traced
+    async def remind_participants_all(
+            self, survey_id, min_days_between=None, max_reminders=None,
+            token_ids=None, max_rate=None, progress=None):
+        """
+        Send reminder emails to all eligible participants, in batches.
+
+        Async version of _Token.remind_participants_all.
+        """
+        async def call():
+            return await self.remind_participants(
+                survey_id=survey_id, min_days_between=min_days_between,
+                max_reminders=max_reminders, token_ids=token_ids)
+        return await send_all_async(
+            "remind_participants", call, max_rate=max_rate, progress=progress)
+
+    @traced
+    async def iter_participants(
+            self, survey_id, page_size=1000, ignore_token_used=False,
+            attributes=False, conditions=None):
+        """
+        Iterate over all participants in a survey, fetching pages lazily.
+
+        Async generator version of _Token.iter_participants.
+        """
+        start = 0
+        while start is not None:
+            try:
+                with start_span("page", page_span(start, page_size)):
+                    page = await self.list_participants(
+                        survey_id=survey_id, start=start, limit=page_size,
+                        ignore_token_used=ignore_token_used,
+                        attributes=attributes, conditions=conditions)
+            except LimeSurveyError as e:
+                if e.status == NO_PARTICIPANTS:
+                    return
+                raise
+            for participant in page:
+                yield participant
+            start = next_page_start(start, len(page), page_size)
+
+    @traced
+    async def export_participants_table(
+            self, survey_id, fields=None, page_size=1000, max_workers=8,
+            ignore_token_used=False, attributes=False, conditions=None):
+        """
+        Get all participants in a survey, as a columnar ParticipantTable.
+
+        Async version of _Token.export_participants_table.
+        """
+        table = ParticipantTable(fields=fields)
+        async for participant in self.export_participants(
+                survey_id, page_size=page_size, max_workers=max_workers,
+                ignore_token_used=ignore_token_used, attributes=attributes,
+                conditions=conditions):
+            table.append(participant)
+        return table
+
+    @traced
+    async def export_participants(
+            self, survey_id, page_size=1000, max_workers=8, ordered=True,
+            ignore_token_used=False, attributes=False, conditions=None):
+        """
+        Iterate over all participants in a survey, fetching pages concurrently.
+
+        Async generator version of _Token.export_participants.
+        """
+        token_count = int(
+            await self.get_summary(survey_id, stat_name="token_count"))
+
+        async def fetch_page(start):
+            try:
+                with start_span("page", page_span(start, page_size)):
+                    return await self.list_participants(
+                        survey_id=survey_id, start=start, limit=page_size,
+                        ignore_token_used=ignore_token_used,
+                        attributes=attributes, conditions=conditions)
+            except LimeSurveyError as e:
+                if e.status == NO_PARTICIPANTS:
+                    return []
+                raise
+
+        starts = page_starts(token_count, page_size)
+        pages = async_bounded_map(fetch_page, starts, max_workers, ordered)
+        async for page in pages:
+            for participant in page:
+                yield participant
+
+
+class AsyncLimeSurvey(object):
+    """
+    asyncio client for the RC2API, mirroring LimeSurvey.
+
+    The open, query and close methods, and the survey and token component
+    methods, are coroutines with the same parameters and errors as LimeSurvey.
+    """
+
+    def __init__(self, url, username, transport=None, session_store=None,
+                 cache=None, retry_policy=None, rate_limiter=None,
+                 circuit_breaker=None, instruments=None, tracer=None):
+        """
+        Parameters
+        :param url: URL of the LimeSurvey RC2API endpoint.
+        :type url: String
+        :param username: LimeSurvey username to authenticate with.
+        :type username: String
+        :param transport: Transport to send queries with. Defaults to a new
+          AsyncHTTPTransport, which keeps pooled connections alive.
+        :type transport: AsyncHTTPTransport
+        :param session_store: Store to share session keys between clients,
+          e.g. a FileSessionStore shared by processes on a host.
+        :type session_store: MemorySessionStore
+        :param cache: Cache for results of metadata methods, or None.
+        :type cache: MetadataCache
+        :param retry_policy: Policy for retrying failed requests, or None to
+          not retry.
+        :type retry_policy: RetryPolicy
+        :param rate_limiter: Limiter for the rate of requests, which may be
+          shared with other clients, or None.
+        :type rate_limiter: TokenBucket
+        :param circuit_breaker: Breaker to fail requests fast while the server
+          is failing, or None. (Concurrency can be limited by the transport
+          connection limit.)
+        :type circuit_breaker: CircuitBreaker
+        :param instruments: Objects with before_request and after_request
+          hooks, called with a RequestInfo for each request, or None.
+        :type instruments: List[MetricsRecorder]
+        :param tracer: Tracer to open a span with for each query, or None.
+        :type tracer: RecordingTracer
+        """
+        self.headers = {"content-type": "application/json"}
+        self.url = url
+        self.username = username
+        self.session_key = None
+        self.session_store = session_store
+        self.cache = cache
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.circuit_breaker = circuit_breaker
+        self.transport = transport or AsyncHTTPTransport()
+        self.instruments = list(instruments or [])
+        self.tracer = tracer
+        self.request_ids = itertools.count(1)
+        self.survey = _AsyncSurvey(self)  # Setup and admin of surveys.
+        self.token = _AsyncToken(self)    # Participants and their data.
+        self.responses = _AsyncResponses(self)  # Exports of survey responses.
+        self._password = None  # Kept by open() to re-authenticate with.
+        self._auth_lock = None  # Created in the event loop when needed.
+
+    async def open(self, password):
+        """
+        Open a session in LimeSurvey.
+
+        See LimeSurvey.open for details.
+
+        Parameters
+        :param password: LimeSurvey password to authenticate with.
+        :type password: String
+        """
+        self._password = password
+        store = self.session_store
+        if store is None:
+            self.session_key = await self._get_session_key(password)
+            return
+        # The store's lock is a thread and file lock, so it is only taken in
+        # the executor, and not held while awaiting the new key.
+        loop = asyncio.get_running_loop()
+        async with _store_lock(store):
+            session_key = await loop.run_in_executor(
+                None, store.get, self.url, self.username)
+            if session_key is None:
+                new_key = await self._get_session_key(password)
+                session_key = await loop.run_in_executor(
+                    None, _store_key, store, self.url, self.username, new_key)
+                if session_key != new_key:
+                    await self._release_key(new_key)
+        self.session_key = session_key
+
+    async def _release_key(self, session_key):
+        """
+        Release a new session key that another process stored a key before.
+        """
+        try:
+            await self._send(RELEASE_METHOD, release_params(session_key))
+        except (LimeSurveyError,) + self.transport.errors:
+            pass  # The key expires on the server anyway.
+
+    async def _get_session_key(self, password):
+        method = "get_session_key"
+        params = OrderedDict([
+            ("username", self.username),
+            ("password", password)
+        ])
+        response = await self.query(method=method, params=params)
+        error_messages = ["Invalid user name or password"]
+        return check_response(method, response, error_messages, str)
+
+    async def _reauthenticate(self, stale_key):
+        """
+        Replace a session key that the API reported as invalid.
+
+        Return
+        :return: the new session key.
+        """
+        if self._auth_lock is None:
+            self._auth_lock = asyncio.Lock()
+        async with self._auth_lock:
+            if self.session_key == stale_key:
+                if self.session_store is not None:
+                    await asyncio.get_running_loop().run_in_executor(
+                        None, self.session_store.delete, self.url,
+                        self.username, stale_key)
+                await self.open(self._password)
+            return self.session_key
+
+    async def query(self, method, params):
+        """
+        Query the LimeSurvey API
+
+        See LimeSurvey.query for details.
+
+        Parameters
+        :param method: Name of API method to call.
+        :type method: String
+        :param params: Parameters to the specified API call.
+        :type params: OrderedDict
+
+        Return
+        :return: result of API call
+        :raise: aiohttp.ClientError
+        :raise: asyncio.TimeoutError
+        :raise: LimeSurveyError if the API returns an error (either http error
+            or error message in body)
+        """
+        if self.tracer is None:
+            return await self._query(method, params)
+        with query_span(self.tracer, method, params) as span:
+            result = await self._query(method, params)
+            tag_result(span, result)
+            return result
+
+    async def _query(self, method, params):
+        if not self.session_key and not method == "get_session_key":
+            raise LimeSurveyError(method, "No session open", params)
+
+        result = await self._send(method, params)
+        if self._password is not None and is_invalid_session(params, result):
+            params = OrderedDict(params)
+            params["sSessionKey"] = await self._reauthenticate(
+                params["sSessionKey"])
+            result = await self._send(method, params)
+        return result
+
+    async def _send(self, method, params):
+        info = None
+        if self.instruments:
+            info = RequestInfo(method, self.instruments)
+        request_id = next(self.request_ids)
+        data_json = encode_request(method, params, request_id)
+        if info is not None:
+            info.begin(request_id, data_json)
+        try:
+            result = await self._send_guarded(method, data_json, info)
+        except BaseException as e:
+            if info is not None:
+                info.finish(error=e)
+            raise
+        if info is not None:
+            info.finish(result)
+        return result
+
+    async def _send_guarded(self, method, data_json, info):
+        breaker = self.circuit_breaker
+        if breaker is not None and not breaker.allow():
+            raise LimeSurveyError(method, "Circuit breaker open")
+        failed = True
+        try:
+            status_code, content = await self._post(method, data_json, info)
+            if info is not None:
+                info.received(status_code, content)
+            result = decode_response(method, status_code, content)
+            failed = False
+        finally:
+            if breaker is not None:
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+        return result
+
+    async def _post(self, method, data_json, info=None):
+        """
+        Send a request, after the rate_limiter allows, and as many times as
+        the retry_policy allows, counting retries in the RequestInfo.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                wait = self.rate_limiter.reserve()
+                if 0 < wait:
+                    await asyncio.sleep(wait)
+            try:
+                status_code, content = await self.transport.post(
+                    self.url, headers=self.headers, data=data_json)
+            except self.transport.errors as e:
+                delay = retry_delay(
+                    self.retry_policy, method, attempt,
+                    connect_error=self.transport.is_connect_error(e))
+                if delay is None:
+                    raise
+            else:
+                if status_code < 400:
+                    return status_code, content
+                delay = retry_delay(
+                    self.retry_policy, method, attempt,
+                    status_code=status_code)
+                if delay is None:
+                    return status_code, content
+            await asyncio.sleep(delay)
+            attempt += 1
+            if info is not None:
+                info.retries = attempt
+
+    async def close(self, release=None):
+        """
+        Close an open session in LimeSurvey, and the transport connections.
+
+        See LimeSurvey.close for details.
+
+        Parameters
+        :param release: If True, release the session key in LimeSurvey.
+        :type release: Bool
+        """
+        if release is None:
+            release = self.session_store is None
+        if not release:
+            await self.transport.close()
+            self.session_key = None
+            self._password = None
+            return None
+
+        try:
+            response = await self.query(
+                method=RELEASE_METHOD, params=release_params(self.session_key))
+        finally:
+            await self.transport.close()
+
+        check_released(response)
+        if self.session_store is not None:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.session_store.delete, self.url, self.username,
+                self.session_key)
+        self.session_key = None
+        self._password = None
+        return response
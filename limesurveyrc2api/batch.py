@@ -0,0 +1,236 @@
+import json
+from collections import OrderedDict
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.policy import READ_METHODS
+from limesurveyrc2api.session import is_invalid_session
+from limesurveyrc2api._component import check_response
+from limesurveyrc2api._concurrency import bounded_map
+from limesurveyrc2api._survey import _Survey
+from limesurveyrc2api._token import _Token
+
+
+def decode_batch(status_code, content):
+    """
+    Check a JSON-RPC batch response and return its list of responses.
+
+    Parameters
+    :param status_code: HTTP status code of the response.
+    :type status_code: Integer
+    :param content: Response body.
+    :type content: Bytes
+
+    Return
+    :return: the responses, or None if the server replied with one JSON-RPC
+      error instead, as servers that don't support batches do.
+    :raise: LimeSurveyError if the response is a http error, or is not a
+      JSON-RPC response.
+    """
+    if not status_code < 400:
+        raise LimeSurveyError(
+            "batch", "Not response.ok", status_code, content)
+    try:
+        response_data = json.loads(content)
+    except ValueError:
+        response_data = None
+    if isinstance(response_data, list):
+        return response_data
+    if isinstance(response_data, dict) and response_data.get(
+            "error") is not None and response_data.get("result") is None:
+        return None
+    raise LimeSurveyError(
+        "batch", "Not a JSON-RPC response", status_code, content)
+
+
+class BatchCall(object):
+    """
+    A call added to a Batch, whose result is available after it is sent.
+    """
+
+    def __init__(self, request_id, method, params, error_messages,
+                 response_type):
+        self.request_id = request_id
+        self.method = method
+        self.params = params
+        self.error_messages = error_messages
+        self.response_type = response_type
+        self.done = False
+        self._result = None
+        self._error = None
+
+    def set_result(self, response):
+        try:
+            self._result = check_response(
+                self.method, response, self.error_messages,
+                self.response_type)
+        except (LimeSurveyError, AssertionError) as e:
+            self._error = e
+        self.done = True
+
+    def set_error(self, error):
+        self._error = error
+        self.done = True
+
+    def result(self):
+        """
+        Return the result of the call, or raise its error.
+
+        :raise: LimeSurveyError if the call failed, or was not sent yet.
+        """
+        if not self.done:
+            raise LimeSurveyError(self.method, "Batch not sent")
+        if self._error is not None:
+            raise self._error
+        return self._result
+
+
+class _BatchComponent(object):
+    """Mixin to make the methods of a _Component add calls to a Batch."""
+
+    def __init__(self, api, batch):
+        super().__init__(api)
+        self.batch = batch
+
+    def _query(self, method, params, error_messages, response_type):
+        return self.batch.add(method, params, error_messages, response_type)
+
+
+class _BatchSurvey(_BatchComponent, _Survey):
+    pass
+
+
+class _BatchToken(_BatchComponent, _Token):
+    pass
+
+
+class Batch(object):
+    """
+    Collects calls to send together as JSON-RPC batch requests.
+
+    The survey and token component methods of a batch return a BatchCall
+    instead of the result. When the batch is sent (explicitly, or on leaving
+    a with block), the calls are sent as JSON arrays of up to max_size
+    requests, each with a unique id, and each result is matched to its call
+    by id. If the server replies that it does not accept batch requests,
+    the calls are sent one per request instead, on up to max_workers
+    threads, and the client does not try batches again. Calls to methods
+    that write data are not repeated singly, and fail instead, in case the
+    server ran them. If the batch request fails, every call in it fails with
+    the error.
+
+    Parameters
+    :param api: Client to send the calls with.
+    :type api: LimeSurvey
+    :param max_size: Maximum number of calls per batch request.
+    :type max_size: Integer
+    :param max_workers: Maximum concurrent requests if batches are not
+      supported.
+    :type max_workers: Integer
+    """
+
+    def __init__(self, api, max_size=100, max_workers=8):
+        self.api = api
+        self.max_size = max_size
+        self.max_workers = max_workers
+        self.calls = []
+        self.survey = _BatchSurvey(api, self)
+        self.token = _BatchToken(api, self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.send()
+
+    def add(self, method, params, error_messages=(), response_type=object):
+        """
+        Add a call to the batch.
+
+        Parameters
+        :param method: Name of API method to call.
+        :type method: String
+        :param params: Parameters to the specified API call.
+        :type params: OrderedDict
+        :param error_messages: Status messages that mean the call failed.
+        :type error_messages: List[String]
+        :param response_type: Expected type(s) of a successful result.
+        :type response_type: Type or Tuple[Type]
+
+        Return
+        :return: BatchCall
+        """
+        call = BatchCall(
+            next(self.api.request_ids), method, params, error_messages,
+            response_type)
+        self.calls.append(call)
+        return call
+
+    def send(self):
+        """
+        Send the calls that have not been sent yet.
+        """
+        calls, self.calls = self.calls, []
+        for start in range(0, len(calls), self.max_size):
+            chunk = calls[start:start + self.max_size]
+            if self.api.batch_supported is not False:
+                self._send_batch(chunk)
+            if self.api.batch_supported is False:
+                self._send_single([x for x in chunk if not x.done])
+
+    def _send_batch(self, calls):
+        data = [
+            OrderedDict([
+                ("method", x.method),
+                ("params", x.params),
+                ("id", x.request_id)])
+            for x in calls]
+        try:
+            with self.api._guard("batch"):
+                response = self.api._post("batch", json.dumps(data))
+        except Exception as e:
+            for call in calls:
+                call.set_error(e)
+            return
+        try:
+            response_data = decode_batch(
+                response.status_code, response.content)
+        except LimeSurveyError as e:
+            for call in calls:
+                call.set_error(e)
+            return
+        if response_data is None:
+            self.api.batch_supported = False
+            # The calls may have been run, so only reads are repeated singly.
+            for call in calls:
+                if call.method not in READ_METHODS:
+                    call.set_error(LimeSurveyError(
+                        call.method, "Batch not supported"))
+            return
+        self.api.batch_supported = True
+
+        by_id = {x.request_id: x for x in calls}
+        retry = []
+        for item in response_data:
+            call = by_id.pop(item.get("id"), None)
+            if call is None:
+                continue
+            if item.get("error") is not None:
+                call.set_error(LimeSurveyError(call.method, item["error"]))
+            elif is_invalid_session(call.params, item.get("result")):
+                retry.append(call)
+            else:
+                call.set_result(item.get("result"))
+        for call in by_id.values():
+            call.set_error(
+                LimeSurveyError(call.method, "No response in batch"))
+        # Single queries re-authenticate if the session key has expired.
+        self._send_single(retry)
+
+    def _send_single(self, calls):
+        def send(call):
+            try:
+                call.set_result(self.api.query(call.method, call.params))
+            except Exception as e:
+                call.set_error(e)
+        for _ in bounded_map(send, calls, self.max_workers):
+            pass
@@ -0,0 +1,168 @@
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+
+class MetadataCache(object):
+    """
+    Read-through cache for RC2API results that rarely change.
+
+    Results are keyed by method name and positional parameters (except the
+    session key), expire after a per-method TTL, and the least recently used
+    are evicted when there are more than maxsize. Only methods with a TTL are
+    cached, and only successful results. Results are stored as JSON, so each
+    get returns a new copy.
+
+    If a path is given, results are also written there as JSON files, so
+    that a new process can use results cached by an earlier one. A result
+    that can't be written there is only cached in memory. A cache (or path)
+    should only be used for one LimeSurvey server.
+
+    Parameters
+    :param ttls: Seconds to keep results for, per method name.
+    :type ttls: Dict[String, Float]
+    :param maxsize: Maximum number of results to keep in memory.
+    :type maxsize: Integer
+    :param path: Directory to also keep results in, or None.
+    :type path: String
+    """
+
+    default_ttls = {
+        "list_surveys": 300,
+        "list_questions": 3600,
+    }
+
+    def __init__(self, ttls=None, maxsize=1024, path=None):
+        self.ttls = dict(self.default_ttls if ttls is None else ttls)
+        self.maxsize = maxsize
+        self.path = path
+        self._entries = OrderedDict()  # key: (method, expires, value_json)
+        self._lock = threading.Lock()
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+
+    def caches(self, method):
+        """True if results of the method are cached."""
+        return method in self.ttls
+
+    @staticmethod
+    def make_key(method, params):
+        """
+        Cache key for a method call, leaving out the session key.
+        """
+        values = [v for k, v in params.items() if k != "sSessionKey"]
+        return json.dumps([method, values], sort_keys=True)
+
+    def _file_path(self, key):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        return os.path.join(self.path, digest + ".json")
+
+    def get(self, method, params):
+        """
+        Return a cached result.
+
+        Return
+        :return: tuple of (True, result), or (False, None) if not cached.
+        """
+        key = self.make_key(method, params)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if time.time() < entry[1]:
+                    self._entries.move_to_end(key)
+                    return True, json.loads(entry[2])
+                del self._entries[key]
+        if self.path is None:
+            return False, None
+        try:
+            with open(self._file_path(key), "r") as cache_file:
+                stored = json.load(cache_file)
+        except (OSError, ValueError):
+            return False, None
+        if not (stored["key"] == key and time.time() < stored["expires"]):
+            return False, None
+        self._put(key, method, stored["expires"], stored["value"])
+        return True, json.loads(stored["value"])
+
+    def set(self, method, params, result):
+        """
+        Cache a result, if the method is cached.
+        """
+        if not self.caches(method):
+            return
+        key = self.make_key(method, params)
+        expires = time.time() + self.ttls[method]
+        value = json.dumps(result)
+        self._put(key, method, expires, value)
+        if self.path is not None:
+            self._write(key, {"key": key, "method": method,
+                              "expires": expires, "value": value})
+
+    def _write(self, key, stored):
+        """
+        Write a result file, through a temporary file of its own so that
+        concurrent writers don't clash. If it can't be written, the result
+        is only cached in memory.
+        """
+        try:
+            fd, temp_path = tempfile.mkstemp(suffix=".tmp", dir=self.path)
+        except OSError:
+            return
+        try:
+            with os.fdopen(fd, "w") as cache_file:
+                json.dump(stored, cache_file)
+            os.replace(temp_path, self._file_path(key))
+        except OSError:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+
+    def _put(self, key, method, expires, value):
+        with self._lock:
+            self._entries[key] = (method, expires, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, method=None, params=None):
+        """
+        Remove cached results.
+
+        Parameters
+        :param method: Method to remove results for, or None for all methods.
+        :type method: String
+        :param params: Parameters to remove the result for, or None for all
+          results of the method.
+        :type params: OrderedDict
+        """
+        if method is not None and params is not None:
+            keys = [self.make_key(method, params)]
+        else:
+            with self._lock:
+                keys = [k for k, v in self._entries.items()
+                        if method is None or v[0] == method]
+        with self._lock:
+            for key in keys:
+                self._entries.pop(key, None)
+        if self.path is None:
+            return
+        if method is not None and params is not None:
+            file_paths = [self._file_path(keys[0])]
+        else:
+            file_paths = [
+                os.path.join(self.path, x) for x in os.listdir(self.path)
+                if x.endswith(".json")]
+        for file_path in file_paths:
+            try:
+                if method is not None and params is None:
+                    with open(file_path, "r") as cache_file:
+                        if not json.load(cache_file)["method"] == method:
+                            continue
+                os.remove(file_path)
+            except (OSError, ValueError, KeyError):
+                pass
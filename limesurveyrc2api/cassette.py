@@ -0,0 +1,321 @@
+import gzip
+import json
+import threading
+import time
+from collections import defaultdict, deque, OrderedDict
+from limesurveyrc2api.exceptions import LimeSurveyError
+
+# Parameters whose values are not written to recordings.
+REDACT_PARAMS = ("sSessionKey", "password")
+# Value written in place of redacted values (and session keys in results).
+REDACTED = "REDACTED"
+
+
+def _open(path, mode):
+    """Open a recording, compressed with gzip if the path ends with .gz."""
+    if path.endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _calls(request):
+    """The calls in a request: one, or a list of them in a batch request."""
+    return request if isinstance(request, list) else [request]
+
+
+def redact_request(request, redact=REDACT_PARAMS):
+    """
+    Copy a decoded JSON-RPC request, without its call ids and with the values
+    of the named parameters replaced by REDACTED.
+
+    Parameters
+    :param request: Decoded request: a call, or a list of them (a batch).
+    :type request: Dict or List[Dict]
+    :param redact: Names of parameters to redact.
+    :type redact: Iterable[String]
+
+    Return
+    :return: the redacted call(s), as [method, params] lists.
+    """
+    redacted = []
+    for call in _calls(request):
+        params = call.get("params")
+        if isinstance(params, dict):
+            params = OrderedDict(
+                (k, REDACTED if k in redact else v)
+                for k, v in params.items())
+        redacted.append([call.get("method"), params])
+    return redacted if isinstance(request, list) else redacted[0]
+
+
+def _redact_body(request, body):
+    """Replace the session key in a get_session_key response body."""
+    if isinstance(request, list) or request.get("method") != (
+            "get_session_key"):
+        return body
+    try:
+        response = json.loads(body)
+    except ValueError:
+        return body
+    if isinstance(response, dict) and isinstance(
+            response.get("result"), str):
+        response["result"] = REDACTED
+        return json.dumps(response)
+    return body
+
+
+class RecordingTransport(object):
+    """
+    Transport recording the requests and responses of another transport to
+    an append-only file, for replaying with ReplayTransport.
+
+    Each exchange is written as one line of JSON, with the redacted request,
+    the response status and body (or the transport error), the time it was
+    sent (seconds since the first request), and the seconds until the
+    response arrived. If the path ends with .gz, the file is compressed, and
+    is only complete once the transport is closed. If the transport is used
+    again after it is closed, the file is reopened and appended to.
+
+    Streamed responses are recorded when they are closed, with the part of
+    the body that was read.
+
+    Parameters
+    :param transport: Transport to send requests with, e.g. HTTPTransport.
+    :type transport: HTTPTransport
+    :param path: File to append the recording to.
+    :type path: String
+    :param redact: Names of parameters to redact. The session key returned
+      by get_session_key is always redacted.
+    :type redact: Iterable[String]
+    """
+
+    def __init__(self, transport, path, redact=REDACT_PARAMS):
+        self.transport = transport
+        self.errors = transport.errors
+        self.path = path
+        self.redact = tuple(redact)
+        self._file = _open(path, "a")
+        self._flush = not path.endswith(".gz")
+        self._started = None
+        self._lock = threading.Lock()
+
+    def post(self, url, data, headers=None, stream=False):
+        """
+        Send a request with the wrapped transport, and record it.
+
+        See HTTPTransport.post for the parameters.
+        """
+        start = time.perf_counter()
+        with self._lock:
+            if self._started is None:
+                self._started = start
+        entry = OrderedDict([("time", start - self._started)])
+        try:
+            response = self.transport.post(
+                url, data=data, headers=headers, stream=stream)
+        except self.errors as e:
+            entry["elapsed"] = time.perf_counter() - start
+            entry["error"] = "{0}: {1}".format(type(e).__name__, e)
+            entry["connect_error"] = self.transport.is_connect_error(e)
+            self._write(data, entry)
+            raise
+        entry["elapsed"] = time.perf_counter() - start
+        entry["status"] = response.status_code
+        if stream:
+            return _RecordingResponse(self, response, data, entry)
+        self._write(data, entry, response.content)
+        return response
+
+    def _write(self, data, entry, content=None):
+        request = json.loads(data)
+        entry["request"] = redact_request(request, self.redact)
+        if isinstance(request, list):
+            entry["ids"] = [x.get("id") for x in request]
+        if content is not None:
+            body = content.decode("utf-8", "surrogateescape")
+            entry["body"] = _redact_body(request, body)
+        line = json.dumps(entry, separators=(",", ":"))
+        with self._lock:
+            if self._file.closed:
+                # Used again after close(), like the wrapped transport.
+                self._file = _open(self.path, "a")
+            self._file.write(line + "\n")
+            if self._flush:
+                self._file.flush()
+
+    def is_connect_error(self, error):
+        return self.transport.is_connect_error(error)
+
+    def close(self):
+        """
+        Close the wrapped transport, and the recording.
+        """
+        self.transport.close()
+        with self._lock:
+            self._file.close()
+
+
+class _RecordingResponse(object):
+    """Streamed response, recorded when it is closed."""
+
+    def __init__(self, recorder, response, data, entry):
+        self.recorder = recorder
+        self.response = response
+        self.status_code = response.status_code
+        self.data = data
+        self.entry = entry
+        self.chunks = []
+        self.closed = False
+
+    @property
+    def content(self):
+        return b"".join(self.iter_content(None))
+
+    def iter_content(self, size):
+        for chunk in self.response.iter_content(size):
+            self.chunks.append(chunk)
+            yield chunk
+
+    def close(self):
+        if self.closed:
+            return
+        self.closed = True
+        self.response.close()
+        self.recorder._write(self.data, self.entry, b"".join(self.chunks))
+
+
+class _ReplayError(IOError):
+    """Transport error replayed from a recording."""
+
+    def __init__(self, message, connect_error):
+        super(_ReplayError, self).__init__(message)
+        self.connect_error = connect_error
+
+
+class _ReplayResponse(object):
+
+    def __init__(self, status_code, content):
+        self.status_code = status_code
+        self.content = content
+
+    def iter_content(self, size):
+        size = size or len(self.content) or 1
+        for i in range(0, len(self.content), size):
+            yield self.content[i:i + size]
+
+    def close(self):
+        pass
+
+
+class ReplayTransport(object):
+    """
+    Transport answering requests from a RecordingTransport's recording,
+    without a server.
+
+    Each request is answered with the next unused response recorded for
+    the same method and parameters (ignoring redacted values and call ids),
+    so calls made concurrently may arrive in any order. Calls to
+    get_session_key and release_session_key that weren't recorded are
+    answered as if successful.
+
+    Parameters
+    :param path: File of the recording.
+    :type path: String
+    :param speed: None to answer at once, or how many times faster than
+      recorded to answer, e.g. 1 to wait as long as the server took. Only
+      the server's time is replayed: the time between requests was the
+      client's own.
+    :type speed: Float
+    :param redact: Names of parameters that were redacted in the recording.
+    :type redact: Iterable[String]
+    """
+
+    errors = (IOError,)
+
+    def __init__(self, path, speed=None, redact=REDACT_PARAMS):
+        self.path = path
+        self.speed = speed
+        self.redact = tuple(redact)
+        self._entries = defaultdict(deque)  # request key: entries
+        self._lock = threading.Lock()
+        with _open(path, "r") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._entries[self._key(entry["request"])].append(entry)
+
+    @staticmethod
+    def _key(redacted):
+        return json.dumps(redacted, sort_keys=True)
+
+    @property
+    def remaining(self):
+        """Number of recorded responses not replayed yet."""
+        with self._lock:
+            return sum(len(x) for x in self._entries.values())
+
+    def post(self, url, data, headers=None, stream=False):
+        """
+        Answer a request from the recording.
+
+        See HTTPTransport.post for the parameters.
+
+        Return
+        :return: response with the recorded status_code and content.
+        :raise: LimeSurveyError if no response was recorded for the request.
+        """
+        request = json.loads(data)
+        key = self._key(redact_request(request, self.redact))
+        with self._lock:
+            entries = self._entries.get(key)
+            entry = entries.popleft() if entries else None
+        if entry is None:
+            return self._unrecorded(request)
+        if self.speed:
+            time.sleep(entry["elapsed"] / self.speed)
+        if "error" in entry:
+            raise _ReplayError(entry["error"], entry["connect_error"])
+        body = entry.get("body", "")
+        if isinstance(request, list):
+            body = self._renumber(request, entry, body)
+        return _ReplayResponse(
+            entry["status"], body.encode("utf-8", "surrogateescape"))
+
+    @staticmethod
+    def _renumber(request, entry, body):
+        """
+        Give a batch response the call ids of this request, in place of the
+        recorded ones.
+        """
+        try:
+            response = json.loads(body)
+        except ValueError:
+            return body
+        if not isinstance(response, list):
+            return body
+        ids = dict(zip(entry["ids"], [x.get("id") for x in request]))
+        for item in response:
+            if isinstance(item, dict) and item.get("id") in ids:
+                item["id"] = ids[item["id"]]
+        return json.dumps(response)
+
+    @staticmethod
+    def _unrecorded(request):
+        method = "batch" if isinstance(request, list) else request.get(
+            "method")
+        if method == "get_session_key":
+            result = REDACTED
+        elif method == "release_session_key":
+            result = "OK"
+        else:
+            raise LimeSurveyError(method, "No recorded response")
+        content = json.dumps(
+            {"id": request.get("id"), "result": result, "error": None})
+        return _ReplayResponse(200, content.encode("utf-8"))
+
+    @staticmethod
+    def is_connect_error(error):
+        return getattr(error, "connect_error", False)
+
+    def close(self):
+        pass
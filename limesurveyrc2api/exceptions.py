@@ -6,3 +6,5 @@ class LimeSurveyError(Exception):
         if args is not None:
             message += [str(x) for x in args]
         self.message = " | ".join(message)
+        self.method = method
+        self.status = args[0] if args else None
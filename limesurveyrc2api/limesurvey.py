@@ -1,48 +1,229 @@
-import requests
+import itertools
 import json
+import threading
+import time
 from collections import OrderedDict
+from contextlib import contextmanager, ExitStack
+from limesurveyrc2api.batch import Batch
 from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.metrics import RequestInfo
+from limesurveyrc2api.policy import retry_delay
+from limesurveyrc2api.session import is_invalid_session, SessionPool
+from limesurveyrc2api.tracing import query_span, tag_result
+from limesurveyrc2api.transport import HTTPTransport
+from limesurveyrc2api._component import check_response
+from limesurveyrc2api._concurrency import bounded_map
+from limesurveyrc2api._responses import _Responses
+from limesurveyrc2api._stream import (
+    decode_response_stream, ResultStream, STREAM_CHUNK_SIZE)
 from limesurveyrc2api._survey import _Survey
 from limesurveyrc2api._token import _Token
 
+RELEASE_METHOD = "release_session_key"
+
+
+def encode_request(method, params, request_id=1):
+    """
+    Serialise a RC2API call to a JSON-RPC request body.
+
+    Parameters
+    :param method: Name of API method to call.
+    :type method: String
+    :param params: Parameters to the specified API call.
+    :type params: OrderedDict
+    :param request_id: ID to match the response to the request.
+    :type request_id: Integer
+    """
+    data = OrderedDict([
+        ("method", method),
+        ("params", params),
+        ("id", request_id)
+    ])
+    return json.dumps(data)
+
+
+def decode_response(method, status_code, content):
+    """
+    Check a JSON-RPC response and return its result.
+
+    Parameters
+    :param method: Name of API method that was called.
+    :type method: String
+    :param status_code: HTTP status code of the response.
+    :type status_code: Integer
+    :param content: Response body.
+    :type content: Bytes
+
+    Return
+    :return: result of API call
+    :raise: LimeSurveyError if the response is a http error, is empty, or
+        has no result.
+    """
+    if not status_code < 400:
+        raise LimeSurveyError(
+            method, "Not response.ok", status_code, content)
+
+    if not 0 < len(content):
+        raise LimeSurveyError(
+            method, "Not 0 < len(response.content)", status_code, content)
+
+    response_data = json.loads(content)
+
+    if "result" not in response_data:
+        raise LimeSurveyError(
+            method, "Key 'result' not in response json", status_code,
+            content)
+
+    return response_data["result"]
+
+
+def release_params(session_key):
+    """Parameters of a release_session_key call, for session_key."""
+    return OrderedDict([
+        ("sSessionKey", session_key)
+    ])
+
+
+def check_released(response):
+    """
+    Check the response of a release_session_key call.
+
+    Return
+    :return: the response.
+    :raise: LimeSurveyError if the response is not "OK".
+    """
+    if not response == "OK":
+        raise LimeSurveyError(RELEASE_METHOD, "Did not receive 'OK' response")
+    return response
+
 
 class LimeSurvey(object):
 
-    def __init__(self, url, username):
+    def __init__(self, url, username, transport=None, session_store=None,
+                 cache=None, retry_policy=None, rate_limiter=None,
+                 concurrency_limiter=None, circuit_breaker=None,
+                 instruments=None, tracer=None):
+        """
+        Parameters
+        :param url: URL of the LimeSurvey RC2API endpoint.
+        :type url: String
+        :param username: LimeSurvey username to authenticate with.
+        :type username: String
+        :param transport: Transport to send queries with. Defaults to a new
+          HTTPTransport, which keeps pooled connections alive between calls.
+        :type transport: HTTPTransport
+        :param session_store: Store to share session keys between clients,
+          e.g. a FileSessionStore shared by processes on a host.
+        :type session_store: MemorySessionStore
+        :param cache: Cache for results of metadata methods (by default
+          list_surveys and list_questions), or None.
+        :type cache: MetadataCache
+        :param retry_policy: Policy for retrying failed requests, or None to
+          not retry.
+        :type retry_policy: RetryPolicy
+        :param rate_limiter: Limiter for the rate of requests, which may be
+          shared with other clients, or None.
+        :type rate_limiter: TokenBucket
+        :param concurrency_limiter: Adaptive limit on concurrent requests from
+          threads using the client, or None.
+        :type concurrency_limiter: AIMDLimiter
+        :param circuit_breaker: Breaker to fail requests fast while the server
+          is failing, or None.
+        :type circuit_breaker: CircuitBreaker
+        :param instruments: Objects with before_request and after_request
+          hooks, called with a RequestInfo for each request, e.g. a
+          MetricsRecorder. Requests are not measured if there are none.
+        :type instruments: List[MetricsRecorder]
+        :param tracer: Tracer to open a span with for each query, nested
+          under the span of the operation making it (e.g.
+          export_participants), or None to not trace.
+        :type tracer: RecordingTracer
+        """
         self.headers = {"content-type": "application/json"}
         self.url = url
         self.username = username
         self.session_key = None
+        self.session_store = session_store
+        self.session_pool = None
+        self.cache = cache
+        self.retry_policy = retry_policy
+        self.rate_limiter = rate_limiter
+        self.concurrency_limiter = concurrency_limiter
+        self.circuit_breaker = circuit_breaker
+        self.transport = transport or HTTPTransport()
+        self.instruments = list(instruments or [])
+        self.tracer = tracer
+        self.request_ids = itertools.count(1)
+        self.batch_supported = None  # Unknown until a batch is sent.
         self.survey = _Survey(self)  # Setup and admin of surveys.
         self.token = _Token(self)    # Participants and their data.
+        self.responses = _Responses(self)  # Exports of survey responses.
+        self._password = None  # Kept by open() to re-authenticate with.
+        self._auth_lock = threading.Lock()
 
-    def open(self, password):
+    def open(self, password, sessions=1):
         """
         Open a session in LimeSurvey.
 
+        If the client has a session_store with a key for this url and
+        username, that key is used instead of getting a new one. Otherwise
+        the new key is put in the store.
+
+        If more than one session is requested, the keys are opened (without
+        the session_store) into a session_pool, and each query leases a key
+        from the pool, so that concurrent queries from threads don't queue up
+        behind the server's lock on one session.
+
         Parameters
         :param password: LimeSurvey password to authenticate with.
         :type password: String
+        :param sessions: Number of session keys to open.
+        :type sessions: Integer
         """
+        self._password = password
+        if 1 < sessions:
+            session_keys = list(bounded_map(
+                lambda _: self._get_session_key(password), range(sessions),
+                max_workers=sessions))
+            self.session_pool = SessionPool(session_keys)
+            self.session_key = session_keys[0]
+            return
+        if self.session_store is None:
+            self.session_key = self._get_session_key(password)
+            return
+        with self.session_store.lock(self.url, self.username):
+            session_key = self.session_store.get(self.url, self.username)
+            if session_key is None:
+                session_key = self._get_session_key(password)
+                self.session_store.set(self.url, self.username, session_key)
+        self.session_key = session_key
+
+    def _get_session_key(self, password):
         method = "get_session_key"
         params = OrderedDict([
             ("username", self.username),
             ("password", password)
         ])
         response = self.query(method=method, params=params)
-        response_type = type(response)
+        error_messages = ["Invalid user name or password"]
+        return check_response(method, response, error_messages, str)
+
+    def _reauthenticate(self, stale_key):
+        """
+        Replace a session key that the API reported as invalid.
 
-        if response_type is dict and "status" in response:
-            status = response["status"]
-            error_messages = ["Invalid user name or password"]
-            for message in error_messages:
-                if status == message:
-                    raise LimeSurveyError(method, status)
-        else:
-            assert response_type is str
-        self.session_key = response
+        Return
+        :return: the new session key.
+        """
+        with self._auth_lock:
+            if self.session_key == stale_key:
+                if self.session_store is not None:
+                    self.session_store.delete(
+                        self.url, self.username, stale_key)
+                self.open(self._password)
+            return self.session_key
 
-    def query(self, method, params):
+    def query(self, method, params, stream=False):
         """
         Query the LimeSurvey API
 
@@ -50,67 +231,271 @@ class LimeSurvey(object):
         parameters as positional. OrderedDict should be used to ensure this,
         otherwise some calls may randomly fail.
 
+        If the API says the session key is invalid (e.g. it expired), and the
+        session was opened by this client, the client re-authenticates once
+        and repeats the call with the new key.
+
         Parameters
         :param method: Name of API method to call.
         :type method: String
         :param params: Parameters to the specified API call.
         :type params: OrderedDict
+        :param stream: If True, and the result is an array or a string,
+          return a ResultStream of its elements or text, which are decoded as
+          the response is read. The connection, concurrency_limiter slot and
+          pooled session key are in use until the stream is consumed or
+          closed, and an error while reading it counts as a failure for the
+          circuit_breaker.
+        :type stream: Bool
+
+        Requests are limited by the rate_limiter and concurrency_limiter,
+        refused while the circuit_breaker is open, and failed requests retried
+        as allowed by the retry_policy, if the client has them.
 
         Return
         :return: result of API call
         :raise: requests.ConnectionError
         :raise: LimeSurveyError if the API returns an error (either http error
-            or error message in body)
+            or error message in body), or the circuit breaker is open.
         """
+        if self.tracer is None:
+            return self._query(method, params, stream)
+        with query_span(self.tracer, method, params) as span:
+            result = self._query(method, params, stream)
+            tag_result(span, result)
+            return result
+
+    def _query(self, method, params, stream=False):
         if not self.session_key and not method == "get_session_key":
             raise LimeSurveyError(method, "No session open", params)
 
+        if (self.session_pool is not None and "sSessionKey" in params and
+                not method == "release_session_key"):
+            return self._query_pooled(method, params, stream)
+
+        result = self._send(method, params, stream)
+        if self._password is not None and is_invalid_session(params, result):
+            params = OrderedDict(params)
+            params["sSessionKey"] = self._reauthenticate(params["sSessionKey"])
+            result = self._send(method, params, stream)
+        return result
+
+    def _query_pooled(self, method, params, stream=False):
+        params = OrderedDict(params)
+        with ExitStack() as stack:
+            lease = stack.enter_context(self.session_pool.lease())
+            params["sSessionKey"] = lease.session_key
+            result = self._send(method, params, stream)
+            if (self._password is not None and
+                    is_invalid_session(params, result)):
+                lease.session_key = self._get_session_key(self._password)
+                params["sSessionKey"] = lease.session_key
+                result = self._send(method, params, stream)
+            if isinstance(result, ResultStream):
+                # The key is in use until the stream is closed.
+                result.on_close(stack.pop_all().close)
+        return result
+
+    def _send(self, method, params, stream=False):
+        info = None
+        if self.instruments:
+            info = RequestInfo(method, self.instruments)
+
         # 1. Prepare the request data
-        data = OrderedDict([
-            ("method", method),
-            ("params", params),
-            ("id", 1)  # Possibly a request id for parallel use cases.
-        ])
-        data_json = json.dumps(data)
+        request_id = next(self.request_ids)
+        data_json = encode_request(method, params, request_id)
+        if info is not None:
+            info.begin(request_id, data_json)
 
         # 2. Query the API
-        response = requests.post(
-            self.url, headers=self.headers, data=data_json)
+        try:
+            release = self._acquire(method)
+            try:
+                response = self._post(method, data_json, stream, info)
+                if not stream:
+                    if info is not None:
+                        info.received(response.status_code, response.content)
+                    result = decode_response(
+                        method, response.status_code, response.content)
+                else:
+                    result = self._decode_stream(method, response, info)
+            except BaseException:
+                release(True)
+                raise
+        except BaseException as e:
+            if info is not None:
+                info.finish(error=e)
+            raise
+        if isinstance(result, ResultStream):
+            # The request is in progress until the stream is closed, and
+            # fails if reading it fails.
+            result.on_close(lambda: release(result.error is not None))
+            result.on_close(response.close)
+            if info is not None:
+                result.on_close(info.finish)
+            return result
+        release(False)
+        if stream:
+            response.close()
+        if info is not None:
+            info.finish(result)
+        return result
 
-        if not response.ok:
-            raise LimeSurveyError(
-                method, "Not response.ok", response.status_code,
-                response.content)
+    @staticmethod
+    def _decode_stream(method, response, info):
+        chunks = response.iter_content(STREAM_CHUNK_SIZE)
+        if info is not None:
+            info.received(response.status_code)
+            chunks = info.count(chunks)
+        try:
+            return decode_response_stream(
+                method, response.status_code, chunks)
+        except BaseException:
+            response.close()
+            raise
 
-        if not 0 < len(response.content):
-            raise LimeSurveyError(
-                method, "Not 0 < len(response.content)",
-                response.status_code, response.content)
+    def _acquire(self, method):
+        """
+        Apply the circuit_breaker and concurrency_limiter to a request.
 
-        response_data = response.json()
+        Return
+        :return: function to call once the request is done (including
+          reading a streamed response), with True if it failed.
+        :raise: LimeSurveyError if the circuit breaker is open.
+        """
+        breaker = self.circuit_breaker
+        limiter = self.concurrency_limiter
+        if breaker is not None and not breaker.allow():
+            raise LimeSurveyError(method, "Circuit breaker open")
+        if limiter is not None:
+            limiter.acquire()
+        began = time.monotonic()
 
+        def release(failed):
+            if limiter is not None:
+                limiter.release(time.monotonic() - began, failed)
+            if breaker is not None:
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+        return release
+
+    @contextmanager
+    def _guard(self, method):
+        """
+        Apply the circuit_breaker and concurrency_limiter to a request made
+        in the with block.
+        """
+        release = self._acquire(method)
+        failed = True
         try:
-            return_value = response_data.get("result")
-        except KeyError:
-            raise LimeSurveyError(
-                method, "Key 'result' not in response json",
-                response.status_code, response.content)
+            yield
+            failed = False
+        finally:
+            release(failed)
 
-        return return_value
+    def _post(self, method, data_json, stream=False, info=None):
+        """
+        Send a request, after the rate_limiter allows, and as many times as
+        the retry_policy allows, counting retries in the RequestInfo.
+        """
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.transport.post(
+                    self.url, headers=self.headers, data=data_json,
+                    stream=stream)
+            except self.transport.errors as e:
+                delay = retry_delay(
+                    self.retry_policy, method, attempt,
+                    connect_error=self.transport.is_connect_error(e))
+                if delay is None:
+                    raise
+            else:
+                if response.status_code < 400:
+                    return response
+                delay = retry_delay(
+                    self.retry_policy, method, attempt,
+                    status_code=response.status_code)
+                if delay is None:
+                    return response
+                response.close()
+            time.sleep(delay)
+            attempt += 1
+            if info is not None:
+                info.retries = attempt
 
-    def close(self):
+    def batch(self, max_size=100, max_workers=8):
         """
-        Close an open session in LimeSurvey.
+        Start a batch of calls to send together.
+
+        Component methods called on the batch (e.g.
+        batch.token.get_participant_properties) return a BatchCall, whose
+        result() is available once the batch is sent. See Batch for details.
+
+        Parameters
+        :param max_size: Maximum number of calls per batch request.
+        :type max_size: Integer
+        :param max_workers: Maximum concurrent requests if the server doesn't
+          accept batch requests.
+        :type max_workers: Integer
+
+        Return
+        :return: Batch, which sends its calls on leaving a with block.
         """
-        method = "release_session_key"
-        params = OrderedDict([
-            ("sSessionKey", self.session_key)
-        ])
-        response = self.query(method=method, params=params)
+        return Batch(self, max_size=max_size, max_workers=max_workers)
+
+    def close(self, release=None):
+        """
+        Close an open session in LimeSurvey, and the transport connections.
 
-        if response == "OK":
+        Parameters
+        :param release: If True, release the session key(s) in LimeSurvey. By
+          default they are released unless the client has a session_store
+          (and no session_pool), in which case the key is left open for other
+          clients to reuse.
+        :type release: Bool
+        """
+        if release is None:
+            release = (
+                self.session_store is None or self.session_pool is not None)
+        if not release:
+            self.transport.close()
+            self.session_pool = None
             self.session_key = None
-        else:
-            raise LimeSurveyError(method, "Did not receive 'OK' response")
+            self._password = None
+            return None
+        if self.session_pool is not None:
+            return self._close_pool()
+
+        try:
+            response = self.query(
+                method=RELEASE_METHOD, params=release_params(self.session_key))
+        finally:
+            self.transport.close()
+
+        check_released(response)
+        if self.session_store is not None:
+            self.session_store.delete(
+                self.url, self.username, self.session_key)
+        self.session_key = None
+        self._password = None
+        return response
 
+    def _close_pool(self):
+        """
+        Release all the session keys in the session_pool.
+        """
+        try:
+            for session_key in self.session_pool.session_keys:
+                response = check_released(self.query(
+                    method=RELEASE_METHOD, params=release_params(session_key)))
+        finally:
+            self.transport.close()
+        self.session_pool = None
+        self.session_key = None
+        self._password = None
         return response
@@ -0,0 +1,397 @@
+import asyncio
+import bisect
+import threading
+import time
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api._token import LEFT_TO_SEND
+
+try:
+    import aiohttp
+except ImportError:
+    aiohttp = None
+
+# Upper bounds (seconds) of the latency histogram buckets.
+LATENCY_BUCKETS = (
+    0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+    30, 60)
+# Upper bounds (bytes) of the payload size histogram buckets.
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216,
+    67108864)
+PHASES = ("serialize", "network", "decode", "total")
+# Categories of status results and errors, so metric labels are a fixed set.
+STATUS_CATEGORIES = (
+    "ok", "left_to_send", "auth", "permission", "not_found", "invalid_input",
+    "http", "transport", "error")
+# Known statuses (in lower case, without any "Error: " prefix) by category.
+KNOWN_STATUSES = {
+    "invalid session key": "auth",
+    "invalid user name or password": "auth",
+    "no session open": "auth",
+    "no permission": "permission",
+    "invalid user": "not_found",
+    "invalid survey id": "not_found",
+    "invalid surveyid": "not_found",
+    "invalid tokenid": "not_found",
+    "invalid token id": "not_found",
+    "no valid data": "invalid_input",
+    "not response.ok": "http",
+    "not 0 < len(response.content)": "http",
+    "circuit breaker open": "transport",
+}
+# Prefixes of other statuses, by category, e.g. "No surveys found".
+STATUS_PREFIXES = (
+    ("no ", "not_found"),
+    ("invalid ", "invalid_input"),
+    ("illegal ", "invalid_input"),
+    ("more than 1 ", "invalid_input"),
+)
+
+
+class RequestInfo(object):
+    """
+    Measurements of one request, passed to the hooks of the instruments.
+
+    Durations are in seconds, and None if the request failed before that
+    phase. The network phase covers waiting for the rate_limiter, sending,
+    retries and reading the response (unless streamed). The decode phase of
+    a streamed result lasts until the stream is consumed or closed, and
+    response_bytes is then the number of bytes read.
+
+    Attributes
+    :param method: Name of API method called.
+    :param request_id: JSON-RPC id of the request.
+    :param serialize: Seconds to encode the request.
+    :param network: Seconds to get the response.
+    :param decode: Seconds to decode the response.
+    :param request_bytes: Size of the request body.
+    :param response_bytes: Size of the response body.
+    :param retries: Number of times the request was repeated.
+    :param http_status: HTTP status of the (last) response, or None.
+    :param status: The "status" of a status result (e.g. "OK", or an error
+      message like "Invalid survey ID"), or None.
+    :param error: Exception raised by the request, or None.
+    """
+
+    __slots__ = (
+        "method", "request_id", "started", "serialize", "network", "decode",
+        "request_bytes", "response_bytes", "retries", "http_status",
+        "status", "error", "_mark", "_instruments")
+
+    def __init__(self, method, instruments):
+        self.method = method
+        self.request_id = None
+        self.started = self._mark = time.perf_counter()
+        self.serialize = self.network = self.decode = None
+        self.request_bytes = self.response_bytes = 0
+        self.retries = 0
+        self.http_status = None
+        self.status = None
+        self.error = None
+        self._instruments = instruments
+
+    def _lap(self):
+        now = time.perf_counter()
+        elapsed = now - self._mark
+        self._mark = now
+        return elapsed
+
+    @property
+    def total(self):
+        """Seconds from the start of the request to when it finished."""
+        return self._mark - self.started
+
+    def begin(self, request_id, data_json):
+        """
+        Record the encoded request, and call the before_request hooks.
+        """
+        self.serialize = self._lap()
+        self.request_id = request_id
+        self.request_bytes = len(data_json.encode("utf-8"))
+        for instrument in self._instruments:
+            instrument.before_request(self)
+        self._mark = time.perf_counter()  # Hooks aren't part of the request.
+
+    def received(self, status_code, content=None):
+        """
+        Record the response, or its status if content is streamed.
+        """
+        self.network = self._lap()
+        self.http_status = status_code
+        if content is not None:
+            self.response_bytes = len(content)
+
+    def count(self, chunks):
+        """
+        Count the bytes of streamed response chunks as they are read.
+        """
+        for chunk in chunks:
+            self.response_bytes += len(chunk)
+            yield chunk
+
+    def finish(self, result=None, error=None):
+        """
+        Record the result or error, and call the after_request hooks.
+        """
+        if error is None:
+            self.decode = self._lap()
+            if type(result) is dict and "status" in result:
+                self.status = result["status"]
+        else:
+            self._lap()
+            self.error = error
+        for instrument in self._instruments:
+            instrument.after_request(self)
+
+
+class RequestHooks(object):
+    """
+    Instrument calling functions before and after each request.
+
+    Parameters
+    :param before: Function called with the RequestInfo before the request
+      is sent, or None.
+    :type before: Callable
+    :param after: Function called with the RequestInfo when the request has
+      finished, or None.
+    :type after: Callable
+    """
+
+    def __init__(self, before=None, after=None):
+        self.before = before
+        self.after = after
+
+    def before_request(self, info):
+        if self.before is not None:
+            self.before(info)
+
+    def after_request(self, info):
+        if self.after is not None:
+            self.after(info)
+
+
+def error_category(error):
+    """
+    Category of a request error, from STATUS_CATEGORIES: by the status of a
+    LimeSurveyError (e.g. "http" for "Not response.ok"), "transport" for a
+    connection error or timeout, "http" for an unparseable response, or else
+    "error".
+    """
+    if isinstance(error, LimeSurveyError):
+        return status_category(error.status)
+    if isinstance(error, (OSError, asyncio.TimeoutError)):
+        return "transport"
+    if aiohttp is not None and isinstance(error, aiohttp.ClientError):
+        return "transport"
+    if isinstance(error, ValueError):
+        return "http"
+    return "error"
+
+
+def status_category(status):
+    """
+    Category of a status result, from STATUS_CATEGORIES: "ok" for "OK",
+    "left_to_send" for the "N left to send" of invites and reminders, the
+    category of a known status (e.g. "auth" for "Invalid session key"), or
+    else "error".
+    """
+    if status == "OK":
+        return "ok"
+    status = str(status)
+    if LEFT_TO_SEND.match(status):
+        return "left_to_send"
+    status = status.lower()
+    if status.startswith("error: "):
+        status = status[len("error: "):]
+    category = KNOWN_STATUSES.get(status)
+    if category is not None:
+        return category
+    if "not found" in status:
+        return "not_found"
+    for prefix, category in STATUS_PREFIXES:
+        if status.startswith(prefix):
+            return category
+    return "error"
+
+
+class Histogram(object):
+    """
+    Counts of observed values in buckets of upper bounds, with their sum.
+
+    Parameters
+    :param buckets: Upper bounds of the buckets, in increasing order.
+    :type buckets: Tuple[Float]
+    """
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)  # Last is +Inf.
+        self.sum = 0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        """
+        Return a list of (upper bound, count of values up to it), ending with
+        (float("inf"), count).
+        """
+        total = 0
+        result = []
+        for bound, count in zip(self.buckets + (float("inf"),), self.counts):
+            total += count
+            result.append((bound, total))
+        return result
+
+
+def _labels(**labels):
+    return ",".join(
+        '{0}="{1}"'.format(k, str(v).replace("\\", "\\\\").replace(
+            '"', '\\"').replace("\n", "\\n"))
+        for k, v in labels.items())
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class MetricsRecorder(object):
+    """
+    Instrument recording per-method metrics of requests, thread safe.
+
+    Records histograms of latency (by phase: serialize, network, decode and
+    total) and of request and response sizes, and counts of requests,
+    retries, errors (by error_category) and status results (by
+    status_category).
+
+    Parameters
+    :param latency_buckets: Upper bounds (seconds) of latency buckets.
+    :type latency_buckets: Tuple[Float]
+    :param size_buckets: Upper bounds (bytes) of size buckets.
+    :type size_buckets: Tuple[Integer]
+    """
+
+    def __init__(self, latency_buckets=LATENCY_BUCKETS,
+                 size_buckets=SIZE_BUCKETS):
+        self.latency_buckets = tuple(latency_buckets)
+        self.size_buckets = tuple(size_buckets)
+        self.latency = {}   # (method, phase): Histogram
+        self.sizes = {}     # (method, "request" or "response"): Histogram
+        self.requests = {}  # method: count
+        self.retries = {}   # method: count
+        self.errors = {}    # (method, category): count
+        self.statuses = {}  # (method, status category): count
+        self._lock = threading.Lock()
+
+    def before_request(self, info):
+        pass
+
+    def after_request(self, info):
+        method = info.method
+        with self._lock:
+            for phase in PHASES:
+                value = getattr(info, phase)
+                if value is not None:
+                    self._histogram(
+                        self.latency, (method, phase),
+                        self.latency_buckets).observe(value)
+            self._histogram(self.sizes, (method, "request"),
+                            self.size_buckets).observe(info.request_bytes)
+            if info.error is None:
+                self._histogram(
+                    self.sizes, (method, "response"),
+                    self.size_buckets).observe(info.response_bytes)
+            self._increment(self.requests, method)
+            self._increment(self.retries, method, info.retries)
+            if info.error is not None:
+                self._increment(
+                    self.errors, (method, error_category(info.error)))
+            if info.status is not None:
+                self._increment(
+                    self.statuses, (method, status_category(info.status)))
+
+    @staticmethod
+    def _histogram(histograms, key, buckets):
+        histogram = histograms.get(key)
+        if histogram is None:
+            histogram = histograms[key] = Histogram(buckets)
+        return histogram
+
+    @staticmethod
+    def _increment(counts, key, value=1):
+        counts[key] = counts.get(key, 0) + value
+
+    def reset(self):
+        """
+        Clear the recorded metrics.
+        """
+        with self._lock:
+            for metrics in (self.latency, self.sizes, self.requests,
+                            self.retries, self.errors, self.statuses):
+                metrics.clear()
+
+    def to_prometheus(self, prefix="limesurvey"):
+        """
+        Return the metrics in the Prometheus text exposition format.
+
+        Parameters
+        :param prefix: Prefix of the metric names.
+        :type prefix: String
+
+        Return
+        :return: text, e.g. to serve at a /metrics endpoint.
+        """
+        lines = []
+        with self._lock:
+            self._write_histograms(
+                lines, prefix + "_request_duration_seconds",
+                "RC2API request latency by phase.", self.latency,
+                ("method", "phase"))
+            self._write_histograms(
+                lines, prefix + "_payload_bytes",
+                "RC2API request and response body sizes.", self.sizes,
+                ("method", "direction"))
+            self._write_counter(
+                lines, prefix + "_requests_total", "RC2API requests.",
+                {(k,): v for k, v in self.requests.items()}, ("method",))
+            self._write_counter(
+                lines, prefix + "_retries_total",
+                "RC2API requests repeated after a failure.",
+                {(k,): v for k, v in self.retries.items()}, ("method",))
+            self._write_counter(
+                lines, prefix + "_errors_total",
+                "RC2API requests that raised an error, by category.",
+                self.errors, ("method", "category"))
+            self._write_counter(
+                lines, prefix + "_status_results_total",
+                "RC2API results that were a status, by category.",
+                self.statuses, ("method", "status"))
+        return "".join(x + "\n" for x in lines)
+
+    @staticmethod
+    def _write_histograms(lines, name, help_text, histograms, label_names):
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} histogram".format(name))
+        for key in sorted(histograms):
+            histogram = histograms[key]
+            labels = dict(zip(label_names, key))
+            for bound, count in histogram.cumulative():
+                lines.append("{0}_bucket{{{1}}} {2}".format(
+                    name, _labels(**dict(labels, le=_number(bound))), count))
+            lines.append("{0}_sum{{{1}}} {2}".format(
+                name, _labels(**labels), _number(histogram.sum)))
+            lines.append("{0}_count{{{1}}} {2}".format(
+                name, _labels(**labels), histogram.count))
+
+    @staticmethod
+    def _write_counter(lines, name, help_text, counts, label_names):
+        lines.append("# HELP {0} {1}".format(name, help_text))
+        lines.append("# TYPE {0} counter".format(name))
+        for key in sorted(counts):
+            lines.append("{0}{{{1}}} {2}".format(
+                name, _labels(**dict(zip(label_names, key))), counts[key]))
@@ -0,0 +1,287 @@
+import csv
+import io
+import os
+from array import array
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import zip_longest
+
+# Bytes of CSV to parse per worker task.
+PARSE_CHUNK_SIZE = 8 * 1024 * 1024
+# Bytes to read at a time while finding record boundaries.
+READ_BLOCK_SIZE = 1024 * 1024
+# Question types (from list_questions) with numeric answers.
+NUMERIC_QUESTION_TYPES = frozenset(["N", "K"])
+# Response table columns that aren't questions, with their type.
+RESPONSE_FIELD_TYPES = {"id": "int", "lastpage": "float"}
+# Replacements used to convert blank values with map, without a loop.
+_BLANK_NUMBERS = {"": "nan"}
+_BLANK_STRINGS = {"": None}
+
+
+def record_end(data, start, parity=0):
+    """
+    Find the end of the CSV record containing data[start], that is, the next
+    newline that is not inside a quoted value.
+
+    Parameters
+    :param data: CSV data.
+    :type data: Bytes
+    :param start: Index to search from.
+    :type start: Integer
+    :param parity: Number of quotes before start, modulo 2.
+    :type parity: Integer
+
+    Return
+    :return: tuple of (index after the newline, or -1 if none is found, and
+      the number of quotes before that index (or the end), modulo 2).
+    """
+    while True:
+        newline = data.find(b"\n", start)
+        if newline < 0:
+            return -1, (parity + data.count(b'"', start)) % 2
+        parity = (parity + data.count(b'"', start, newline)) % 2
+        start = newline + 1
+        if parity == 0:
+            return start, parity
+
+
+def split_records(path, chunk_size=PARSE_CHUNK_SIZE, start=0):
+    """
+    Split a CSV file into chunks of whole records.
+
+    Quotes are counted from start, so that a newline inside a quoted value
+    (e.g. a multi-line text answer) is not taken as the end of a record.
+
+    Parameters
+    :param path: Path of the CSV file.
+    :type path: String
+    :param chunk_size: Approximate bytes per chunk.
+    :type chunk_size: Integer
+    :param start: Offset of the first record to include (after the header).
+    :type start: Integer
+
+    Return
+    :return: list of (start, end) byte offsets of the chunks.
+    """
+    size = os.path.getsize(path)
+    boundaries = [start]
+    target = start + chunk_size
+    parity = 0
+    with open(path, "rb") as csv_file:
+        csv_file.seek(start)
+        position = start
+        while True:
+            block = csv_file.read(READ_BLOCK_SIZE)
+            if not block:
+                break
+            offset = 0
+            while target < position + len(block):
+                if offset < target - position:
+                    # Skip ahead to the target, counting quotes on the way.
+                    skip = target - position
+                    parity = (parity + block.count(b'"', offset, skip)) % 2
+                    offset = skip
+                end, parity = record_end(block, offset, parity)
+                if end < 0:
+                    offset = len(block)
+                    break
+                offset = end
+                boundaries.append(position + end)
+                target = position + end + chunk_size
+            else:
+                parity = (parity + block.count(b'"', offset)) % 2
+            position += len(block)
+    if boundaries[-1] < size:
+        boundaries.append(size)
+    return list(zip(boundaries, boundaries[1:]))
+
+
+def read_header(path):
+    """
+    Read the header record of a CSV file.
+
+    Return
+    :return: tuple of (field names, byte offset of the first record).
+    """
+    with open(path, "rb") as csv_file:
+        data = b""
+        end = -1
+        while end < 0:
+            block = csv_file.read(READ_BLOCK_SIZE)
+            if not block:
+                end = len(data)
+                break
+            data += block
+            end, _ = record_end(data, 0)
+    text = data[:end].decode("utf-8-sig")
+    return next(csv.reader(io.StringIO(text, newline=""))), end
+
+
+def column_types(fields, questions):
+    """
+    Types of the response columns, from the questions in the survey.
+
+    Columns are matched to questions by code, so the export should use
+    heading_type="code". The columns of subquestions (e.g. "Q1[SQ001]")
+    have the type of their parent question.
+
+    Parameters
+    :param fields: Column names, from the CSV header.
+    :type fields: List[String]
+    :param questions: Questions, from list_questions.
+    :type questions: List[Dict]
+
+    Return
+    :return: dict of field: "int", "float" or "str".
+    """
+    question_types = {
+        x["title"]: x.get("type") for x in questions or []
+        if str(x.get("parent_qid", 0)) == "0"}
+    types = {}
+    for field in fields:
+        code = field.split("[", 1)[0]
+        if field in RESPONSE_FIELD_TYPES:
+            types[field] = RESPONSE_FIELD_TYPES[field]
+        elif question_types.get(code) in NUMERIC_QUESTION_TYPES:
+            types[field] = "float"
+        else:
+            types[field] = "str"
+    return types
+
+
+def convert_column(values, column_type):
+    """
+    Convert a column of CSV strings, using map so there's no Python loop.
+
+    Integers are stored in an int64 array, and floats in a double array,
+    with blanks as NaN (so an int column with blanks becomes float). Blank
+    strings become None. A column with values that don't convert is left as
+    strings.
+    """
+    try:
+        if column_type == "int":
+            try:
+                return array("q", map(int, values))
+            except ValueError:
+                column_type = "float"
+        if column_type == "float":
+            return array(
+                "d", map(float, map(_BLANK_NUMBERS.get, values, values)))
+    except ValueError:
+        pass
+    return list(map(_BLANK_STRINGS.get, values, values))
+
+
+def join_columns(parts):
+    """
+    Join the parts of a column from each chunk, in order.
+
+    Arrays are joined as an array, promoted to float if any part is float.
+    If any part is a list (strings), the column is a list, so the parts
+    should then all be lists (see string_columns).
+    """
+    typecodes = set(getattr(x, "typecode", None) for x in parts)
+    if None in typecodes or not parts:
+        column = []
+    elif "d" in typecodes:
+        column = array("d")
+    else:
+        column = array("q")
+    for part in parts:
+        if getattr(part, "typecode", None) != getattr(
+                column, "typecode", None):
+            part = array("d", part)  # An int part of a float column.
+        column.extend(part)
+    return column
+
+
+def string_columns(parts):
+    """
+    Indexes of the columns that were left as strings in some chunks, but
+    converted to numbers in others.
+
+    Parameters
+    :param parts: Columns of each chunk, from parse_chunk.
+    :type parts: List[List]
+
+    Return
+    :return: list of column indexes.
+    """
+    return [i for i, columns in enumerate(zip(*parts))
+            if len(set(isinstance(x, list) for x in columns)) == 2]
+
+
+def parse_chunk(path, start, end, fields, types):
+    """
+    Parse a chunk of CSV records into typed columns.
+
+    Return
+    :return: list of columns, in the order of fields.
+    """
+    with open(path, "rb") as csv_file:
+        csv_file.seek(start)
+        text = csv_file.read(end - start).decode("utf-8")
+    rows = csv.reader(io.StringIO(text, newline=""))
+    columns = list(zip_longest(*rows, fillvalue=""))[:len(fields)]
+    columns += [()] * (len(fields) - len(columns))
+    return [convert_column(values, types[field])
+            for field, values in zip(fields, columns)]
+
+
+def parse_responses_csv(path, questions=None, max_workers=None,
+                        chunk_size=PARSE_CHUNK_SIZE):
+    """
+    Parse an exported responses CSV file into typed columns, in parallel.
+
+    The file is split into chunks of whole records, which are parsed by a
+    pool of max_workers processes, and the columns of the chunks joined in
+    order. Columns of numeric questions and lastpage are floats (NaN if
+    blank), the id column is integers, and other columns are strings (None
+    if blank). A numeric column with a value that doesn't convert, in any
+    chunk, is strings in all chunks.
+
+    Parameters
+    :param path: Path of the CSV file, e.g. from export_responses.
+    :type path: String
+    :param questions: Questions, from list_questions, to type the columns.
+    :type questions: List[Dict]
+    :param max_workers: Number of processes, or None for the CPU count.
+    :type max_workers: Integer
+    :param chunk_size: Approximate bytes of CSV per task.
+    :type chunk_size: Integer
+
+    Return
+    :return: OrderedDict of column name (question code): list of values.
+    """
+    fields, start = read_header(path)
+    types = column_types(fields, questions)
+    chunks = split_records(path, chunk_size, start)
+    parts = _parse_chunks(path, chunks, fields, types, max_workers)
+    # A column that is strings in any chunk is strings in all of them, so
+    # the chunks where it was converted to numbers are parsed again.
+    strings = string_columns(parts)
+    if strings:
+        types = dict(types)
+        types.update((fields[i], "str") for i in strings)
+        again = [j for j, part in enumerate(parts)
+                 if any(not isinstance(part[i], list) for i in strings)]
+        reparsed = _parse_chunks(
+            path, [chunks[j] for j in again], fields, types, max_workers)
+        for j, part in zip(again, reparsed):
+            for i in strings:
+                parts[j][i] = part[i]
+    return OrderedDict(
+        (field, join_columns([x[i] for x in parts]))
+        for i, field in enumerate(fields))
+
+
+def _parse_chunks(path, chunks, fields, types, max_workers):
+    """Parse the chunks, in processes if there is more than one."""
+    if len(chunks) < 2 or max_workers == 1:
+        return [parse_chunk(path, s, e, fields, types) for s, e in chunks]
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [
+            executor.submit(parse_chunk, path, s, e, fields, types)
+            for s, e in chunks]
+        return [x.result() for x in futures]
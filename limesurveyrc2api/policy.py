@@ -0,0 +1,304 @@
+import random
+import threading
+import time
+
+# RC2API methods that only read data, so are safe to repeat.
+READ_METHODS = frozenset([
+    "get_session_key",
+    "export_responses",
+    "export_responses_by_token",
+    "get_group_properties",
+    "get_language_properties",
+    "get_participant_properties",
+    "get_question_properties",
+    "get_response_ids",
+    "get_summary",
+    "get_survey_properties",
+    "get_uploaded_files",
+    "list_groups",
+    "list_participants",
+    "list_questions",
+    "list_survey_groups",
+    "list_surveys",
+    "list_users",
+])
+
+
+class RetryPolicy(object):
+    """
+    When and how long to wait before repeating a failed query.
+
+    Read methods are retried after any connection error, timeout or
+    retryable HTTP status. Other methods change data, so they are only
+    retried if the request can't have been processed: that is, if the
+    connection could not be made, or the server refused the request with a
+    write-safe HTTP status (e.g. 503 from a proxy or overloaded PHP pool).
+
+    The wait before retry n (from 0) is chosen at random between 0 and
+    backoff * 2 ** n, up to max_backoff ("full jitter"), so that many
+    clients failing at once don't all retry at once.
+
+    Parameters
+    :param max_attempts: Maximum number of times to send a query.
+    :type max_attempts: Integer
+    :param backoff: Seconds of the maximum wait before the first retry.
+    :type backoff: Float
+    :param max_backoff: Largest maximum wait in seconds.
+    :type max_backoff: Float
+    :param retry_statuses: HTTP statuses to retry read methods for.
+    :type retry_statuses: Iterable[Integer]
+    :param write_retry_statuses: HTTP statuses to retry any method for.
+    :type write_retry_statuses: Iterable[Integer]
+    :param read_methods: Names of methods that are safe to repeat.
+    :type read_methods: Iterable[String]
+    """
+
+    def __init__(self, max_attempts=4, backoff=0.5, max_backoff=30,
+                 retry_statuses=(429, 500, 502, 503, 504),
+                 write_retry_statuses=(429, 503), read_methods=READ_METHODS):
+        self.max_attempts = max_attempts
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.retry_statuses = frozenset(retry_statuses)
+        self.write_retry_statuses = frozenset(write_retry_statuses)
+        self.read_methods = frozenset(read_methods)
+
+    def should_retry(self, method, attempt, status_code=None,
+                     connect_error=False):
+        """
+        Check if a failed query should be sent again.
+
+        Parameters
+        :param method: Name of API method that was called.
+        :type method: String
+        :param attempt: Number of the failed attempt, from 0.
+        :type attempt: Integer
+        :param status_code: HTTP status of the response, or None if the
+          request failed without a response.
+        :type status_code: Integer
+        :param connect_error: True if the request failed before it was sent,
+          while connecting.
+        :type connect_error: Bool
+        """
+        if not attempt + 1 < self.max_attempts:
+            return False
+        is_read = method in self.read_methods
+        if status_code is None:
+            return is_read or connect_error
+        if is_read:
+            return status_code in self.retry_statuses
+        return status_code in self.write_retry_statuses
+
+    def delay(self, attempt):
+        """
+        Seconds to wait before retrying after the failed attempt (from 0).
+        """
+        limit = min(self.max_backoff, self.backoff * 2 ** attempt)
+        return random.uniform(0, limit)
+
+
+def retry_delay(policy, method, attempt, status_code=None,
+                connect_error=False):
+    """
+    Seconds to wait before sending a failed query again, or None to not.
+
+    See RetryPolicy.should_retry for the parameters.
+
+    Parameters
+    :param policy: Policy for retrying failed requests, or None to not retry.
+    :type policy: RetryPolicy
+    """
+    if policy is None or not policy.should_retry(
+            method, attempt, status_code=status_code,
+            connect_error=connect_error):
+        return None
+    return policy.delay(attempt)
+
+
+class TokenBucket(object):
+    """
+    Rate limiter allowing bursts, shared by the threads using a client.
+
+    Tokens are added at rate per second, up to capacity, and each query takes
+    one. A query without a token waits until its token would be added.
+
+    Parameters
+    :param rate: Average number of queries per second.
+    :type rate: Float
+    :param capacity: Maximum burst of queries. Defaults to rate (or 1).
+    :type capacity: Float
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self, tokens=1):
+        """
+        Take tokens, and return the seconds to wait before using them.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= tokens
+            if 0 <= self._tokens:
+                return 0
+            return -self._tokens / self.rate
+
+    def acquire(self, tokens=1):
+        """
+        Take tokens, waiting until they are available.
+        """
+        wait = self.reserve(tokens)
+        if 0 < wait:
+            time.sleep(wait)
+
+
+class AIMDLimiter(object):
+    """
+    Limit on concurrent queries, adapted to the server's latency.
+
+    The limit grows by about 1 per limit's worth of queries completing within
+    latency_threshold (additive increase), and is multiplied by
+    decrease_ratio when a query fails or is slower (multiplicative decrease),
+    at most once per latency_threshold. Threads wait in acquire() while the
+    limit is reached. The current limit and in_flight count can be read for
+    monitoring.
+
+    Parameters
+    :param initial: Concurrency limit to start from.
+    :type initial: Integer
+    :param minimum: Smallest limit to decrease to.
+    :type minimum: Integer
+    :param maximum: Largest limit to increase to.
+    :type maximum: Integer
+    :param latency_threshold: Seconds after which a query counts as slow.
+    :type latency_threshold: Float
+    :param decrease_ratio: Factor to decrease the limit by.
+    :type decrease_ratio: Float
+    """
+
+    def __init__(self, initial=8, minimum=1, maximum=64,
+                 latency_threshold=5.0, decrease_ratio=0.5):
+        self._limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.latency_threshold = latency_threshold
+        self.decrease_ratio = decrease_ratio
+        self.in_flight = 0
+        self._decreased = float("-inf")
+        self._condition = threading.Condition()
+
+    @property
+    def limit(self):
+        """Current maximum number of concurrent queries."""
+        return int(self._limit)
+
+    def acquire(self, timeout=None):
+        """
+        Wait until a query may start, and count it as in flight.
+
+        Return
+        :return: False if the timeout passed first, otherwise True.
+        """
+        with self._condition:
+            acquired = self._condition.wait_for(
+                lambda: self.in_flight < self.limit, timeout=timeout)
+            if acquired:
+                self.in_flight += 1
+            return acquired
+
+    def release(self, elapsed, failed=False):
+        """
+        Count a query as finished, and adjust the limit for its outcome.
+
+        Parameters
+        :param elapsed: Seconds the query took.
+        :type elapsed: Float
+        :param failed: True if the query failed.
+        :type failed: Bool
+        """
+        with self._condition:
+            self.in_flight -= 1
+            now = time.monotonic()
+            if failed or elapsed > self.latency_threshold:
+                if now - self._decreased > self.latency_threshold:
+                    self._limit = max(
+                        self.minimum, self._limit * self.decrease_ratio)
+                    self._decreased = now
+            else:
+                self._limit = min(
+                    self.maximum, self._limit + 1 / self._limit)
+            self._condition.notify_all()
+
+
+class CircuitBreaker(object):
+    """
+    Fails queries fast while the server is failing.
+
+    After failure_threshold consecutive failed queries (connection errors,
+    HTTP errors or empty responses), the breaker opens, and queries are
+    refused for reset_timeout seconds. Then it is half open: one query at a
+    time is let through as a probe, which closes the breaker if it succeeds,
+    or re-opens it if it fails. The current state can be read for monitoring.
+
+    Parameters
+    :param failure_threshold: Consecutive failures that open the breaker.
+    :type failure_threshold: Integer
+    :param reset_timeout: Seconds to refuse queries for once open.
+    :type reset_timeout: Float
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self._opened = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        """One of CLOSED, OPEN or HALF_OPEN."""
+        opened = self._opened
+        if opened is None:
+            return self.CLOSED
+        if time.monotonic() - opened < self.reset_timeout:
+            return self.OPEN
+        return self.HALF_OPEN
+
+    def allow(self):
+        """
+        Check if a query may be sent now. If True, its outcome must be
+        recorded with record_success or record_failure.
+        """
+        with self._lock:
+            state = self.state
+            if state == self.CLOSED:
+                return True
+            if state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self._opened = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._probing or self.failures >= self.failure_threshold:
+                self._opened = time.monotonic()
+            self._probing = False
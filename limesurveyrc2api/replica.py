@@ -0,0 +1,283 @@
+import json
+import sqlite3
+import threading
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.table import flatten_participant
+from limesurveyrc2api._token import next_page_start, NO_PARTICIPANTS
+
+# list_participants attributes kept by every replica.
+SYNCED_ATTRIBUTES = ("completed", "sent")
+# Upper bound for dates; "N" and "Y" values sort after it.
+MAX_DATE = "9999-12-31 23:59:59"
+# get_summary stats counting the participants with a synced value not "N".
+DATED_STATS = {"completed": "token_completed", "sent": "token_sent"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS participant (
+    tid INTEGER PRIMARY KEY,
+    token TEXT,
+    email TEXT,
+    completed TEXT,
+    sent TEXT,
+    data TEXT NOT NULL,
+    generation INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS participant_token ON participant (token);
+CREATE INDEX IF NOT EXISTS participant_email ON participant (email);
+CREATE TABLE IF NOT EXISTS sync_state (
+    name TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+class ParticipantReplica(object):
+    """
+    Local copy of a survey's participants, for fast repeated lookups.
+
+    Participants are kept in a SQLite database, indexed by tid, token and
+    (lower case) email. The first sync lists all participants. Later syncs
+    only list participants with a tid above the highest one seen, and those
+    whose completed or sent date is at or after the latest one seen. Other
+    changes (e.g. an edited email, or a deleted participant) are only picked
+    up by a full sync. Dates are compared as text, so "Y" (a completed date
+    not recorded, in anonymous surveys) is only picked up by a full sync.
+
+    The API takes one condition per column, so the server can't filter on a
+    date range that leaves out "N" and "Y" (which sort after dates). For
+    each of completed and sent, the server lists either the participants
+    with a value other than "N", or those with a value at or after the
+    latest date, whichever the survey summary counts fewer of, and the
+    participants without a newer date are dropped locally.
+
+    A replica can be used by many threads; lookups don't wait for a sync
+    in progress to finish, but see the data as of the last committed page.
+
+    Parameters
+    :param api: Client to sync participants with.
+    :type api: LimeSurvey
+    :param survey_id: ID of survey to replicate participants of.
+    :type survey_id: Integer
+    :param path: SQLite database file, or ":memory:" to not keep it.
+    :type path: String
+    :param attributes: Extra attributes to list and keep, besides completed
+      and sent.
+    :type attributes: List[String]
+    :param page_size: Number of participants to list per request.
+    :type page_size: Integer
+    """
+
+    def __init__(self, api, survey_id, path=":memory:", attributes=None,
+                 page_size=1000):
+        self.api = api
+        self.survey_id = survey_id
+        self.path = path
+        self.attributes = list(SYNCED_ATTRIBUTES) + [
+            x for x in attributes or [] if x not in SYNCED_ATTRIBUTES]
+        self.page_size = page_size
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def _get_state(self, name, default=None):
+        row = self._db.execute(
+            "SELECT value FROM sync_state WHERE name = ?", (name,)).fetchone()
+        return default if row is None else row[0]
+
+    def _set_state(self, name, value):
+        self._db.execute(
+            "INSERT OR REPLACE INTO sync_state (name, value) VALUES (?, ?)",
+            (name, str(value)))
+
+    def _participants(self, conditions):
+        """
+        List the participants matching the conditions, a page at a time.
+
+        Return
+        :return: iterator of participants.
+        :raise: LimeSurveyError if the API returns a status instead of a
+          page, e.g. for a condition it doesn't accept.
+        """
+        start = 0
+        while start is not None:
+            try:
+                page = self.api.token.list_participants(
+                    self.survey_id, start=start, limit=self.page_size,
+                    attributes=self.attributes, conditions=conditions)
+            except LimeSurveyError as e:
+                if e.status == NO_PARTICIPANTS:
+                    return
+                raise
+            if isinstance(page, dict):
+                raise LimeSurveyError(
+                    "list_participants", page.get("status"))
+            yield from page
+            start = next_page_start(start, len(page), self.page_size)
+
+    def _pull(self, conditions, generation=0, keep=None):
+        """
+        List participants matching the conditions, and store them with the
+        sync generation. If keep is given, only participants for which it
+        returns True are stored.
+
+        Return
+        :return: tuple of (number stored, highest tid).
+        """
+        participants = self._participants(conditions)
+        count = 0
+        max_tid = 0
+        rows = []
+        for participant in participants:
+            flat = flatten_participant(participant)
+            tid = int(flat["tid"])
+            max_tid = max(max_tid, tid)
+            if keep is not None and not keep(flat):
+                continue
+            email = flat.get("email")
+            rows.append((
+                tid, flat.get("token"), email.lower() if email else email,
+                flat.get("completed"), flat.get("sent"), json.dumps(flat),
+                generation))
+            if len(rows) >= self.page_size:
+                count += self._store(rows)
+                rows = []
+        count += self._store(rows)
+        return count, max_tid
+
+    def _store(self, rows):
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO participant "
+                "(tid, token, email, completed, sent, data, generation) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+        return len(rows)
+
+    def _latest(self, column):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT MAX({0}) FROM participant "
+                "WHERE {0} BETWEEN '0' AND ?".format(column),
+                (MAX_DATE,)).fetchone()
+        return row[0]
+
+    @staticmethod
+    def _changed(column, date, dated, total):
+        """
+        Condition to list the participants whose column may have changed
+        since the date, as few as the API's operators allow.
+
+        Parameters
+        :param column: Either "completed" or "sent".
+        :type column: String
+        :param date: Latest date of the column in the replica.
+        :type date: String
+        :param dated: Number of participants with a column value not "N".
+        :type dated: Integer
+        :param total: Number of participants in the survey.
+        :type total: Integer
+        """
+        if dated < total - dated:
+            return {column: ["<>", "N"]}
+        # Also lists the "N" and "Y" values, but there are fewer of those.
+        return {column: [">=", date]}
+
+    def sync(self, full=False):
+        """
+        Update the replica from the server.
+
+        Parameters
+        :param full: If True, list all participants, and remove those that
+          are no longer in the survey.
+        :type full: Bool
+
+        Return
+        :return: dict with the number of participants "added" (new tids) and
+          "updated" (listed again, as they may have changed).
+        """
+        with self._lock:
+            high_water = int(self._get_state("high_water", 0))
+            generation = int(self._get_state("generation", 0))
+        if full or not high_water:
+            # Participants not listed in this generation were deleted.
+            generation += 1
+            before = len(self)
+            pulled, high_water = self._pull(None, generation)
+            with self._lock, self._db:
+                deleted = self._db.execute(
+                    "DELETE FROM participant WHERE generation < ?",
+                    (generation,)).rowcount
+                self._set_state("generation", generation)
+            added = len(self) - before + deleted
+            updated = pulled - added
+        else:
+            latest = {x: self._latest(x) for x in SYNCED_ATTRIBUTES}
+            added, max_tid = self._pull(
+                {"tid": [">", high_water]}, generation)
+            high_water = max(high_water, max_tid)
+            summary = self.api.token.get_summary(self.survey_id)
+            total = int(summary["token_count"])
+            updated = 0
+            for column, date in latest.items():
+                if date is None:
+                    date = "0"  # Nothing completed / sent yet.
+                dated = int(summary[DATED_STATS[column]])
+                pulled, _ = self._pull(
+                    self._changed(column, date, dated, total), generation,
+                    lambda x, column=column, date=date:
+                        date <= str(x.get(column)) <= MAX_DATE)
+                updated += pulled
+        with self._lock, self._db:
+            self._set_state("high_water", high_water)
+        return {"added": added, "updated": updated}
+
+    @staticmethod
+    def _decode(row):
+        return None if row is None else json.loads(row[0])
+
+    def get(self, tid):
+        """
+        Return the participant with the tid, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM participant WHERE tid = ?",
+                (int(tid),)).fetchone()
+        return self._decode(row)
+
+    def get_by_token(self, token):
+        """
+        Return the participant with the token, or None.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT data FROM participant WHERE token = ?",
+                (token,)).fetchone()
+        return self._decode(row)
+
+    def find_by_email(self, email):
+        """
+        Return the participants with the email (ignoring case), by tid.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM participant WHERE email = ? ORDER BY tid",
+                (email.lower(),)).fetchall()
+        return [self._decode(x) for x in rows]
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute(
+                "SELECT COUNT(*) FROM participant").fetchone()[0]
+
+    def __iter__(self):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT data FROM participant ORDER BY tid").fetchall()
+        return (self._decode(x) for x in rows)
+
+    def close(self):
+        """
+        Close the database.
+        """
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,239 @@
+import json
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# Status returned by RC2API methods for an unknown or expired session key.
+INVALID_SESSION_KEY = ("Invalid session key", "Invalid Session Key")
+
+
+def is_invalid_session(params, response):
+    """
+    Check if a query result says the session key it was sent with is invalid.
+
+    Parameters
+    :param params: Parameters the API method was called with.
+    :type params: OrderedDict
+    :param response: Result of the API call.
+    """
+    return (
+        "sSessionKey" in params and type(response) is dict and
+        response.get("status") in INVALID_SESSION_KEY)
+
+
+class MemorySessionStore(object):
+    """
+    Session key store, shared by the LimeSurvey clients in a process.
+
+    Keys are stored per RC2API url and username. Stored keys are not checked
+    with the server; a client using an expired key re-authenticates when the
+    server reports it as invalid.
+
+    Parameters
+    :param max_age: Seconds after which a stored key is not used, or None.
+      Should be less than the server session expiry (2 hours by default).
+    :type max_age: Float
+    """
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._keys = {}
+        self._lock = threading.RLock()
+
+    @contextmanager
+    def lock(self, url, username):
+        """
+        Hold exclusive access to the stored key, e.g. while replacing it.
+        """
+        with self._lock:
+            yield
+
+    def _is_fresh(self, created):
+        return self.max_age is None or time.time() - created < self.max_age
+
+    def get(self, url, username):
+        """
+        Return the stored session key, or None.
+        """
+        with self._lock:
+            entry = self._keys.get((url, username))
+        if entry is not None and self._is_fresh(entry[1]):
+            return entry[0]
+        return None
+
+    def set(self, url, username, session_key):
+        """
+        Store a session key.
+        """
+        with self._lock:
+            self._keys[(url, username)] = (session_key, time.time())
+
+    def delete(self, url, username, session_key=None):
+        """
+        Remove the stored session key, if it is session_key (or if None).
+        """
+        with self._lock:
+            entry = self._keys.get((url, username))
+            if entry is not None and session_key in (None, entry[0]):
+                del self._keys[(url, username)]
+
+
+class FileSessionStore(MemorySessionStore):
+    """
+    Session key store, shared by the LimeSurvey clients on a host.
+
+    Keys are kept in memory and in a JSON file, which is locked while it is
+    read or written, so that only one process at a time gets a new key. The
+    file should only be readable by the user running the clients. File
+    locking needs fcntl, so on other platforms only threads are serialised.
+
+    Parameters
+    :param path: Path of the JSON file to store keys in.
+    :type path: String
+    :param max_age: Seconds after which a stored key is not used, or None.
+    :type max_age: Float
+    """
+
+    def __init__(self, path, max_age=3600):
+        super().__init__(max_age=max_age)
+        self.path = path
+        self._lock_depth = 0  # Re-entry count of the thread holding _lock.
+
+    @contextmanager
+    def lock(self, url, username):
+        with self._lock:
+            if self._lock_depth:
+                self._lock_depth += 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth -= 1
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                self._lock_depth = 1
+                try:
+                    yield
+                finally:
+                    self._lock_depth = 0
+                    if fcntl is not None:
+                        fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    @staticmethod
+    def _entry_name(url, username):
+        return "{0}@{1}".format(username, url)
+
+    def _read(self):
+        try:
+            with open(self.path, "r") as store_file:
+                return json.load(store_file)
+        except (OSError, ValueError):
+            return {}
+
+    def _write(self, entries):
+        temp_path = self.path + ".tmp"
+        fd = os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, "w") as store_file:
+            json.dump(entries, store_file)
+        os.replace(temp_path, self.path)
+
+    def get(self, url, username):
+        session_key = super().get(url, username)
+        if session_key is not None:
+            return session_key
+        with self.lock(url, username):
+            entry = self._read().get(self._entry_name(url, username))
+        if entry is not None and self._is_fresh(entry[1]):
+            with self._lock:
+                self._keys[(url, username)] = tuple(entry)
+            return entry[0]
+        return None
+
+    def set(self, url, username, session_key):
+        super().set(url, username, session_key)
+        with self.lock(url, username):
+            entries = self._read()
+            entries[self._entry_name(url, username)] = [
+                session_key, time.time()]
+            self._write(entries)
+
+    def delete(self, url, username, session_key=None):
+        super().delete(url, username, session_key)
+        with self.lock(url, username):
+            entries = self._read()
+            name = self._entry_name(url, username)
+            entry = entries.get(name)
+            if entry is not None and session_key in (None, entry[0]):
+                del entries[name]
+                self._write(entries)
+
+
+class SessionLease(object):
+    """
+    A session key leased from a SessionPool, for one query at a time.
+
+    If the key is replaced (e.g. after re-authenticating), the replacement is
+    returned to the pool instead.
+    """
+
+    def __init__(self, session_key):
+        self.session_key = session_key
+
+
+class SessionPool(object):
+    """
+    Set of independently opened session keys, leased one per query.
+
+    LimeSurvey handles requests with the same session key one at a time, so
+    concurrent queries should each use a different key.
+
+    Parameters
+    :param session_keys: Open session keys to lease.
+    :type session_keys: List[String]
+    """
+
+    def __init__(self, session_keys):
+        self._idle = queue.Queue()
+        self._keys = set()
+        self._lock = threading.Lock()
+        for session_key in session_keys:
+            self._keys.add(session_key)
+            self._idle.put(session_key)
+
+    @property
+    def session_keys(self):
+        """All session keys in the pool, whether leased or idle."""
+        with self._lock:
+            return list(self._keys)
+
+    @contextmanager
+    def lease(self, timeout=None):
+        """
+        Lease a session key, waiting for one to be returned if none are idle.
+
+        Parameters
+        :param timeout: Seconds to wait for a key, or None to wait forever.
+        :type timeout: Float
+
+        Return
+        :return: SessionLease, which is returned to the pool on exit.
+        :raise: queue.Empty if no key was idle before the timeout.
+        """
+        lease = SessionLease(self._idle.get(timeout=timeout))
+        leased_key = lease.session_key
+        try:
+            yield lease
+        finally:
+            if lease.session_key != leased_key:
+                with self._lock:
+                    self._keys.discard(leased_key)
+                    self._keys.add(lease.session_key)
+            self._idle.put(lease.session_key)
@@ -0,0 +1,267 @@
+import csv
+from array import array
+
+# Columns with few distinct values, stored as codes into a category list.
+CATEGORICAL_FIELDS = frozenset([
+    "blacklisted", "completed", "emailstatus", "language", "remindercount",
+    "remindersent", "sent", "usesleft",
+])
+# Columns of integers.
+INTEGER_FIELDS = frozenset(["tid"])
+
+
+def flatten_participant(participant):
+    """
+    Participant from list_participants, with its participant_info merged in.
+    """
+    flat = {k: v for k, v in participant.items() if k != "participant_info"}
+    flat.update(participant.get("participant_info") or {})
+    return flat
+
+
+class CategoricalColumn(object):
+    """
+    Column of values from a small set, stored as codes into categories.
+
+    Completion and sent dates have many distinct values, but are usually
+    "N" for most participants, so are stored this way too.
+    """
+
+    def __init__(self):
+        self.categories = []
+        self.codes = array("I")
+        self._index = {}
+
+    def append(self, value):
+        code = self._index.get(value)
+        if code is None:
+            code = self._index[value] = len(self.categories)
+            self.categories.append(value)
+        self.codes.append(code)
+
+    def __len__(self):
+        return len(self.codes)
+
+    def __getitem__(self, index):
+        return self.categories[self.codes[index]]
+
+    def __iter__(self):
+        categories = self.categories
+        return (categories[x] for x in self.codes)
+
+
+class IntegerColumn(object):
+    """
+    Column of integers, stored in an array, with None for missing values.
+    """
+
+    def __init__(self):
+        self.values = array("q")
+        self.missing = set()  # Indexes of None values, stored as 0.
+
+    def append(self, value):
+        if value is None or value == "":
+            self.missing.add(len(self.values))
+            value = 0
+        self.values.append(int(value))
+
+    def __len__(self):
+        return len(self.values)
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if index in self.missing:
+            return None
+        return self.values[index]
+
+    def __iter__(self):
+        missing = self.missing
+        return (None if i in missing else x for i, x in enumerate(self.values))
+
+
+class Record(object):
+    """
+    Base for the __slots__ record types of ParticipantTable rows.
+    """
+
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for field, value in zip(self.__slots__, values):
+            setattr(self, field, value)
+
+    def __repr__(self):
+        return "{0}({1})".format(type(self).__name__, ", ".join(
+            "{0}={1!r}".format(x, getattr(self, x)) for x in self.__slots__))
+
+    def __eq__(self, other):
+        return (type(self) is type(other) and
+                all(getattr(self, x) == getattr(other, x)
+                    for x in self.__slots__))
+
+    def as_dict(self):
+        return {x: getattr(self, x) for x in self.__slots__}
+
+
+def record_type(fields):
+    """
+    Make a Record type with a slot per field.
+    """
+    return type("ParticipantRecord", (Record,), {"__slots__": tuple(fields)})
+
+
+def _validity_bitmap(values):
+    """Arrow validity bitmap (LSB first) of the values that are not None."""
+    bitmap = bytearray((len(values) + 7) // 8)
+    for i, value in enumerate(values):
+        if value is not None:
+            bitmap[i // 8] |= 1 << (i % 8)
+    return bytes(bitmap)
+
+
+class ParticipantTable(object):
+    """
+    Participants from list_participants, stored column by column.
+
+    Each row is flattened (participant_info merged in), and its values are
+    appended to a column per field, instead of keeping a dict per row with
+    the same keys. tid is stored in an integer array, fields with few
+    distinct values (see CATEGORICAL_FIELDS) as codes into a category list,
+    and other fields as lists of strings. Fields first seen after some rows
+    are filled with None for the earlier rows.
+
+    Parameters
+    :param participants: Participants to add, e.g. from export_participants.
+    :type participants: Iterable[Dict]
+    :param fields: Fields to keep, in order, or None to keep all.
+    :type fields: List[String]
+    """
+
+    def __init__(self, participants=(), fields=None):
+        self.fields = []
+        self.columns = {}
+        self._length = 0
+        self._only = fields is not None
+        self._record_type = None
+        for field in fields or []:
+            self._add_column(field)
+        self.extend(participants)
+
+    def _add_column(self, field):
+        if field in INTEGER_FIELDS:
+            column = IntegerColumn()
+        elif field in CATEGORICAL_FIELDS:
+            column = CategoricalColumn()
+        else:
+            column = []
+        for _ in range(self._length):
+            column.append(None)
+        self.fields.append(field)
+        self.columns[field] = column
+        self._record_type = None
+
+    def append(self, participant):
+        """
+        Add a participant from list_participants.
+        """
+        flat = flatten_participant(participant)
+        if not self._only:
+            for field in flat:
+                if field not in self.columns:
+                    self._add_column(field)
+        for field in self.fields:
+            self.columns[field].append(flat.get(field))
+        self._length += 1
+
+    def extend(self, participants):
+        """
+        Add participants from list_participants.
+        """
+        for participant in participants:
+            self.append(participant)
+
+    def __len__(self):
+        return self._length
+
+    def column(self, field):
+        """
+        Return the values of a field, as a list.
+        """
+        return list(self.columns[field])
+
+    @property
+    def record_type(self):
+        """Record type with a slot per field, for rows."""
+        if self._record_type is None:
+            self._record_type = record_type(self.fields)
+        return self._record_type
+
+    def row(self, index):
+        """
+        Return a row, as a record with a slot per field.
+        """
+        return self.record_type(
+            *(self.columns[x][index] for x in self.fields))
+
+    def __iter__(self):
+        make = self.record_type
+        columns = [iter(self.columns[x]) for x in self.fields]
+        return (make(*values) for values in zip(*columns))
+
+    def to_csv(self, csv_file, header=True):
+        """
+        Write the table to a CSV file, with None written as empty.
+
+        Parameters
+        :param csv_file: File opened for writing text, with newline="".
+        :type csv_file: File
+        :param header: If True, write the field names first.
+        :type header: Bool
+        """
+        writer = csv.writer(csv_file)
+        if header:
+            writer.writerow(self.fields)
+        columns = [iter(self.columns[x]) for x in self.fields]
+        writer.writerows(zip(*columns))
+
+    def to_buffers(self):
+        """
+        Return the columns laid out as Arrow arrays, for zero-copy loading by
+        e.g. pyarrow.Array.from_buffers.
+
+        Return
+        :return: dict of field: dict with "type" and buffers, where:
+          "int64" has "validity" and "values" (int64 array);
+          "utf8" has "validity", "offsets" (int32 array) and "data" (bytes);
+          "dictionary" has "validity", "indices" (uint32 array) and
+          "dictionary" (a "utf8" dict of the categories).
+        """
+        return {x: self._column_buffers(self.columns[x]) for x in self.fields}
+
+    @staticmethod
+    def _utf8_buffers(values):
+        offsets = array("i", [0])
+        data = bytearray()
+        for value in values:
+            if value is not None:
+                data += str(value).encode("utf-8")
+            offsets.append(len(data))
+        return {"type": "utf8", "validity": _validity_bitmap(values),
+                "offsets": offsets, "data": bytes(data)}
+
+    def _column_buffers(self, column):
+        if isinstance(column, IntegerColumn):
+            return {"type": "int64", "validity": _validity_bitmap(
+                        list(column)), "values": column.values}
+        if isinstance(column, CategoricalColumn):
+            # Arrow has no null dictionary values, so None is a null index.
+            categories = [x for x in column.categories if x is not None]
+            position = {x: i for i, x in enumerate(categories)}
+            remap = array("I", [
+                position.get(x, 0) for x in column.categories])
+            indices = array("I", (remap[x] for x in column.codes))
+            return {"type": "dictionary", "validity": _validity_bitmap(
+                        list(column)), "indices": indices,
+                    "dictionary": self._utf8_buffers(categories)}
+        return self._utf8_buffers(column)
@@ -0,0 +1,732 @@
+import base64
+import csv
+import io
+import json
+import random
+import re
+import secrets
+import smtplib
+import threading
+import time
+from collections import OrderedDict, deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Default number of emails sent per invite / remind call (LimeSurvey's
+# "maxemails" setting).
+EMAIL_BATCH_SIZE = 50
+# Kinds of injected error, besides an HTTP status or a result status.
+DISCONNECT = "disconnect"  # Close the connection without a response.
+TRUNCATE = "truncate"      # Send half of the response body.
+EMPTY = "empty"            # Send a 200 response with an empty body.
+# Operators LimeSurvey accepts in list_participants conditions.
+CONDITION_OPERATORS = ("<", ">", ">=", "<=", "=", "<>", "LIKE", "IN")
+
+
+def _now():
+    return time.strftime("%Y-%m-%d %H:%M")
+
+
+def _positional(params):
+    """RC2API parameters are positional, even when sent as an object."""
+    if isinstance(params, dict):
+        return list(params.values())
+    return list(params or [])
+
+
+class StandInSurvey(object):
+    """
+    In-memory survey of a StandInServer, with questions, participants and
+    responses.
+
+    Parameters
+    :param sid: Survey ID.
+    :type sid: Integer
+    :param title: Survey title.
+    :type title: String
+    :param questions: Number of numeric ("N") and text ("T") questions each.
+    :type questions: Integer
+    :param attributes: Number of extra participant attributes (attribute_1..).
+    :type attributes: Integer
+    :param value_size: Length of generated attribute and text answer values.
+    :type value_size: Integer
+    """
+
+    def __init__(self, sid, title="", questions=2, attributes=0,
+                 value_size=10):
+        self.sid = sid
+        self.title = title or "Survey {0}".format(sid)
+        self.attributes = ["attribute_{0}".format(i + 1)
+                           for i in range(attributes)]
+        self.value_size = value_size
+        self.questions = []
+        for i in range(questions):
+            for kind in ("N", "T"):
+                qid = len(self.questions) + 1
+                self.questions.append(OrderedDict([
+                    ("id", {"qid": qid, "language": "en"}),
+                    ("question", "Question {0}".format(qid)),
+                    ("help", ""), ("language", "en"),
+                    ("qid", str(qid)), ("parent_qid", "0"),
+                    ("sid", str(sid)), ("gid", "1"), ("type", kind),
+                    ("title", "Q{0}".format(qid)), ("preg", None),
+                    ("other", "N"), ("mandatory", "N"),
+                    ("question_order", str(qid)), ("scale_id", "0"),
+                    ("same_default", "0"), ("relevance", "1"),
+                    ("modulename", None)]))
+        self.participants = OrderedDict()  # tid: participant dict
+        self.responses = []
+        self._next_tid = 1
+        self._random = random.Random(sid)
+
+    def _value(self):
+        return "".join(self._random.choice("abcdefghij")
+                       for _ in range(self.value_size))
+
+    def add_participant(self, data, create_token_key=True):
+        """
+        Add a participant, filling in the default properties.
+        """
+        tid = self._next_tid
+        self._next_tid += 1
+        participant = OrderedDict([
+            ("tid", tid), ("participant_id", None), ("mpid", None),
+            ("firstname", ""), ("lastname", ""), ("email", ""),
+            ("emailstatus", "OK"), ("token", ""), ("language", "en"),
+            ("blacklisted", "N"), ("sent", "N"), ("remindersent", "N"),
+            ("remindercount", 0), ("completed", "N"), ("usesleft", 1),
+            ("validfrom", None), ("validuntil", None)])
+        for attribute in self.attributes:
+            participant[attribute] = ""
+        participant.update(
+            (k, v) for k, v in data.items() if k != "tid")
+        if create_token_key or not participant["token"]:
+            participant["token"] = secrets.token_hex(8)
+        self.participants[tid] = participant
+        return participant
+
+    def add_participants(self, count):
+        """
+        Add generated participants, with attribute values of value_size.
+        """
+        for _ in range(count):
+            n = self._next_tid
+            data = {"firstname": "First{0}".format(n),
+                    "lastname": "Last{0}".format(n),
+                    "email": "participant{0}@example.com".format(n)}
+            for attribute in self.attributes:
+                data[attribute] = self._value()
+            self.add_participant(data)
+
+    def add_responses(self, count):
+        """
+        Add generated responses, one per participant in order, then without
+        a token.
+        """
+        tokens = [x["token"] for x in self.participants.values()]
+        for _ in range(count):
+            n = len(self.responses)
+            response = OrderedDict([
+                ("id", str(n + 1)),
+                ("submitdate", "2020-01-01 10:00:00" if n % 4 else None),
+                ("lastpage", "1"), ("startlanguage", "en"),
+                ("token", tokens[n] if n < len(tokens) else None)])
+            for question in self.questions:
+                if question["type"] == "N":
+                    value = str(self._random.randint(0, 100))
+                else:
+                    value = self._value()
+                response[question["title"]] = value
+            self.responses.append(response)
+
+
+class RemoteControl(object):
+    """
+    RC2API methods over in-memory surveys, with LimeSurvey's result formats
+    and status messages. Thread safe.
+
+    Parameters
+    :param username: Username to accept.
+    :type username: String
+    :param password: Password to accept.
+    :type password: String
+    :param email_batch_size: Emails sent per invite / remind call.
+    :type email_batch_size: Integer
+    :param session_lifetime: Seconds a session key is valid for, or None.
+    :type session_lifetime: Float
+    :param smtp: (host, port) of an SMTP server to send invites and
+      reminders to, or None to only record them in sent_emails.
+    :type smtp: Tuple[String, Integer]
+    """
+
+    def __init__(self, username="admin", password="admin",
+                 email_batch_size=EMAIL_BATCH_SIZE, session_lifetime=None,
+                 smtp=None):
+        self.username = username
+        self.password = password
+        self.email_batch_size = email_batch_size
+        self.session_lifetime = session_lifetime
+        self.smtp = smtp
+        self.surveys = OrderedDict()  # sid: StandInSurvey
+        self.sessions = {}            # session key: time created
+        self.sent_emails = []         # (tid, email, "invite" or "remind")
+        self._lock = threading.RLock()
+
+    def add_survey(self, sid=None, participants=0, responses=0, **kwargs):
+        """
+        Add a survey, with generated participants and responses.
+
+        See StandInSurvey for the other parameters.
+
+        Return
+        :return: StandInSurvey
+        """
+        with self._lock:
+            if sid is None:
+                sid = 100000 + len(self.surveys) + 1
+            survey = StandInSurvey(sid, **kwargs)
+            survey.add_participants(participants)
+            survey.add_responses(responses)
+            self.surveys[sid] = survey
+            return survey
+
+    def expire_sessions(self):
+        """
+        Make all session keys invalid, as if they had expired.
+        """
+        with self._lock:
+            self.sessions.clear()
+
+    def call(self, method, params):
+        """
+        Call an RC2API method.
+
+        Return
+        :return: the result, or None if there's no such method.
+        """
+        handler = getattr(self, "rpc_" + str(method), None)
+        if handler is None:
+            return None
+        params = _positional(params)
+        with self._lock:
+            if method == "get_session_key":
+                return handler(*params)
+            if method == "release_session_key":
+                self.sessions.pop(params[0] if params else None, None)
+                return "OK"
+            if not self._valid(params):
+                return {"status": "Invalid session key"}
+            return handler(*params[1:])
+
+    def _valid(self, params):
+        created = self.sessions.get(params[0] if params else None)
+        if created is None:
+            return False
+        if (self.session_lifetime is not None and
+                self.session_lifetime < time.monotonic() - created):
+            del self.sessions[params[0]]
+            return False
+        return True
+
+    def _survey(self, sid):
+        try:
+            return self.surveys.get(int(sid))
+        except (TypeError, ValueError):
+            return None
+
+    def rpc_get_session_key(self, username=None, password=None, plugin=None):
+        if username != self.username or password != self.password:
+            return {"status": "Invalid user name or password"}
+        session_key = secrets.token_hex(16)
+        self.sessions[session_key] = time.monotonic()
+        return session_key
+
+    def rpc_release_session_key(self):
+        return "OK"  # See call.
+
+    def rpc_list_surveys(self, username=None):
+        if username is not None and username != self.username:
+            return {"status": "Invalid user"}
+        if not self.surveys:
+            return {"status": "No surveys found"}
+        return [OrderedDict([
+            ("sid", str(x.sid)), ("surveyls_title", x.title),
+            ("startdate", None), ("expires", None), ("active", "Y")])
+            for x in self.surveys.values()]
+
+    def rpc_list_questions(self, sid=None, gid=None, language=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        if gid is not None and str(gid) != "1":
+            return {"status": "Error: IMissmatch in surveyid and groupid"}
+        if not survey.questions:
+            return {"status": "No questions found"}
+        return [OrderedDict(x) for x in survey.questions]
+
+    def rpc_get_summary(self, sid=None, stat_name="all"):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Invalid surveyid"}
+        participants = list(survey.participants.values())
+        stats = OrderedDict([
+            ("token_count", len(participants)),
+            ("token_invalid", sum(
+                x["emailstatus"] != "OK" for x in participants)),
+            ("token_sent", sum(x["sent"] != "N" for x in participants)),
+            ("token_opted_out", sum(
+                x["emailstatus"] == "OptOut" for x in participants)),
+            ("token_completed", sum(
+                x["completed"] != "N" for x in participants)),
+            ("completed_responses", sum(
+                x["submitdate"] is not None for x in survey.responses)),
+            ("incomplete_responses", sum(
+                x["submitdate"] is None for x in survey.responses)),
+            ("full_responses", len(survey.responses))])
+        stats = OrderedDict((k, str(v)) for k, v in stats.items())
+        if stat_name == "all":
+            return stats
+        if stat_name not in stats:
+            return {"status": "Invalid summary key"}
+        return stats[stat_name]
+
+    def rpc_add_participants(self, sid=None, participant_data=None,
+                             create_token_key=True):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        result = []
+        for data in participant_data or []:
+            participant = survey.add_participant(data, create_token_key)
+            added = OrderedDict(data)
+            added["tid"] = str(participant["tid"])
+            added["token"] = participant["token"]
+            result.append(added)
+        return result
+
+    def rpc_delete_participants(self, sid=None, token_ids=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        result = OrderedDict()
+        for tid in token_ids or []:
+            removed = survey.participants.pop(int(tid), None)
+            result[str(tid)] = "Invalid token ID" if removed is None \
+                else "Deleted"
+        return result
+
+    @staticmethod
+    def _compare(value, operator, operand):
+        """Compare a value as LimeSurvey's database would."""
+        if operator == "LIKE":
+            pattern = re.escape(str(operand)).replace("%", ".*").replace(
+                "_", ".")
+            return re.match(pattern + "$", str(value or ""), re.I) is not None
+        try:
+            value, operand = float(value), float(operand)
+        except (TypeError, ValueError):
+            value, operand = str(value), str(operand)
+        return {
+            "=": value == operand, "<>": value != operand,
+            ">": value > operand, ">=": value >= operand,
+            "<": value < operand, "<=": value <= operand}[operator]
+
+    def _matches(self, participant, conditions):
+        for key, condition in (conditions or {}).items():
+            value = participant.get(key)
+            if isinstance(condition, list):
+                operator, operands = condition[0], condition[1:]
+                if operator == "IN":
+                    if str(value) not in [str(x) for x in operands]:
+                        return False
+                elif not self._compare(value, operator, operands[0]):
+                    return False
+            elif str(value) != str(condition):
+                return False
+        return True
+
+    def rpc_list_participants(self, sid=None, start=0, limit=10,
+                              unused=False, attributes=False,
+                              conditions=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        for condition in (conditions or {}).values():
+            if (isinstance(condition, list) and
+                    condition[0] not in CONDITION_OPERATORS):
+                return {"status": "Illegal operator: {0}".format(
+                    condition[0])}
+        matches = [
+            x for x in survey.participants.values()
+            if self._matches(x, conditions) and
+            not (unused and x["completed"] != "N")]
+        page = matches[int(start):int(start) + int(limit)]
+        if not page:
+            return {"status": "No survey participants found."}
+        result = []
+        for participant in page:
+            row = OrderedDict([
+                ("tid", participant["tid"]),
+                ("token", participant["token"]),
+                ("participant_info", OrderedDict([
+                    ("firstname", participant["firstname"]),
+                    ("lastname", participant["lastname"]),
+                    ("email", participant["email"])]))])
+            for attribute in attributes or []:
+                row[attribute] = participant.get(attribute)
+            result.append(row)
+        return result
+
+    def rpc_get_participant_properties(self, sid=None, token_query=None,
+                                       token_properties=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        if isinstance(token_query, dict):
+            matches = [x for x in survey.participants.values()
+                       if self._matches(x, token_query)]
+            if not matches:
+                return {"status": "Error: No results were found based on "
+                                  "your attributes."}
+            if 1 < len(matches):
+                return {"status": "Error: More than 1 result was found "
+                                  "based on your attributes."}
+            participant = matches[0]
+        else:
+            try:
+                participant = survey.participants.get(int(token_query))
+            except (TypeError, ValueError):
+                participant = None
+            if participant is None:
+                return {"status": "Error: Invalid tokenid"}
+        if not token_properties:
+            return OrderedDict(participant)
+        return OrderedDict(
+            (x, participant.get(x)) for x in token_properties
+            if x in participant)
+
+    def _send_emails(self, candidates, kind, update):
+        sent = candidates[:self.email_batch_size]
+        result = OrderedDict()
+        connection = None
+        if self.smtp is not None and sent:
+            connection = smtplib.SMTP(*self.smtp)
+        for participant in sent:
+            update(participant)
+            self.sent_emails.append(
+                (participant["tid"], participant["email"], kind))
+            if connection is not None:
+                connection.sendmail(
+                    "admin@example.com", [participant["email"]],
+                    "Subject: Survey {0}\r\n\r\nToken: {1}\r\n".format(
+                        kind, participant["token"]))
+            result[str(participant["tid"])] = OrderedDict([
+                ("name", "{0} {1}".format(
+                    participant["firstname"], participant["lastname"])),
+                ("email", participant["email"]), ("status", "OK")])
+        if connection is not None:
+            connection.quit()
+        result["status"] = "{0} left to send".format(
+            len(candidates) - len(sent))
+        return result
+
+    @staticmethod
+    def _candidates(survey, token_ids):
+        ids = None if not token_ids else set(int(x) for x in token_ids)
+        return [
+            x for x in survey.participants.values()
+            if (ids is None or x["tid"] in ids) and x["email"] and
+            x["emailstatus"] == "OK" and x["blacklisted"] == "N"]
+
+    def rpc_invite_participants(self, sid=None, token_ids=None, email=True):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        candidates = [
+            x for x in self._candidates(survey, token_ids)
+            if x["completed"] == "N" and (not email or x["sent"] == "N")]
+        if not candidates:
+            return {"status": "Error: No candidate tokens"}
+
+        def update(participant):
+            participant["sent"] = _now()
+        return self._send_emails(candidates, "invite", update)
+
+    def rpc_remind_participants(self, sid=None, min_days_between=None,
+                                max_reminders=None, token_ids=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        candidates = [
+            x for x in self._candidates(survey, token_ids)
+            if x["completed"] == "N" and x["sent"] != "N" and
+            (not max_reminders or x["remindercount"] < int(max_reminders))]
+        if min_days_between:
+            cutoff = time.strftime("%Y-%m-%d %H:%M", time.localtime(
+                time.time() - 86400 * int(min_days_between)))
+            candidates = [
+                x for x in candidates
+                if (x["remindersent"] if x["remindersent"] != "N"
+                    else x["sent"]) <= cutoff]
+        if not candidates:
+            return {"status": "Error: No candidate tokens"}
+
+        def update(participant):
+            participant["remindersent"] = _now()
+            participant["remindercount"] += 1
+        return self._send_emails(candidates, "remind", update)
+
+    @staticmethod
+    def _export(responses, document_type, fields):
+        if fields:
+            responses = [OrderedDict((k, x.get(k)) for k in fields)
+                         for x in responses]
+        if document_type == "json":
+            data = json.dumps({"responses": [
+                {x.get("id", str(i + 1)): x}
+                for i, x in enumerate(responses)]}).encode("utf-8")
+        else:
+            text = io.StringIO(newline="")
+            writer = csv.writer(text, quoting=csv.QUOTE_ALL)
+            if responses:
+                writer.writerow(list(responses[0]))
+            writer.writerows(
+                ["" if v is None else v for v in x.values()]
+                for x in responses)
+            data = b"\xef\xbb\xbf" + text.getvalue().encode("utf-8")
+        return base64.b64encode(data).decode("ascii")
+
+    @staticmethod
+    def _completed(responses, completion_status):
+        if completion_status == "complete":
+            return [x for x in responses if x["submitdate"] is not None]
+        if completion_status == "incomplete":
+            return [x for x in responses if x["submitdate"] is None]
+        return responses
+
+    def rpc_export_responses(
+            self, sid=None, document_type="csv", language_code=None,
+            completion_status="all", heading_type="code",
+            response_type="short", from_response_id=None,
+            to_response_id=None, fields=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        responses = [
+            x for x in self._completed(survey.responses, completion_status)
+            if (from_response_id is None or
+                int(from_response_id) <= int(x["id"])) and
+            (to_response_id is None or int(x["id"]) <= int(to_response_id))]
+        if not responses:
+            return {"status": "No Data, could not get max id."}
+        return self._export(responses, document_type, fields)
+
+    def rpc_export_responses_by_token(
+            self, sid=None, document_type="csv", token=None,
+            language_code=None, completion_status="all",
+            heading_type="code", response_type="short", fields=None):
+        survey = self._survey(sid)
+        if survey is None:
+            return {"status": "Error: Invalid survey ID"}
+        responses = [
+            x for x in self._completed(survey.responses, completion_status)
+            if x["token"] is not None and x["token"] == token]
+        if not responses:
+            return {"status": "No Response found for Token"}
+        return self._export(responses, document_type, fields)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body are written separately, so without TCP_NODELAY a
+    # keep-alive client waits on delayed ACKs (about 40ms per response).
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server.stand_in
+        length = int(self.headers.get("content-length", 0))
+        body = self.rfile.read(length)
+        try:
+            request = json.loads(body)
+        except ValueError:
+            request = None
+        method = request.get("method") if isinstance(request, dict) else None
+        error = server._next_error(method)
+        server._delay()
+        if error == DISCONNECT:
+            self.close_connection = True
+            return
+        if isinstance(error, int):
+            return self._reply(error, b"Injected error")
+        if error == EMPTY:
+            return self._reply(200, b"")
+        if isinstance(request, list) and server.batch:
+            content = [server._respond(x) for x in request]
+        elif isinstance(request, dict):
+            content = server._respond(
+                request, None if error == TRUNCATE else error)
+        else:
+            content = {"id": None, "result": None,
+                       "error": "unable to decode request"}
+        data = json.dumps(content).encode("utf-8")
+        server._delay(len(data))
+        if error == TRUNCATE:
+            data = data[:len(data) // 2]
+        self._reply(200, data)
+
+    def _reply(self, status, data):
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        if self.close_connection:
+            # Otherwise the client may send its next request on the socket.
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StandInServer(object):
+    """
+    Local JSON-RPC server standing in for a LimeSurvey RemoteControl API,
+    for testing and benchmarking clients without a LimeSurvey install.
+
+    The server runs in a background thread, serving each connection in its
+    own thread, from the RemoteControl's in-memory surveys. Latency, errors
+    and payload sizes can be set, to measure client throughput and failure
+    handling.
+
+    Errors are injected with inject() for specific calls, or at random with
+    error_rate. An error is an HTTP status (e.g. 503), a result status (e.g.
+    "Invalid session key"), or DISCONNECT, TRUNCATE or EMPTY.
+
+    Parameters
+    :param remote_control: Surveys and methods to serve, or None for a new
+      RemoteControl (username "admin", password "admin").
+    :type remote_control: RemoteControl
+    :param latency: Seconds to wait before each response.
+    :type latency: Float
+    :param jitter: Maximum extra seconds to wait, chosen at random.
+    :type jitter: Float
+    :param bandwidth: Bytes per second to send responses at, or None for no
+      limit, so that large payloads take longer.
+    :type bandwidth: Float
+    :param error_rate: Fraction of requests to fail with error_kind.
+    :type error_rate: Float
+    :param error_kind: Error for error_rate failures.
+    :type error_kind: Integer or String
+    :param batch: If True, answer JSON-RPC batch requests (LimeSurvey
+      doesn't).
+    :type batch: Bool
+    :param seed: Seed for the random latency and errors.
+    :type seed: Integer
+    :param host: Address to listen on.
+    :type host: String
+    :param port: Port to listen on, or 0 for any free port.
+    :type port: Integer
+    """
+
+    def __init__(self, remote_control=None, latency=0, jitter=0,
+                 bandwidth=None, error_rate=0, error_kind=500, batch=False,
+                 seed=None, host="127.0.0.1", port=0):
+        self.remote_control = remote_control or RemoteControl()
+        self.latency = latency
+        self.jitter = jitter
+        self.bandwidth = bandwidth
+        self.error_rate = error_rate
+        self.error_kind = error_kind
+        self.batch = batch
+        self.requests = 0
+        self._random = random.Random(seed)
+        self._errors = deque()  # (method or None, error)
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), _Handler)
+        self._httpd.daemon_threads = True
+        self._httpd.stand_in = self
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._httpd.server_address[:2]
+        return "http://{0}:{1}/index.php/admin/remotecontrol".format(
+            host, port)
+
+    def start(self):
+        """
+        Start serving in a background thread.
+
+        Return
+        :return: the URL of the RC2API endpoint.
+        """
+        self._thread = threading.Thread(
+            target=self._httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self.url
+
+    def stop(self):
+        """
+        Stop serving, and close the listening socket.
+        """
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
+
+    def inject(self, error, method=None, count=1):
+        """
+        Fail the next count requests (for method, or any method).
+
+        Parameters
+        :param error: HTTP status, result status, or DISCONNECT, TRUNCATE or
+          EMPTY.
+        :type error: Integer or String
+        :param method: RC2API method to fail, or None for any.
+        :type method: String
+        :param count: Number of requests to fail.
+        :type count: Integer
+        """
+        with self._lock:
+            self._errors.extend([(method, error)] * count)
+
+    def _next_error(self, method):
+        with self._lock:
+            self.requests += 1
+            for i, (target, error) in enumerate(self._errors):
+                if target is None or target == method:
+                    del self._errors[i]
+                    return error
+            if self.error_rate and self._random.random() < self.error_rate:
+                return self.error_kind
+            return None
+
+    def _delay(self, size=None):
+        if size is None:
+            wait = self.latency
+            if self.jitter:
+                with self._lock:
+                    wait += self._random.uniform(0, self.jitter)
+        else:
+            wait = size / self.bandwidth if self.bandwidth else 0
+        if 0 < wait:
+            time.sleep(wait)
+
+    def _respond(self, request, status=None):
+        request_id = request.get("id")
+        method = request.get("method")
+        if status is not None:
+            return {"id": request_id, "result": {"status": status},
+                    "error": None}
+        result = self.remote_control.call(method, request.get("params"))
+        if result is None:
+            return {"id": request_id, "result": None,
+                    "error": "method not found"}
+        return {"id": request_id, "result": result, "error": None}
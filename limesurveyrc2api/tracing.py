@@ -0,0 +1,377 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+# Span of the operation or query in progress, in this thread or task.
+_active = contextvars.ContextVar("limesurveyrc2api_span", default=None)
+
+
+class _Active(object):
+    """A span that is in progress, with the tracer that started it."""
+
+    __slots__ = ("tracer", "span", "chunk_index")
+
+    def __init__(self, tracer, span, chunk_index):
+        self.tracer = tracer
+        self.span = span
+        self.chunk_index = chunk_index
+
+
+class Span(object):
+    """
+    Span recorded by a RecordingTracer.
+
+    Attributes
+    :param name: Name of the operation, or of the RC2API method.
+    :param attributes: dict of tags, e.g. "survey_id" or "result.size".
+    :param parent: Span this one is nested under, or None.
+    :param start: time.perf_counter() when the span started.
+    :param end: time.perf_counter() when it finished, or None.
+    :param error: Exception raised in the span, or None.
+    """
+
+    def __init__(self, tracer, name, attributes, parent):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = dict(attributes)
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+
+    @property
+    def duration(self):
+        """Seconds from start to end, or None if not finished."""
+        return None if self.end is None else self.end - self.start
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self, error=None):
+        self.end = time.perf_counter()
+        self.error = error
+        self.tracer._finished(self)
+
+    def __repr__(self):
+        return "Span({0!r}, {1!r})".format(self.name, self.attributes)
+
+
+class RecordingTracer(object):
+    """
+    Tracer keeping the finished spans in memory, for tests or inspection
+    without a tracing library.
+
+    A tracer is an object with a start_span(name, attributes, parent) method
+    returning a span object with set_attribute(key, value) and
+    finish(error=None) methods; parent is a span from the same tracer, or
+    None.
+
+    Parameters
+    :param max_spans: Maximum number of finished spans to keep, or None.
+    :type max_spans: Integer
+    """
+
+    def __init__(self, max_spans=None):
+        self.max_spans = max_spans
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def start_span(self, name, attributes, parent):
+        return Span(self, name, attributes, parent)
+
+    def _finished(self, span):
+        with self._lock:
+            self.spans.append(span)
+            if self.max_spans is not None and self.max_spans < len(self.spans):
+                del self.spans[0]
+
+    def children(self, span):
+        """
+        Return the finished spans nested directly under span (or the root
+        spans, if span is None), in order of start.
+        """
+        with self._lock:
+            spans = [x for x in self.spans if x.parent is span]
+        return sorted(spans, key=lambda x: x.start)
+
+    def clear(self):
+        with self._lock:
+            self.spans = []
+
+
+class OpenTelemetryTracer(object):
+    """
+    Tracer adapter, sending spans to an OpenTelemetry tracer.
+
+    The opentelemetry-api package is only imported when a span is started.
+
+    Parameters
+    :param tracer: OpenTelemetry tracer, e.g. from trace.get_tracer().
+    :type tracer: opentelemetry.trace.Tracer
+    """
+
+    def __init__(self, tracer):
+        self.tracer = tracer
+
+    def start_span(self, name, attributes, parent):
+        from opentelemetry import trace
+        context = None
+        if parent is not None:
+            context = trace.set_span_in_context(parent.span)
+        span = self.tracer.start_span(
+            name, context=context, attributes=attributes)
+        return _OpenTelemetrySpan(span)
+
+
+class _OpenTelemetrySpan(object):
+
+    def __init__(self, span):
+        self.span = span
+
+    def set_attribute(self, key, value):
+        self.span.set_attribute(key, value)
+
+    def finish(self, error=None):
+        if error is not None:
+            from opentelemetry.trace import Status, StatusCode
+            self.span.record_exception(error)
+            self.span.set_status(Status(StatusCode.ERROR, str(error)))
+        self.span.end()
+
+
+def current_span():
+    """
+    Return the span in progress in this thread or task, or None.
+    """
+    active = _active.get()
+    return None if active is None else active.span
+
+
+def open_span(name, attributes=None, tracer=None):
+    """
+    Start a span nested under the current span, without making it current.
+
+    Parameters
+    :param name: Name of the span.
+    :type name: String
+    :param attributes: Tags of the span. None values are left out. A
+      "chunk.index" is inherited by the spans nested under this one.
+    :type attributes: Dict
+    :param tracer: Tracer to start the span with, or None to use the tracer
+      of the current span.
+    :type tracer: RecordingTracer
+
+    Return
+    :return: the span in progress, or None if there's no tracer.
+    """
+    parent = _active.get()
+    if tracer is None:
+        if parent is None:
+            return None
+        tracer = parent.tracer
+    attributes = {k: v for k, v in (attributes or {}).items()
+                  if v is not None}
+    chunk_index = attributes.get("chunk.index")
+    if chunk_index is None and parent is not None:
+        chunk_index = parent.chunk_index
+        if chunk_index is not None:
+            attributes["chunk.index"] = chunk_index
+    span = tracer.start_span(
+        name, attributes, None if parent is None else parent.span)
+    return _Active(tracer, span, chunk_index)
+
+
+@contextmanager
+def activate(active):
+    """
+    Make a span from open_span current, for the duration of the block.
+    """
+    token = _active.set(active)
+    try:
+        yield
+    finally:
+        _active.reset(token)
+
+
+def close_span(active, error=None):
+    """
+    Finish a span from open_span. GeneratorExit is not an error.
+    """
+    if isinstance(error, GeneratorExit):
+        error = None
+    active.span.finish(error)
+
+
+@contextmanager
+def start_span(name, attributes=None, tracer=None):
+    """
+    Run a block in a span nested under the current span.
+
+    See open_span for the parameters. If there's no tracer, no span is
+    started and None is given to the block.
+    """
+    active = open_span(name, attributes, tracer)
+    if active is None:
+        yield None
+        return
+    error = None
+    try:
+        with activate(active):
+            yield active.span
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        close_span(active, error)
+
+
+def _traced_generator(generator, active):
+    """
+    Iterate over a generator with the span current only while it runs, so
+    the span isn't current in the caller between items.
+    """
+    error = None
+    try:
+        while True:
+            with activate(active):
+                try:
+                    item = next(generator)
+                except StopIteration:
+                    return
+            yield item
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        with activate(active):
+            generator.close()
+        close_span(active, error)
+
+
+async def _traced_async_generator(generator, active):
+    """
+    Async version of _traced_generator.
+    """
+    error = None
+    try:
+        while True:
+            with activate(active):
+                try:
+                    item = await generator.__anext__()
+                except StopAsyncIteration:
+                    return
+            yield item
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        with activate(active):
+            await generator.aclose()
+        close_span(active, error)
+
+
+def traced(func):
+    """
+    Decorator for a component method, to run it in a span named after the
+    method, tagged with its survey_id, if the api has a tracer. Queries made
+    by the method are nested under the span. Generators (and coroutine
+    functions) are supported.
+    """
+    name = func.__name__
+    signature = inspect.signature(func)
+
+    def begin(self, args, kwargs):
+        tracer = getattr(self.api, "tracer", None)
+        if tracer is None:
+            return None
+        survey_id = kwargs.get("survey_id")
+        if survey_id is None and "survey_id" in signature.parameters:
+            bound = signature.bind_partial(self, *args, **kwargs)
+            survey_id = bound.arguments.get("survey_id")
+        return open_span(name, {"survey_id": survey_id}, tracer)
+
+    if inspect.isasyncgenfunction(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            active = begin(self, args, kwargs)
+            if active is None:
+                return func(self, *args, **kwargs)
+            return _traced_async_generator(
+                func(self, *args, **kwargs), active)
+    elif inspect.isgeneratorfunction(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            active = begin(self, args, kwargs)
+            if active is None:
+                return func(self, *args, **kwargs)
+            return _traced_generator(func(self, *args, **kwargs), active)
+    elif inspect.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def wrapper(self, *args, **kwargs):
+            active = begin(self, args, kwargs)
+            if active is None:
+                return await func(self, *args, **kwargs)
+            error = None
+            try:
+                with activate(active):
+                    return await func(self, *args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                close_span(active, error)
+    else:
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            active = begin(self, args, kwargs)
+            if active is None:
+                return func(self, *args, **kwargs)
+            error = None
+            try:
+                with activate(active):
+                    return func(self, *args, **kwargs)
+            except BaseException as e:
+                error = e
+                raise
+            finally:
+                close_span(active, error)
+    return wrapper
+
+
+def result_size(result):
+    """
+    Size of a query result for the "result.size" tag: the number of items in
+    an array or object, or characters in a string, or None.
+    """
+    if isinstance(result, (list, dict, str)):
+        return len(result)
+    return None
+
+
+def query_span(tracer, method, params):
+    """
+    Start a span for a query, tagged with the method and survey ID.
+
+    Return
+    :return: context manager giving the span (or None, if tracer is None).
+    """
+    survey_id = None
+    if hasattr(params, "get"):
+        survey_id = params.get("iSurveyID")
+    return start_span(method, {
+        "rpc.system": "jsonrpc", "rpc.method": method,
+        "survey_id": survey_id}, tracer)
+
+
+def tag_result(span, result):
+    """
+    Tag a query span with the size of its result.
+    """
+    size = result_size(result)
+    if size is not None:
+        span.set_attribute("result.size", size)
+    elif hasattr(result, "kind"):
+        span.set_attribute("result.streamed", True)
@@ -0,0 +1,108 @@
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+
+class HTTPTransport(object):
+    """
+    Pooled, keep-alive HTTP transport for the RC2API.
+
+    A transport is owned by a LimeSurvey client and shared by its components,
+    so every query reuses the same connection pool instead of making a new
+    TCP / TLS connection per call. The underlying requests.Session is created
+    on first use, and is re-created if used again after close().
+
+    Parameters
+    :param pool_connections: Number of per-host connection pools to keep.
+    :type pool_connections: Integer
+    :param pool_maxsize: Maximum number of connections kept open per host.
+    :type pool_maxsize: Integer
+    :param pool_block: If True, wait for a free connection when all
+      connections to a host are busy, instead of opening a throwaway one.
+    :type pool_block: Bool
+    :param timeout: Seconds to wait for the server, either one number, or a
+      (connect, read) tuple. None means wait forever.
+    :type timeout: Float or Tuple[Float, Float]
+    :param keep_alive: If False, ask the server to close the connection after
+      each request.
+    :type keep_alive: Bool
+    """
+
+    # Exceptions raised by post() for a failed request.
+    errors = (requests.RequestException,)
+
+    def __init__(self, pool_connections=10, pool_maxsize=10, pool_block=False,
+                 timeout=None, keep_alive=True):
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.pool_block = pool_block
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._session = None
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        """The requests.Session holding the connection pool."""
+        with self._lock:
+            if self._session is None:
+                self._session = self._make_session()
+            return self._session
+
+    def _make_session(self):
+        session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=self.pool_connections,
+            pool_maxsize=self.pool_maxsize,
+            pool_block=self.pool_block)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        if not self.keep_alive:
+            session.headers["Connection"] = "close"
+        return session
+
+    def post(self, url, data, headers=None, stream=False):
+        """
+        Send a POST request using a pooled connection.
+
+        Parameters
+        :param url: URL to send the request to.
+        :type url: String
+        :param data: Request body.
+        :type data: String
+        :param headers: Extra request headers.
+        :type headers: Dict[String, String]
+        :param stream: If True, don't read the response body up front.
+        :type stream: Bool
+
+        Return
+        :return: requests.Response
+        :raise: requests.ConnectionError
+        """
+        return self.session.post(
+            url, data=data, headers=headers, timeout=self.timeout,
+            stream=stream)
+
+    @staticmethod
+    def is_connect_error(error):
+        """
+        Check if a post() error happened while connecting, so the request
+        was not sent.
+        """
+        if isinstance(error, requests.ConnectTimeout):
+            return True
+        if isinstance(error, requests.ConnectionError) and error.args:
+            reason = getattr(error.args[0], "reason", None)
+            return isinstance(
+                reason, (NewConnectionError, ConnectTimeoutError))
+        return False
+
+    def close(self):
+        """
+        Close all pooled connections.
+        """
+        with self._lock:
+            session, self._session = self._session, None
+        if session is not None:
+            session.close()
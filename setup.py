@@ -10,13 +10,17 @@ setup(
     url="https://github.com/lindsay-stevens",
     author="Lindsay Stevens",
     author_email="lindsay.stevens.au@gmail.com",
-    packages=find_packages(exclude=["tests", "tests.*"]),
+    packages=find_packages(
+        exclude=["tests", "tests.*", "benchmarks", "benchmarks.*"]),
     test_suite="tests",
     include_package_data=True,
     license="MIT",
     install_requires=[
         "requests==2.28.2",
     ],
+    extras_require={
+        "async": ["aiohttp==3.8.4"],
+    },
     keywords="limesurvey api webservice client",
     classifiers=[
         "Development Status :: 5 - Production/Stable",
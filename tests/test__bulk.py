@@ -0,0 +1,121 @@
+import unittest
+from limesurveyrc2api._bulk import AdaptiveChunkSize, run_bulk
+from limesurveyrc2api.exceptions import LimeSurveyError
+
+
+class TestAdaptiveChunkSize(unittest.TestCase):
+
+    def test_record_success_grows(self):
+        """A fast call with a full size chunk should grow the size."""
+        sizer = AdaptiveChunkSize(initial=100, growth=2)
+        sizer.record_success(100, elapsed=0.1)
+        self.assertEqual(200, sizer.size)
+
+    def test_record_success_partial_chunk_no_growth(self):
+        """A fast call with a smaller chunk should not grow the size."""
+        sizer = AdaptiveChunkSize(initial=100)
+        sizer.record_success(10, elapsed=0.1)
+        self.assertEqual(100, sizer.size)
+
+    def test_record_success_slow_shrinks(self):
+        """A slow call should scale the size towards the target latency."""
+        sizer = AdaptiveChunkSize(initial=100, target_latency=1.0)
+        sizer.record_success(100, elapsed=4.0)
+        self.assertEqual(25, sizer.size)
+
+    def test_record_failure_halves(self):
+        """A failed call should halve the size, down to the minimum."""
+        sizer = AdaptiveChunkSize(initial=100, minimum=30)
+        sizer.record_failure(100)
+        self.assertEqual(50, sizer.size)
+        sizer.record_failure(50)
+        self.assertEqual(30, sizer.size)
+
+
+class TestRunBulk(unittest.TestCase):
+
+    @staticmethod
+    def call_with_limit(limit, status_code=413, calls=None):
+        """Make a call which fails like a server with a max request size."""
+        def call(chunk):
+            if calls is not None:
+                calls.append(chunk)
+            if len(chunk) > limit:
+                raise LimeSurveyError(
+                    "test", "Not response.ok", status_code, b"")
+            return list(chunk)
+        return call
+
+    def test_run_bulk_fixed_success(self):
+        """Fixed size chunks should all be sent, and results collected."""
+        result = run_bulk(list, iter(range(25)), 10, max_workers=2)
+        self.assertTrue(result.ok)
+        self.assertEqual(list(range(25)), sorted(result.results))
+
+    def test_run_bulk_fixed_payload_failure(self):
+        """Fixed size chunks that fail should be reported, not retried."""
+        call = self.call_with_limit(5)
+        result = run_bulk(call, range(25), 10, max_workers=2)
+        self.assertEqual([0, 1], sorted(x["chunk"] for x in result.errors))
+        self.assertEqual([20, 21, 22, 23, 24], sorted(result.results))
+
+    def test_run_bulk_adaptive_splits(self):
+        """Adaptive chunks that fail should be split and retried, and shrink."""
+        sizer = AdaptiveChunkSize(initial=40)
+        result = run_bulk(self.call_with_limit(7), range(100), sizer, 2)
+        self.assertTrue(result.ok)
+        self.assertEqual(list(range(100)), sorted(result.results))
+        self.assertLessEqual(sizer.size, 7)
+
+    def test_run_bulk_adaptive_server_error_not_resent(self):
+        """Adaptive chunks failing with HTTP 500 shrink, but aren't resent."""
+        calls = []
+        sizer = AdaptiveChunkSize(initial=40)
+        call = self.call_with_limit(7, status_code=500, calls=calls)
+        result = run_bulk(call, range(40), sizer, 1)
+        self.assertEqual([list(range(40))], calls)
+        self.assertEqual(list(range(40)), result.errors[0]["items"])
+        self.assertEqual(20, sizer.size)
+
+    def test_run_bulk_adaptive_connect_error_splits(self):
+        """Adaptive chunks that fail to connect should be split and resent."""
+        calls = []
+
+        def call(chunk):
+            calls.append(chunk)
+            if len(chunk) > 5:
+                raise ConnectionRefusedError()
+            return list(chunk)
+
+        def is_connect_error(error):
+            return isinstance(error, ConnectionRefusedError)
+        result = run_bulk(call, range(10), AdaptiveChunkSize(initial=10), 1,
+                          is_connect_error=is_connect_error)
+        self.assertTrue(result.ok)
+        self.assertEqual(list(range(10)), sorted(result.results))
+        self.assertEqual(3, len(calls))
+
+    def test_run_bulk_adaptive_timeout_not_resent(self):
+        """Adaptive chunks that time out shrink, but aren't resent."""
+        calls = []
+
+        def call(chunk):
+            calls.append(chunk)
+            raise TimeoutError()
+        sizer = AdaptiveChunkSize(initial=10)
+        result = run_bulk(call, range(10), sizer, 1,
+                          is_connect_error=lambda e: False)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(1, len(result.errors))
+        self.assertEqual(5, sizer.size)
+
+    def test_run_bulk_adaptive_api_error_not_split(self):
+        """Adaptive chunks failing with an API error status aren't split."""
+        calls = []
+
+        def call(chunk):
+            calls.append(chunk)
+            raise LimeSurveyError("test", "Error: Invalid survey ID")
+        result = run_bulk(call, range(10), AdaptiveChunkSize(initial=10), 1)
+        self.assertEqual(1, len(calls))
+        self.assertEqual(list(range(10)), result.errors[0]["items"])
@@ -0,0 +1,92 @@
+import base64
+import binascii
+import io
+import unittest
+from tests.test_limesurvey import TestBase
+from limesurveyrc2api.limesurvey import LimeSurveyError
+from limesurveyrc2api._component import _Component
+from limesurveyrc2api._responses import write_base64, _Responses
+from limesurveyrc2api._stream import ResultStream
+
+
+class TestWriteBase64(unittest.TestCase):
+
+    def test_pieces_any_length(self):
+        """Pieces not aligned to 4 characters should decode as a whole."""
+        data = bytes(range(256)) * 3
+        text = base64.b64encode(data).decode("ascii")
+        for size in (1, 3, 5, 64):
+            output = io.BytesIO()
+            pieces = [text[i:i + size] for i in range(0, len(text), size)]
+            self.assertEqual(len(data), write_base64(pieces, output))
+            self.assertEqual(data, output.getvalue())
+
+    def test_incomplete(self):
+        """Truncated base64 should raise an error."""
+        with self.assertRaises(binascii.Error):
+            write_base64(["YWJjZA=", ""], io.BytesIO())
+
+
+class StreamApi(object):
+    """Api answering each query with a result stream of one kind."""
+
+    def __init__(self, kind):
+        self.kind = kind
+        self.closed = 0
+
+    def query(self, method, params, stream=False):
+        result = ResultStream((x for x in ["YWJj"]), self.kind)
+        result.on_close(self._close)
+        return result
+
+    def _close(self):
+        self.closed += 1
+
+
+class TestUnexpectedStream(unittest.TestCase):
+
+    def test_export_array(self):
+        """An array instead of the base64 string should raise an error."""
+        api = StreamApi("array")
+        with self.assertRaises(LimeSurveyError) as ctx:
+            _Responses(api)._export("export_responses", {}, io.BytesIO())
+        self.assertEqual("Unexpected result type", ctx.exception.status)
+        self.assertEqual(1, api.closed)
+
+    def test_query_stream_string(self):
+        """A string instead of an array should raise an error."""
+        api = StreamApi("string")
+        with self.assertRaises(LimeSurveyError) as ctx:
+            _Component(api)._query_stream("list_participants", {}, [])
+        self.assertEqual("Unexpected result type", ctx.exception.status)
+        self.assertEqual(1, api.closed)
+
+
+class TestResponses(TestBase):
+
+    def test_export_responses_survey_failure(self):
+        """Exporting responses of an invalid survey should return an error."""
+        for destination in (None, io.BytesIO()):
+            with self.assertRaises(LimeSurveyError) as ctx:
+                self.api.responses.export_responses(
+                    survey_id=self.survey_id_invalid, destination=destination)
+            self.assertIn("Invalid survey", ctx.exception.message)
+
+    def test_export_responses_destination_success(self):
+        """A streamed export should be the same as the returned export."""
+        try:
+            exported = self.api.responses.export_responses(
+                survey_id=self.survey_id)
+        except LimeSurveyError as e:
+            self.skipTest("Survey has no responses: {0}".format(e.status))
+        output = io.BytesIO()
+        written = self.api.responses.export_responses(
+            survey_id=self.survey_id, destination=output)
+        self.assertEqual(len(exported), written)
+        self.assertEqual(exported, output.getvalue())
+
+    def test_export_responses_by_token_failure(self):
+        """Exporting responses for an unknown token should return an error."""
+        with self.assertRaises(LimeSurveyError):
+            self.api.responses.export_responses_by_token(
+                survey_id=self.survey_id, token="not-a-token")
@@ -0,0 +1,80 @@
+import json
+import unittest
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api._stream import decode_response_stream, JSONStream
+
+
+def split(content, size):
+    """Split bytes into chunks of size."""
+    return [content[i:i + size] for i in range(0, len(content), size)]
+
+
+class TestJSONStream(unittest.TestCase):
+
+    def test_read_value_split_chunks(self):
+        """Values split over chunks, including numbers, should be whole."""
+        content = json.dumps([12345, "é€", {"a": [1.5, None]}, True])
+        reader = JSONStream(split(content.encode("utf-8"), 1))
+        self.assertEqual(
+            [12345, "é€", {"a": [1.5, None]}, True],
+            list(reader.iter_array()))
+
+    def test_iter_object_keys(self):
+        """Object keys should be yielded with the reader at their values."""
+        reader = JSONStream(split(b' { "a" : 1 , "b" : [ ] } ', 3))
+        values = {}
+        for key in reader.iter_object():
+            values[key] = reader.read_value()
+        self.assertEqual({"a": 1, "b": []}, values)
+
+    def test_iter_string_split_escapes(self):
+        """Strings should be unescaped in pieces, across chunk boundaries."""
+        text = 'ab/c"d\\e\n\u00e9\U0001f600' * 20
+        content = json.dumps(text).replace("/", "\\/").encode("utf-8")
+        for chunk_size in (1, 2, 5, 7):
+            reader = JSONStream(split(content, chunk_size))
+            pieces = list(reader.iter_string(size=8))
+            self.assertEqual(text, "".join(pieces))
+            self.assertTrue(all(8 <= len(x) for x in pieces[:-1]))
+
+    def test_invalid_json(self):
+        """Invalid JSON should raise a ValueError."""
+        reader = JSONStream([b'[1, 2 3]'])
+        with self.assertRaises(ValueError):
+            list(reader.iter_array())
+
+
+class TestDecodeResponseStream(unittest.TestCase):
+
+    def decode(self, content, status_code=200):
+        return decode_response_stream(
+            "list_participants", status_code, split(content, 4))
+
+    def test_result_array(self):
+        """An array result should be an iterator of its elements."""
+        result = self.decode(b'{"id": 1, "result": [{"tid": 1}, {"tid": 2}]}')
+        self.assertEqual([{"tid": 1}, {"tid": 2}], list(result))
+
+    def test_result_string(self):
+        """A string result should be a stream of its text."""
+        result = self.decode(b'{"id": 1, "result": "YWJj\\/ZA=="}')
+        self.assertEqual("string", result.kind)
+        self.assertEqual("YWJj/ZA==", "".join(result))
+
+    def test_result_other(self):
+        """Other results should be returned decoded."""
+        result = self.decode(b'{"id": 1, "result": {"status": "OK"}}')
+        self.assertEqual({"status": "OK"}, result)
+
+    def test_errors(self):
+        """HTTP errors, empty bodies and missing results should raise."""
+        cases = [
+            (b'{"result": []}', 500, "Not response.ok"),
+            (b'  ', 200, "Not 0 < len(response.content)"),
+            (b'{"id": 1, "error": null}', 200,
+             "Key 'result' not in response json"),
+        ]
+        for content, status_code, status in cases:
+            with self.assertRaises(LimeSurveyError) as ctx:
+                self.decode(content, status_code)
+            self.assertEqual(status, ctx.exception.status)
@@ -1,5 +1,10 @@
+import unittest
 from tests.test_limesurvey import TestBase
 from limesurveyrc2api.limesurvey import LimeSurveyError
+from limesurveyrc2api._bulk import BulkResult
+from limesurveyrc2api._token import (
+    next_page_start, participant_key, unique_participants, SendAllResults,
+    UniqueFilter, NO_CANDIDATES)
 from operator import itemgetter
 from tests.utils import CapturingAiosmtpdServer
 
@@ -54,6 +59,45 @@ class TestTokens(TestBase):
                 self.assertEqual(participant[key], token[key])
                 self.assertIsNotNone(token["token"])
 
+    def test_add_participants_bulk_success(self):
+        """Adding participants in chunks should add all of them."""
+        participants = self.get_participants(
+            "test_add_participants_bulk_success")
+        result = self.api.token.add_participants_bulk(
+            survey_id=self.survey_id, participant_data=iter(participants),
+            chunk_size=2, max_workers=2)
+        self.token_ids = list(result.tokens)
+        self.assertTrue(result.ok)
+        self.assertEqual(len(participants), len(result.tokens))
+        added_emails = sorted(x["email"] for x in result.results)
+        self.assertEqual(
+            sorted(x["email"] for x in participants), added_emails)
+
+    def test_add_participants_bulk_survey_failure(self):
+        """Adding chunks to an invalid survey should report chunk errors."""
+        participants = self.get_participants(
+            "test_add_participants_bulk_survey_failure")
+        result = self.api.token.add_participants_bulk(
+            survey_id=self.survey_id_invalid, participant_data=participants,
+            chunk_size=2)
+        self.assertFalse(result.ok)
+        self.assertEqual([0, 1], sorted(x["chunk"] for x in result.errors))
+        for error in result.errors:
+            self.assertIsInstance(error["error"], LimeSurveyError)
+
+    def test_add_participants_unique_success(self):
+        """Re-adding participants should skip those already in the survey."""
+        participants = self.get_participants(
+            "test_add_participants_unique_success")
+        first = self.api.token.add_participants_unique(
+            survey_id=self.survey_id, participant_data=participants[:2])
+        self.token_ids = list(first.tokens)
+        second = self.api.token.add_participants_unique(
+            survey_id=self.survey_id, participant_data=participants)
+        self.token_ids += list(second.tokens)
+        self.assertEqual((0, 2), (first.skipped, len(first.results)))
+        self.assertEqual((2, 1), (second.skipped, len(second.results)))
+
     def test_delete_participants_success(self):
         """Deleting participants should return deleted token id list."""
         participants = self.get_participants(
@@ -87,6 +131,29 @@ class TestTokens(TestBase):
             "Error: More than 1 result was found based on your attributes.",
             lse.exception.message)
 
+    def test_get_participant_properties_bulk_success(self):
+        """Bulk lookups should return the same results by either strategy."""
+        participants = self.get_participants(
+            "test_get_participant_properties_bulk_success")
+        added_tokens = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=participants)
+        self.token_ids = [x["tid"] for x in added_tokens]
+
+        token_queries = [int(self.token_ids[0]),
+                         {"email": participants[1]["email"]},
+                         {"lastname": participants[2]["lastname"]}]
+        for sweep in (False, True):
+            result = self.api.token.get_participant_properties_bulk(
+                survey_id=self.survey_id, token_queries=token_queries,
+                token_properties=["tid", "email"], sweep=sweep)
+            self.assertEqual(
+                participants[0]["email"], result[token_queries[0]]["email"])
+            self.assertEqual(
+                str(self.token_ids[1]),
+                str(result[(("email", participants[1]["email"]),)]["tid"]))
+            # The lastname query matches all participants, so isn't returned.
+            self.assertEqual(2, len(result))
+
     def test_invite_participants_success(self):
         """Sending invites for survey participants should relay all invites."""
         participants = self.get_participants(
@@ -105,6 +172,42 @@ class TestTokens(TestBase):
         for token_id, email_info in message_statuses.items():
             self.assertEqual("OK", email_info.get("status"))
 
+    def test_invite_participants_all_success(self):
+        """Sending all invites should relay all invites and report progress."""
+        participants = self.get_participants(
+            "test_invite_participants_all_success")
+        added_tokens = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=participants)
+        self.token_ids = [x["tid"] for x in added_tokens]
+
+        progress = []
+        with CapturingAiosmtpdServer() as cas:
+            message_statuses = self.api.token.invite_participants_all(
+                survey_id=self.survey_id, token_ids=self.token_ids,
+                progress=lambda sent, left: progress.append((sent, left)))
+        self.assertEqual(len(participants), len(cas.messages))
+        self.assertEqual("0 left to send", message_statuses.pop("status"))
+        self.assertEqual((len(participants), 0), progress[-1])
+        for token_id, email_info in message_statuses.items():
+            self.assertEqual("OK", email_info.get("status"))
+
+    def test_remind_participants_success(self):
+        """Sending reminders for invited participants should relay them."""
+        participants = self.get_participants(
+            "test_remind_participants_success")
+        added_tokens = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=participants)
+        self.token_ids = [x["tid"] for x in added_tokens]
+
+        with CapturingAiosmtpdServer():
+            self.api.token.invite_participants(
+                survey_id=self.survey_id, token_ids=self.token_ids)
+        with CapturingAiosmtpdServer() as cas:
+            message_statuses = self.api.token.remind_participants(
+                survey_id=self.survey_id, token_ids=self.token_ids)
+        self.assertEqual(len(participants), len(cas.messages))
+        self.assertEqual("0 left to send", message_statuses.pop("status"))
+
     def test_invite_participants_uninvited_failure(self):
         """Re-sending invites with uninvited_only should return an error."""
         participants = self.get_participants(
@@ -290,3 +393,99 @@ class TestTokensWithExisting(TestBase):
             self.api.token.list_participants(
                 survey_id=self.survey_id, conditions={"email": "not_an_email"})
         self.assertIn("No survey participants found.", lse.exception.message)
+
+    def test_iter_participants_success(self):
+        """Iterating over participants should page through all of them."""
+        result = self.api.token.iter_participants(
+            survey_id=self.survey_id, page_size=1)
+        result_token_ids = [x["tid"] for x in result]
+        self.assertEqual(len(result_token_ids), len(set(result_token_ids)))
+        for token_id in self.token_ids:
+            self.assertIn(int(token_id), result_token_ids)
+
+    def test_iter_participants_conditions_empty_success(self):
+        """Iterating with a condition matching none should yield nothing."""
+        result = self.api.token.iter_participants(
+            survey_id=self.survey_id, conditions={"email": "not_an_email"})
+        self.assertEqual([], list(result))
+
+    def test_get_summary_stat_name_success(self):
+        """Querying a single stat name should return just its value."""
+        result = self.api.token.get_summary(
+            survey_id=self.survey_id, stat_name="token_count")
+        self.assertEqual(len(self.participants), int(result))
+
+    def test_export_participants_success(self):
+        """Exporting participants should fetch all pages in token order."""
+        expected = [x["tid"] for x in self.api.token.iter_participants(
+            survey_id=self.survey_id)]
+        result = self.api.token.export_participants(
+            survey_id=self.survey_id, page_size=1, max_workers=2)
+        self.assertEqual(expected, [x["tid"] for x in result])
+
+    def test_export_participants_unordered_success(self):
+        """Exporting participants as completed should fetch all of them."""
+        expected = [x["tid"] for x in self.api.token.iter_participants(
+            survey_id=self.survey_id)]
+        result = self.api.token.export_participants(
+            survey_id=self.survey_id, page_size=1, max_workers=2,
+            ordered=False)
+        self.assertEqual(sorted(expected), sorted(x["tid"] for x in result))
+
+
+class TestUniqueParticipants(unittest.TestCase):
+
+    def test_participant_key(self):
+        """Keys should ignore whitespace, and case in emails."""
+        self.assertEqual(
+            ("a@example.com", "X"),
+            participant_key({"email": " A@Example.com", "attribute_1": "X"},
+                            ("email", "attribute_1")))
+        self.assertIsNone(participant_key({"email": ""}, ("email",)))
+
+    def test_unique_participants(self):
+        """Existing and repeated participants should be skipped."""
+        result = BulkResult()
+        existing = {("a@example.com",)}
+        participants = [
+            {"email": "A@example.com"}, {"email": "b@example.com"},
+            {"email": "B@example.com"}, {}, {}]
+        unique = list(unique_participants(
+            participants, existing, ("email",), result))
+        self.assertEqual([{"email": "b@example.com"}, {}, {}], unique)
+        self.assertEqual(2, result.skipped)
+
+    def test_unique_filter(self):
+        """Participants already listed should be skipped."""
+        unique = UniqueFilter(("email", "attribute_1"))
+        self.assertEqual(["attribute_1"], unique.attributes)
+        unique.add_existing({
+            "participant_info": {"email": "a@example.com"},
+            "attribute_1": "X"})
+        result = BulkResult()
+        added = list(unique.unique([
+            {"email": "a@example.com", "attribute_1": "X"},
+            {"email": "a@example.com", "attribute_1": "Y"}], result))
+        self.assertEqual([{"email": "a@example.com", "attribute_1": "Y"}],
+                         added)
+        self.assertEqual(1, result.skipped)
+
+
+class TestPlans(unittest.TestCase):
+
+    def test_next_page_start(self):
+        """Pages should follow on until a short one."""
+        self.assertEqual(10, next_page_start(0, 10, 10))
+        self.assertIsNone(next_page_start(10, 3, 10))
+
+    def test_send_all_results(self):
+        """Sending should stop when none are left, or none are new."""
+        sender = SendAllResults("invite_participants")
+        self.assertFalse(sender.add({"1": "a", "status": "1 left to send"}))
+        self.assertTrue(sender.finished_by(
+            LimeSurveyError("invite_participants", NO_CANDIDATES)))
+        self.assertTrue(sender.add({"1": "a", "status": "1 left to send"}))
+        self.assertEqual({"1": "a", "status": "1 left to send"},
+                         sender.result())
+        with self.assertRaises(LimeSurveyError):
+            sender.add({"status": "No permission"})
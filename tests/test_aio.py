@@ -0,0 +1,110 @@
+import asyncio
+import os
+import shutil
+import tempfile
+import unittest
+from tests.test_limesurvey import TestBase
+from limesurveyrc2api.aio import AsyncLimeSurvey
+from limesurveyrc2api.limesurvey import LimeSurveyError
+from limesurveyrc2api.session import FileSessionStore
+from limesurveyrc2api.testing import RemoteControl, StandInServer
+
+
+class TestAsyncLimeSurvey(TestBase):
+
+    def run_with_api(self, func):
+        """Run func(api) in an event loop, with an open AsyncLimeSurvey."""
+        async def wrapper():
+            api = AsyncLimeSurvey(url=self.url, username=self.username)
+            await api.open(password=self.password)
+            try:
+                return await func(api)
+            finally:
+                await api.close()
+        return asyncio.run(wrapper())
+
+    def test_get_session_key_success(self):
+        """Opening an async session with valid creds should return a key."""
+        async def func(api):
+            return api.session_key
+        self.assertEqual(32, len(self.run_with_api(func)))
+
+    def test_list_surveys_concurrent_success(self):
+        """Concurrent async queries should all return the same result."""
+        async def func(api):
+            return await asyncio.gather(
+                *[api.survey.list_surveys() for _ in range(10)])
+        results = self.run_with_api(func)
+        expected = self.api.survey.list_surveys()
+        for result in results:
+            self.assertEqual(expected, result)
+
+    def test_list_questions_failure(self):
+        """Async errors should be the same LimeSurveyError as the sync ones."""
+        async def func(api):
+            return await api.survey.list_questions(self.survey_id_invalid)
+        with self.assertRaises(LimeSurveyError) as ctx:
+            self.run_with_api(func)
+        self.assertIn("Error: Invalid survey ID", ctx.exception.message)
+
+
+class TestAsyncStandIn(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, temp_dir)
+        self.path = os.path.join(temp_dir, "sessions.json")
+        self.remote_control = RemoteControl(password="secret")
+        self.survey = self.remote_control.add_survey(participants=3)
+        self.server = StandInServer(self.remote_control, latency=0.02)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def open_concurrently(self, stores):
+        """Open a client per store concurrently, and return their keys."""
+        async def wrapper():
+            clients = [
+                AsyncLimeSurvey(self.server.url, "admin", session_store=x)
+                for x in stores]
+            try:
+                await asyncio.gather(*[x.open("secret") for x in clients])
+                return [x.session_key for x in clients]
+            finally:
+                for client in clients:
+                    await client.close()
+        return asyncio.run(wrapper())
+
+    def test_open_concurrent(self):
+        """Concurrent opens sharing a store should get one session key."""
+        store = FileSessionStore(self.path)
+        keys = self.open_concurrently([store] * 3)
+        self.assertEqual(1, len(set(keys)))
+        self.assertEqual(0, store._lock_depth)
+        self.assertEqual(keys[0], FileSessionStore(self.path).get(
+            self.server.url, "admin"))
+        self.assertEqual(1, len(self.remote_control.sessions))
+
+    def test_open_concurrent_stores(self):
+        """
+        Opens racing with other processes' stores should all use the first
+        stored key, and release the others.
+        """
+        stores = [FileSessionStore(self.path) for _ in range(3)]
+        keys = self.open_concurrently(stores)
+        self.assertEqual(1, len(set(keys)))
+        self.assertEqual([0] * 3, [x._lock_depth for x in stores])
+        self.assertEqual(1, len(self.remote_control.sessions))
+
+    def test_list_participants_stream(self):
+        """Streamed async listings should be decoded like the sync ones."""
+        async def func():
+            api = AsyncLimeSurvey(self.server.url, "admin")
+            await api.open("secret")
+            try:
+                return list(await api.token.list_participants(
+                    self.survey.sid, stream=True))
+            finally:
+                await api.close()
+        participants = asyncio.run(func())
+        self.assertEqual(
+            [1, 2, 3], [x["tid"] for x in participants])
@@ -0,0 +1,121 @@
+import json
+import unittest
+from types import SimpleNamespace
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.limesurvey import LimeSurvey
+
+
+class StubTransport(object):
+    """Transport answering each call with its method name as the result."""
+
+    errors = (OSError,)
+
+    def __init__(self, batch_supported=True):
+        self.batch_supported = batch_supported
+        self.batch_status = 200
+        self.bodies = []
+
+    def post(self, url, data, headers=None, stream=False):
+        body = json.loads(data)
+        self.bodies.append(body)
+        if isinstance(body, list) and self.batch_status != 200:
+            return SimpleNamespace(
+                status_code=self.batch_status, content=b"Server error")
+        if isinstance(body, list):
+            if not self.batch_supported:
+                result = {"id": None, "result": None, "error": "No batches"}
+            else:
+                # Answer in reverse order, to check calls are matched by id.
+                result = [self._answer(x) for x in reversed(body)]
+        else:
+            result = self._answer(body)
+        return SimpleNamespace(
+            status_code=200, content=json.dumps(result).encode("utf-8"))
+
+    @staticmethod
+    def _answer(request):
+        if request["method"] == "list_questions":
+            result = [{"qid": request["params"]["iSurveyID"]}]
+        else:
+            result = {"status": "No permission"}
+        return {"id": request["id"], "result": result, "error": None}
+
+    @staticmethod
+    def is_connect_error(error):
+        return False
+
+
+class TestBatch(unittest.TestCase):
+
+    def setUp(self):
+        self.transport = StubTransport()
+        self.api = LimeSurvey("http://localhost/", "user", self.transport)
+        self.api.session_key = "key"
+
+    def test_request_ids_unique(self):
+        """Each request should have a different id."""
+        self.api.query("list_surveys", {"sSessionKey": "key"})
+        self.api.query("list_surveys", {"sSessionKey": "key"})
+        ids = [x["id"] for x in self.transport.bodies]
+        self.assertEqual(len(set(ids)), 2)
+
+    def test_batch_results_matched_by_id(self):
+        """Batch results should be returned to the call with the same id."""
+        with self.api.batch(max_size=2) as batch:
+            calls = [batch.survey.list_questions(x) for x in range(5)]
+            self.assertRaises(LimeSurveyError, calls[0].result)
+        self.assertEqual(
+            [[{"qid": x}] for x in range(5)], [x.result() for x in calls])
+        self.assertEqual(3, len(self.transport.bodies))
+        self.assertTrue(self.api.batch_supported)
+
+    def test_batch_error_per_call(self):
+        """A failed call should not affect the others in the batch."""
+        with self.api.batch() as batch:
+            ok = batch.survey.list_questions(1)
+            failed = batch.token.get_summary(1)
+        self.assertEqual([{"qid": 1}], ok.result())
+        with self.assertRaises(LimeSurveyError) as ctx:
+            failed.result()
+        self.assertIn("No permission", str(ctx.exception))
+
+    def test_batch_not_supported(self):
+        """Calls should be sent singly if the server rejects batches."""
+        self.transport.batch_supported = False
+        with self.api.batch(max_size=2) as batch:
+            calls = [batch.survey.list_questions(x) for x in range(3)]
+        self.assertEqual(
+            [[{"qid": x}] for x in range(3)], [x.result() for x in calls])
+        self.assertFalse(self.api.batch_supported)
+        # One rejected batch, then only single requests.
+        batches = [x for x in self.transport.bodies if isinstance(x, list)]
+        self.assertEqual(1, len(batches))
+        self.assertEqual(4, len(self.transport.bodies))
+
+    def test_batch_not_supported_writes(self):
+        """Writes in a rejected batch should fail, not be sent singly."""
+        self.transport.batch_supported = False
+        with self.api.batch() as batch:
+            read = batch.survey.list_questions(1)
+            write = batch.token.delete_participants(1, [1])
+        self.assertEqual([{"qid": 1}], read.result())
+        with self.assertRaises(LimeSurveyError) as ctx:
+            write.result()
+        self.assertEqual("Batch not supported", ctx.exception.status)
+        self.assertEqual(
+            ["list_questions"],
+            [x["method"] for x in self.transport.bodies[1:]])
+
+    def test_batch_http_error(self):
+        """
+        A failed batch request should fail each call, and not stop batches.
+        """
+        self.transport.batch_status = 500
+        with self.api.batch() as batch:
+            calls = [batch.survey.list_questions(x) for x in range(2)]
+        for call in calls:
+            with self.assertRaises(LimeSurveyError) as ctx:
+                call.result()
+            self.assertEqual(500, ctx.exception.args[2])
+        self.assertEqual(1, len(self.transport.bodies))
+        self.assertIsNone(self.api.batch_supported)
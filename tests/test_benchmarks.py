@@ -0,0 +1,29 @@
+import unittest
+from benchmarks.run import compare, run_benchmarks
+
+
+class TestBenchmarks(unittest.TestCase):
+
+    def test_run(self):
+        """A quick run should measure each mode of the chosen benchmarks."""
+        results = run_benchmarks(
+            size="quick", benchmarks=("query", "add_participants"))
+        modes = [(x["benchmark"], x["mode"]) for x in results["results"]]
+        self.assertIn(("query", {"transport": "async", "workers": 8}), modes)
+        self.assertIn(("add_participants", {"workers": 1}), modes)
+        for result in results["results"]:
+            self.assertLess(0, result["value"])
+        self.assertEqual("quick", results["meta"]["size"])
+
+    def test_compare(self):
+        """Lower rates and higher memory use should be regressions."""
+        def results(*values):
+            return {"results": [
+                {"benchmark": "query", "mode": {"workers": 1},
+                 "unit": "calls/s", "value": values[0]},
+                {"benchmark": "listing_rss", "mode": {"decoding": "list"},
+                 "unit": "bytes", "value": values[1]}]}
+        baseline = results(100, 1000)
+        self.assertEqual([], compare(results(90, 1100), baseline))
+        regressions = compare(results(70, 1300), baseline)
+        self.assertEqual([100, 1000], [x[1] for x in regressions])
@@ -0,0 +1,109 @@
+import os
+import shutil
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+from limesurveyrc2api.cache import MetadataCache
+
+
+def make_params(session_key, survey_id):
+    return OrderedDict([("sSessionKey", session_key), ("iSurveyID", survey_id)])
+
+
+class TestMetadataCache(unittest.TestCase):
+
+    def test_get_missing(self):
+        """Getting a result that was not cached should miss."""
+        cache = MetadataCache()
+        self.assertEqual(
+            (False, None), cache.get("list_questions", make_params("k", 1)))
+
+    def test_set_get_ignores_session_key(self):
+        """A cached result should be found with a different session key."""
+        cache = MetadataCache()
+        cache.set("list_questions", make_params("k1", 1), [{"qid": 1}])
+        self.assertEqual(
+            (True, [{"qid": 1}]),
+            cache.get("list_questions", make_params("k2", 1)))
+        self.assertFalse(cache.get("list_questions", make_params("k1", 2))[0])
+
+    def test_get_returns_copy(self):
+        """Changing a returned result should not change the cached one."""
+        cache = MetadataCache()
+        cache.set("list_questions", make_params("k", 1), [{"qid": 1}])
+        cache.get("list_questions", make_params("k", 1))[1].append("x")
+        self.assertEqual(
+            [{"qid": 1}], cache.get("list_questions", make_params("k", 1))[1])
+
+    def test_set_uncached_method(self):
+        """Results of methods without a TTL should not be cached."""
+        cache = MetadataCache()
+        cache.set("list_participants", make_params("k", 1), [])
+        self.assertFalse(cache.get("list_participants", make_params("k", 1))[0])
+
+    def test_get_expired(self):
+        """Results older than the method TTL should miss."""
+        cache = MetadataCache(ttls={"list_questions": 0})
+        cache.set("list_questions", make_params("k", 1), [])
+        self.assertFalse(cache.get("list_questions", make_params("k", 1))[0])
+
+    def test_lru_eviction(self):
+        """The least recently used result should be evicted when full."""
+        cache = MetadataCache(maxsize=2)
+        for survey_id in (1, 2):
+            cache.set("list_questions", make_params("k", survey_id), [])
+        cache.get("list_questions", make_params("k", 1))
+        cache.set("list_questions", make_params("k", 3), [])
+        self.assertTrue(cache.get("list_questions", make_params("k", 1))[0])
+        self.assertFalse(cache.get("list_questions", make_params("k", 2))[0])
+
+    def test_invalidate(self):
+        """Invalidating should remove results by method or parameters."""
+        cache = MetadataCache()
+        cache.set("list_questions", make_params("k", 1), [])
+        cache.set("list_questions", make_params("k", 2), [])
+        cache.set("list_surveys", make_params("k", "admin"), [])
+        cache.invalidate("list_questions", make_params("k", 1))
+        self.assertFalse(cache.get("list_questions", make_params("k", 1))[0])
+        self.assertTrue(cache.get("list_questions", make_params("k", 2))[0])
+        cache.invalidate("list_questions")
+        self.assertFalse(cache.get("list_questions", make_params("k", 2))[0])
+        self.assertTrue(cache.get("list_surveys", make_params("k", "admin"))[0])
+        cache.invalidate()
+        self.assertFalse(
+            cache.get("list_surveys", make_params("k", "admin"))[0])
+
+    def test_path_shared_between_caches(self):
+        """A result cached on disk should be found by a new cache."""
+        with tempfile.TemporaryDirectory() as path:
+            MetadataCache(path=path).set(
+                "list_questions", make_params("k", 1), [{"qid": 1}])
+            cache = MetadataCache(path=path)
+            self.assertEqual(
+                (True, [{"qid": 1}]),
+                cache.get("list_questions", make_params("k", 1)))
+            cache.invalidate("list_questions")
+            self.assertFalse(MetadataCache(path=path).get(
+                "list_questions", make_params("k", 1))[0])
+
+    def test_path_concurrent_set(self):
+        """Concurrent writers of one result should not clash on disk."""
+        with tempfile.TemporaryDirectory() as path:
+            cache = MetadataCache(path=path)
+            params = make_params("k", 1)
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                list(executor.map(
+                    lambda x: cache.set("list_questions", params, [x]),
+                    range(64)))
+            self.assertTrue(MetadataCache(path=path).get(
+                "list_questions", params)[0])
+            self.assertEqual(1, len(os.listdir(path)))
+
+    def test_path_write_error(self):
+        """A result that can't be written to disk should still be cached."""
+        path = tempfile.mkdtemp()
+        cache = MetadataCache(path=path)
+        shutil.rmtree(path)
+        cache.set("list_questions", make_params("k", 1), [])
+        self.assertTrue(cache.get("list_questions", make_params("k", 1))[0])
@@ -0,0 +1,117 @@
+import gzip
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from limesurveyrc2api.cassette import (
+    RecordingTransport, REDACTED, ReplayTransport)
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.limesurvey import LimeSurvey
+from limesurveyrc2api.testing import RemoteControl, StandInServer
+from limesurveyrc2api.transport import HTTPTransport
+
+
+class TestCassette(unittest.TestCase):
+
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.temp_dir)
+        self.remote_control = RemoteControl(password="secret")
+        self.survey = self.remote_control.add_survey(participants=5)
+        self.server = StandInServer(
+            self.remote_control, latency=0.02, batch=True)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+
+    def record(self, name, work):
+        """Run work with a client recording to a file, and return its path."""
+        path = os.path.join(self.temp_dir, name)
+        transport = RecordingTransport(HTTPTransport(), path)
+        api = LimeSurvey(self.server.url, "admin", transport=transport)
+        api.open("secret")
+        session_key = api.session_key
+        expected = work(api)
+        api.close()
+        return path, session_key, expected
+
+    def replay(self, path, work, speed=None):
+        transport = ReplayTransport(path, speed=speed)
+        api = LimeSurvey("http://example.com", "admin", transport=transport)
+        api.open("anything")
+        result = work(api)
+        api.close()
+        return transport, result
+
+    def test_record_replay(self):
+        """Replayed calls should get the recorded results, redacted."""
+        def work(api):
+            return (api.token.list_participants(self.survey.sid),
+                    list(api.token.list_participants(
+                        self.survey.sid, limit=2, stream=True)))
+        path, session_key, expected = self.record("sync.jsonl", work)
+        with open(path) as f:
+            text = f.read()
+        self.assertEqual(4, len(text.splitlines()))
+        self.assertNotIn("secret", text)
+        self.assertNotIn(session_key, text)
+        self.assertIn(REDACTED, text)
+
+        transport, result = self.replay(path, work)
+        self.assertEqual(expected, result)
+        self.assertEqual(0, transport.remaining)
+
+    def test_gzip_append(self):
+        """Recordings to a .gz path should be compressed, and appended to."""
+        def work(api):
+            return api.survey.list_surveys()
+        path, _, expected = self.record("sync.jsonl.gz", work)
+        self.record("sync.jsonl.gz", work)
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(6, len(f.read().splitlines()))
+        transport, result = self.replay(path, work)
+        self.assertEqual(expected, result)
+        self.assertEqual(3, transport.remaining)
+
+    def test_reopen(self):
+        """Exchanges after the transport is closed should still be recorded."""
+        path = os.path.join(self.temp_dir, "reopen.jsonl.gz")
+        transport = RecordingTransport(HTTPTransport(), path)
+        api = LimeSurvey(self.server.url, "admin", transport=transport)
+        for _ in range(2):
+            api.open("secret")
+            api.survey.list_surveys()
+            api.close()
+        with gzip.open(path, "rt") as f:
+            self.assertEqual(6, len(f.read().splitlines()))
+
+    def test_replay_timing(self):
+        """Replay should take the recorded server time only if asked."""
+        def work(api):
+            return [api.survey.list_surveys() for _ in range(3)]
+        path, _, _ = self.record("sync.jsonl", work)
+        start = time.perf_counter()
+        self.replay(path, work, speed=1)
+        self.assertLessEqual(0.08, time.perf_counter() - start)
+        start = time.perf_counter()
+        self.replay(path, work)
+        self.assertGreater(0.02, time.perf_counter() - start)
+
+    def test_replay_batch(self):
+        """Batch results should be matched to the replaying client's ids."""
+        def work(api):
+            with api.batch() as batch:
+                calls = [batch.token.get_participant_properties(
+                    self.survey.sid, tid) for tid in (1, 2)]
+            return [x.result()["tid"] for x in calls]
+        path, _, expected = self.record("batch.jsonl", work)
+        _, result = self.replay(
+            path, lambda api: (next(api.request_ids), work(api)))
+        self.assertEqual(expected, result[1])
+
+    def test_not_recorded(self):
+        """A call that wasn't recorded should raise an error."""
+        path, _, _ = self.record("sync.jsonl", lambda api: None)
+        with self.assertRaises(LimeSurveyError) as ctx:
+            self.replay(path, lambda api: api.survey.list_surveys())
+        self.assertEqual("No recorded response", ctx.exception.status)
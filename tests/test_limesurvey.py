@@ -1,6 +1,9 @@
 import os
 import unittest
 from limesurveyrc2api.limesurvey import LimeSurvey, LimeSurveyError
+from limesurveyrc2api.policy import AIMDLimiter, CircuitBreaker
+from limesurveyrc2api.session import MemorySessionStore
+from limesurveyrc2api.testing import RemoteControl, StandInServer, TRUNCATE
 from configparser import ConfigParser
 from operator import itemgetter
 
@@ -74,3 +77,117 @@ class TestSessions(TestBase):
         self.assertEqual("OK", result)
 
         self.api.session_key = real_key
+
+
+class TestTransport(TestBase):
+
+    def test_transport_shared_success(self):
+        """Queries should reuse the client's pooled transport session."""
+        session = self.api.transport.session
+        self.api.survey.list_surveys()
+        self.api.survey.list_questions(survey_id=self.survey_id)
+        self.assertIs(session, self.api.transport.session)
+
+    def test_transport_closed_on_close_success(self):
+        """Closing the client should close the transport session."""
+        session = self.api.transport.session
+        self.api.close()
+        self.api.open(password=self.password)
+        self.assertIsNot(session, self.api.transport.session)
+
+
+class TestReauthentication(TestBase):
+
+    def test_invalid_session_key_reauthenticates_success(self):
+        """A query with an invalid session key should re-authenticate."""
+        self.api.session_key = "boguskey"
+        result = self.api.survey.list_surveys()
+        self.assertIsInstance(result, list)
+        self.assertEqual(32, len(self.api.session_key))
+
+    def test_session_store_reuses_key_success(self):
+        """A client with a session store should reuse a stored key."""
+        store = MemorySessionStore()
+        api1 = LimeSurvey(url=self.url, username=self.username,
+                          session_store=store)
+        api1.open(password=self.password)
+        api2 = LimeSurvey(url=self.url, username=self.username,
+                          session_store=store)
+        api2.open(password=self.password)
+        self.assertEqual(api1.session_key, api2.session_key)
+        api2.close()
+        api1.close(release=True)
+        self.assertIsNone(store.get(self.url, self.username))
+
+
+class TestSessionPool(TestBase):
+
+    def test_open_sessions_success(self):
+        """Opening several sessions should pool distinct session keys."""
+        api = LimeSurvey(url=self.url, username=self.username)
+        api.open(password=self.password, sessions=3)
+        session_keys = api.session_pool.session_keys
+        self.assertEqual(3, len(set(session_keys)))
+        self.assertIsInstance(api.survey.list_surveys(), list)
+        self.assertEqual("OK", api.close())
+        self.assertIsNone(api.session_pool)
+
+
+class TestStreamGuard(unittest.TestCase):
+    """A streamed query should hold its limits until the stream is closed."""
+
+    def setUp(self):
+        self.remote_control = RemoteControl()
+        self.survey = self.remote_control.add_survey(participants=3)
+        self.server = StandInServer(self.remote_control)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.limiter = AIMDLimiter(initial=2)
+        self.breaker = CircuitBreaker(failure_threshold=1)
+        self.api = LimeSurvey(
+            self.server.url, "admin", concurrency_limiter=self.limiter,
+            circuit_breaker=self.breaker)
+        self.addCleanup(self.api.transport.close)
+
+    def stream(self):
+        return self.api.token.list_participants(self.survey.sid, stream=True)
+
+    def test_stream_holds_limiter(self):
+        """The limiter slot should be released when the stream is read."""
+        self.api.open("admin")
+        stream = self.stream()
+        self.assertEqual(1, self.limiter.in_flight)
+        self.assertEqual(3, len(list(stream)))
+        self.assertEqual(0, self.limiter.in_flight)
+
+    def test_stream_failure_counted(self):
+        """A failure while reading the stream should trip the breaker."""
+        self.api.open("admin")
+        self.server.inject(TRUNCATE, method="list_participants")
+        stream = self.stream()
+        self.assertEqual(CircuitBreaker.CLOSED, self.breaker.state)
+        with self.assertRaises(ValueError):
+            list(stream)
+        self.assertEqual(CircuitBreaker.OPEN, self.breaker.state)
+        self.assertEqual(0, self.limiter.in_flight)
+
+    def test_stream_abandoned(self):
+        """Stopping an iteration early should release the stream's limits."""
+        self.api.open("admin")
+        for _ in range(3):
+            participants = self.api.token.iter_participants(
+                self.survey.sid, stream=True)
+            next(participants)
+            participants.close()
+        self.assertEqual(0, self.limiter.in_flight)
+        self.assertTrue(self.limiter.acquire(timeout=1))
+
+    def test_stream_holds_lease(self):
+        """The pooled session key should be leased until the stream closes."""
+        self.api.open("admin", sessions=2)
+        streams = [self.stream() for _ in range(2)]
+        self.assertEqual(0, self.api.session_pool._idle.qsize())
+        streams[0].close()
+        self.assertEqual(1, self.api.session_pool._idle.qsize())
+        streams[1].close()
+        self.assertEqual(2, self.api.session_pool._idle.qsize())
@@ -0,0 +1,165 @@
+import json
+import unittest
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.limesurvey import LimeSurvey
+from limesurveyrc2api.metrics import (
+    Histogram, MetricsRecorder, RequestHooks, RequestInfo, error_category,
+    status_category)
+from limesurveyrc2api.policy import RetryPolicy
+
+
+class StubResponse(object):
+
+    def __init__(self, status_code, result):
+        self.status_code = status_code
+        self.content = json.dumps({"result": result}).encode("utf-8")
+
+    def iter_content(self, size):
+        for i in range(0, len(self.content), size):
+            yield self.content[i:i + size]
+
+    def close(self):
+        pass
+
+
+class StubTransport(object):
+    """Transport replying with queued (status_code, result) responses."""
+
+    errors = (IOError,)
+
+    def __init__(self, replies):
+        self.replies = list(replies)
+
+    def post(self, url, headers, data, stream=False):
+        return StubResponse(*self.replies.pop(0))
+
+    def is_connect_error(self, error):
+        return False
+
+    def close(self):
+        pass
+
+
+class TestHistogram(unittest.TestCase):
+
+    def test_cumulative(self):
+        """Values should count in the first bucket at or above them."""
+        histogram = Histogram((1, 2))
+        for value in (0.5, 1, 1.5, 3):
+            histogram.observe(value)
+        self.assertEqual(
+            [(1, 2), (2, 3), (float("inf"), 4)], histogram.cumulative())
+        self.assertEqual(6, histogram.sum)
+
+
+class TestMetricsRecorder(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = MetricsRecorder()
+        self.calls = []
+        hooks = RequestHooks(
+            before=lambda x: self.calls.append(("before", x.method)),
+            after=lambda x: self.calls.append(("after", x.method)))
+        self.instruments = [self.recorder, hooks]
+
+    def test_request_info(self):
+        """A request should be measured by phase, and call the hooks."""
+        info = RequestInfo("list_surveys", self.instruments)
+        info.begin(1, '{"method": "list_surveys"}')
+        info.received(200, b'{"result": {"status": "No surveys found"}}')
+        info.finish({"status": "No surveys found"})
+        self.assertEqual(
+            [("before", "list_surveys"), ("after", "list_surveys")],
+            self.calls)
+        self.assertEqual(26, info.request_bytes)
+        self.assertEqual(42, info.response_bytes)
+        self.assertEqual("No surveys found", info.status)
+        for phase in ("serialize", "network", "decode"):
+            self.assertLessEqual(0, getattr(info, phase))
+        self.assertEqual(
+            1, self.recorder.statuses[("list_surveys", "not_found")])
+        self.assertEqual(
+            1, self.recorder.latency[("list_surveys", "total")].count)
+
+    def test_status_category(self):
+        """Statuses should be categorised into a fixed set."""
+        self.assertEqual(
+            ["ok", "left_to_send", "auth", "auth", "permission", "not_found",
+             "not_found", "not_found", "invalid_input", "invalid_input",
+             "error", "error"],
+            [status_category(x) for x in (
+                "OK", "3 left to send", "Invalid session key",
+                "Invalid Session Key", "No permission",
+                "Error: Invalid survey ID", "No survey participants found.",
+                "Language code not found for this survey.",
+                "Invalid summary key", "Illegal operator: BETWEEN",
+                "Something new", 42)])
+
+    def test_error_category(self):
+        """Errors should be categorised into the same fixed set."""
+        self.assertEqual("http", error_category(
+            LimeSurveyError("list_surveys", "Not response.ok", 500)))
+        self.assertEqual("transport", error_category(
+            LimeSurveyError("list_surveys", "Circuit breaker open")))
+        self.assertEqual("auth", error_category(
+            LimeSurveyError("list_surveys", "No session open")))
+        self.assertEqual("transport", error_category(ConnectionError("x")))
+        self.assertEqual("http", error_category(ValueError("x")))
+        self.assertEqual("error", error_category(KeyError("x")))
+
+    def test_query_metrics(self):
+        """Queries should record latency, sizes, retries and errors."""
+        transport = StubTransport([
+            (200, "key"), (503, None), (200, []), (500, None), (500, None)])
+        api = LimeSurvey(
+            "http://example.com", "admin", transport=transport,
+            retry_policy=RetryPolicy(max_attempts=2, backoff=0),
+            instruments=self.instruments)
+        api.open("password")
+        self.assertEqual([], api.survey.list_questions(1))
+        with self.assertRaises(LimeSurveyError):
+            api.token.list_participants(1)
+        recorder = self.recorder
+        self.assertEqual(1, recorder.retries["list_questions"])
+        self.assertEqual(
+            1, recorder.errors[("list_participants", "http")])
+        self.assertEqual(
+            1, recorder.latency[("list_participants", "network")].count)
+        self.assertNotIn(("list_participants", "decode"), recorder.latency)
+        self.assertNotIn(("list_participants", "response"), recorder.sizes)
+        self.assertEqual(6, len(self.calls))
+
+        text = recorder.to_prometheus()
+        self.assertIn(
+            'limesurvey_retries_total{method="list_questions"} 1\n', text)
+        self.assertIn(
+            'limesurvey_errors_total{method="list_participants",'
+            'category="http"} 1\n', text)
+        self.assertIn(
+            'limesurvey_request_duration_seconds_bucket'
+            '{method="list_questions",phase="total",le="+Inf"} 1\n', text)
+        self.assertIn("# TYPE limesurvey_payload_bytes histogram\n", text)
+
+    def test_query_stream_metrics(self):
+        """A streamed query should be recorded when the stream is closed."""
+        participants = [{"tid": str(x)} for x in range(100)]
+        transport = StubTransport([(200, "key"), (200, participants)])
+        api = LimeSurvey("http://example.com", "admin", transport=transport,
+                         instruments=self.instruments)
+        api.open("password")
+        stream = api.token.list_participants(1, stream=True)
+        self.assertEqual(1, self.recorder.requests["get_session_key"])
+        self.assertNotIn("list_participants", self.recorder.requests)
+        self.assertEqual(participants, list(stream))
+        self.assertEqual(1, self.recorder.requests["list_participants"])
+        self.assertEqual(
+            len(StubResponse(200, participants).content),
+            self.recorder.sizes[("list_participants", "response")].sum)
+
+    def test_no_instruments(self):
+        """Without instruments, queries should not be measured."""
+        transport = StubTransport([(200, "key")])
+        api = LimeSurvey("http://example.com", "admin", transport=transport)
+        api.open("password")
+        self.assertEqual("key", api.session_key)
+        self.assertEqual([], api.instruments)
@@ -0,0 +1,135 @@
+import csv
+import math
+import os
+import shutil
+import tempfile
+import unittest
+from array import array
+from limesurveyrc2api.parsing import (
+    column_types, convert_column, parse_responses_csv, read_header,
+    record_end, split_records)
+
+
+class TestParsing(unittest.TestCase):
+
+    fields = ["id", "lastpage", "Q1", "Q2[SQ001]", "Q3"]
+    questions = [
+        {"title": "Q1", "type": "N", "parent_qid": "0"},
+        {"title": "Q2", "type": "K", "parent_qid": "0"},
+        {"title": "SQ001", "type": "T", "parent_qid": "2"},
+        {"title": "Q3", "type": "T", "parent_qid": "0"}]
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmp, "responses.csv")
+        self.rows = []
+        for i in range(1, 201):
+            self.rows.append([
+                str(i), "" if i % 7 == 0 else "2", str(i / 2),
+                "" if i % 5 == 0 else str(i), 'line 1\nline "{0}"'.format(i)])
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            f.write("\ufeff")
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(self.fields)
+            writer.writerows(self.rows)
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_record_end_quoted_newline(self):
+        """A newline inside quotes should not end the record."""
+        data = b'"a","b\nc"\n"d"\n'
+        self.assertEqual((10, 0), record_end(data, 0))
+        self.assertEqual((-1, 1), record_end(b'"a\nb', 0))
+        self.assertEqual((3, 0), record_end(b'b"\n"c"', 0, parity=1))
+
+    def test_read_header(self):
+        """The header should be read without the byte order mark."""
+        fields, offset = read_header(self.path)
+        self.assertEqual(self.fields, fields)
+        with open(self.path, "rb") as f:
+            f.seek(offset)
+            self.assertTrue(f.read(3).startswith(b'"1"'))
+
+    def test_split_records(self):
+        """Chunks should cover the file, and end on record boundaries."""
+        _, offset = read_header(self.path)
+        size = os.path.getsize(self.path)
+        chunks = split_records(self.path, chunk_size=500, start=offset)
+        self.assertLess(1, len(chunks))
+        self.assertEqual(offset, chunks[0][0])
+        self.assertEqual(size, chunks[-1][1])
+        with open(self.path, "rb") as f:
+            data = f.read()
+        rows = 0
+        for (start, end), (next_start, _) in zip(chunks, chunks[1:]):
+            self.assertEqual(end, next_start)
+        for start, end in chunks:
+            rows += len(list(csv.reader(
+                data[start:end].decode("utf-8").splitlines(True))))
+        self.assertEqual(len(self.rows), rows)
+
+    def test_column_types(self):
+        """Numeric questions, and their subquestions, should be floats."""
+        self.assertEqual(
+            {"id": "int", "lastpage": "float", "Q1": "float",
+             "Q2[SQ001]": "float", "Q3": "str"},
+            column_types(self.fields, self.questions))
+        self.assertEqual("str", column_types(["Q1"], None)["Q1"])
+
+    def test_convert_column(self):
+        """Blanks should be NaN in numbers, and None in strings."""
+        self.assertEqual(array("q", [1, 2]), convert_column(("1", "2"), "int"))
+        floats = convert_column(("1", ""), "int")
+        self.assertEqual("d", floats.typecode)
+        self.assertEqual(1.0, floats[0])
+        self.assertTrue(math.isnan(floats[1]))
+        self.assertEqual(["x", None], convert_column(("x", ""), "float"))
+        self.assertEqual(["x", None], convert_column(("x", ""), "str"))
+
+    def test_parse_responses_csv(self):
+        """Parsing in chunks, serially or in processes, should be the same."""
+        serial = parse_responses_csv(
+            self.path, self.questions, max_workers=1, chunk_size=500)
+        whole = parse_responses_csv(self.path, self.questions)
+        pooled = parse_responses_csv(
+            self.path, self.questions, max_workers=2, chunk_size=500)
+        self.assertEqual(self.fields, list(serial))
+        self.assertEqual(array("q", range(1, 201)), serial["id"])
+        self.assertEqual([x[4] for x in self.rows], serial["Q3"])
+        self.assertEqual(
+            [float(x[3]) if x[3] else None for x in self.rows],
+            [None if math.isnan(x) else x for x in serial["Q2[SQ001]"]])
+        for result in (whole, pooled):
+            self.assertEqual(list(serial), list(result))
+            self.assertEqual(serial["Q3"], result["Q3"])
+            self.assertEqual(serial["id"], result["id"])
+            self.assertEqual(
+                str(list(serial["lastpage"])), str(list(result["lastpage"])))
+
+    def test_parse_responses_csv_promoted(self):
+        """An int column with blanks in one chunk should be all floats."""
+        self.rows[-1][0] = ""
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(self.fields)
+            writer.writerows(self.rows)
+        result = parse_responses_csv(
+            self.path, self.questions, max_workers=1, chunk_size=500)
+        self.assertEqual("d", result["id"].typecode)
+        self.assertEqual(list(range(1, 200)), list(result["id"][:-1]))
+        self.assertTrue(math.isnan(result["id"][-1]))
+
+    def test_parse_responses_csv_fallback(self):
+        """A column that doesn't convert in one chunk should be strings."""
+        self.rows[-1][2] = "n/a"
+        with open(self.path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+            writer.writerow(self.fields)
+            writer.writerows(self.rows)
+        for max_workers in (1, 2):
+            result = parse_responses_csv(
+                self.path, self.questions, max_workers=max_workers,
+                chunk_size=500)
+            self.assertEqual([x[2] for x in self.rows], result["Q1"])
+            self.assertEqual(array("q", range(1, 201)), result["id"])
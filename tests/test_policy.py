@@ -0,0 +1,129 @@
+import time
+import unittest
+from limesurveyrc2api.policy import (
+    AIMDLimiter, CircuitBreaker, RetryPolicy, TokenBucket)
+
+
+class TestRetryPolicy(unittest.TestCase):
+
+    def test_should_retry_read_method(self):
+        """Read methods should be retried after any retryable failure."""
+        policy = RetryPolicy()
+        self.assertTrue(policy.should_retry("list_participants", 0))
+        self.assertTrue(
+            policy.should_retry("list_participants", 0, status_code=502))
+        self.assertFalse(
+            policy.should_retry("list_participants", 0, status_code=404))
+
+    def test_should_retry_write_method(self):
+        """Write methods should only be retried if not processed."""
+        policy = RetryPolicy()
+        self.assertFalse(policy.should_retry("add_participants", 0))
+        self.assertTrue(
+            policy.should_retry("add_participants", 0, connect_error=True))
+        self.assertFalse(
+            policy.should_retry("add_participants", 0, status_code=502))
+        self.assertTrue(
+            policy.should_retry("add_participants", 0, status_code=503))
+
+    def test_should_retry_max_attempts(self):
+        """Queries should not be retried after max_attempts."""
+        policy = RetryPolicy(max_attempts=3)
+        self.assertTrue(policy.should_retry("list_surveys", 1))
+        self.assertFalse(policy.should_retry("list_surveys", 2))
+
+    def test_delay_bounds(self):
+        """Delays should be within the exponential backoff limit."""
+        policy = RetryPolicy(backoff=1, max_backoff=5)
+        for attempt, limit in [(0, 1), (1, 2), (2, 4), (5, 5)]:
+            for _ in range(20):
+                self.assertLessEqual(0, policy.delay(attempt))
+                self.assertLessEqual(policy.delay(attempt), limit)
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def test_reserve_burst(self):
+        """Up to capacity tokens should be available without waiting."""
+        bucket = TokenBucket(rate=10, capacity=3)
+        self.assertEqual([0, 0, 0], [bucket.reserve() for _ in range(3)])
+        self.assertAlmostEqual(0.1, bucket.reserve(), places=2)
+        self.assertAlmostEqual(0.2, bucket.reserve(), places=2)
+
+    def test_acquire_rate(self):
+        """Acquiring more than capacity should wait for the rate."""
+        bucket = TokenBucket(rate=100, capacity=1)
+        started = time.monotonic()
+        for _ in range(6):
+            bucket.acquire()
+        self.assertLessEqual(0.04, time.monotonic() - started)
+
+
+class TestAIMDLimiter(unittest.TestCase):
+
+    def test_acquire_limit(self):
+        """No more than limit queries should be in flight."""
+        limiter = AIMDLimiter(initial=2)
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertTrue(limiter.acquire(timeout=0))
+        self.assertFalse(limiter.acquire(timeout=0))
+        self.assertEqual(2, limiter.in_flight)
+
+    def test_release_success_increases(self):
+        """A limit's worth of fast queries should increase the limit by 1."""
+        limiter = AIMDLimiter(initial=2)
+        for _ in range(3):
+            limiter.acquire()
+            limiter.release(elapsed=0.01)
+        self.assertEqual(3, limiter.limit)
+        self.assertEqual(0, limiter.in_flight)
+
+    def test_release_failure_decreases_once(self):
+        """Failed or slow queries should decrease the limit, once a window."""
+        limiter = AIMDLimiter(initial=8, latency_threshold=60)
+        for _ in range(2):
+            limiter.acquire()
+        limiter.release(elapsed=0.01, failed=True)
+        self.assertEqual(4, limiter.limit)
+        limiter.release(elapsed=61)
+        self.assertEqual(4, limiter.limit)
+
+
+class TestCircuitBreaker(unittest.TestCase):
+
+    def test_opens_after_threshold(self):
+        """Consecutive failures should open the breaker and refuse queries."""
+        breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
+        self.assertFalse(breaker.allow())
+
+    def test_success_resets_failures(self):
+        """A success should reset the consecutive failure count."""
+        breaker = CircuitBreaker(failure_threshold=2)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_half_open_probe(self):
+        """After the timeout, one probe should be allowed to close it."""
+        breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state)
+        self.assertTrue(breaker.allow())
+        self.assertFalse(breaker.allow())
+        breaker.record_success()
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state)
+
+    def test_half_open_probe_failure(self):
+        """A failed probe should re-open the breaker."""
+        breaker = CircuitBreaker(failure_threshold=3, reset_timeout=0.05)
+        for _ in range(3):
+            breaker.record_failure()
+        time.sleep(0.06)
+        self.assertTrue(breaker.allow())
+        breaker.record_failure()
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state)
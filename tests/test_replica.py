@@ -0,0 +1,126 @@
+import unittest
+from tests.test_limesurvey import TestBase
+from limesurveyrc2api.limesurvey import LimeSurvey, LimeSurveyError
+from limesurveyrc2api.replica import ParticipantReplica
+from limesurveyrc2api.testing import RemoteControl, StandInServer
+
+
+class TestParticipantReplica(TestBase):
+
+    token_ids = None
+    participants = [
+        {"email": "r1@example.com", "firstname": "FN1", "lastname": "LN1"},
+        {"email": "r2@example.com", "firstname": "FN2", "lastname": "LN2"}]
+
+    def setUp(self):
+        self.replica = ParticipantReplica(self.api, self.survey_id)
+
+    def tearDown(self):
+        self.replica.close()
+        try:
+            self.api.token.delete_participants(
+                survey_id=self.survey_id, token_ids=self.token_ids)
+        except (LimeSurveyError, AssertionError):
+            pass
+
+    def test_sync_lookups_success(self):
+        """Synced participants should be found by tid, token and email."""
+        added = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=self.participants[:1])
+        self.token_ids = [x["tid"] for x in added]
+        self.replica.sync()
+
+        participant = self.replica.get(added[0]["tid"])
+        self.assertEqual("r1@example.com", participant["email"])
+        self.assertEqual("N", participant["completed"])
+        self.assertEqual(
+            participant, self.replica.get_by_token(added[0]["token"]))
+        self.assertIn(participant, self.replica.find_by_email("R1@example.com"))
+
+    def test_sync_incremental_success(self):
+        """An incremental sync should add new participants."""
+        self.replica.sync()
+        added = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=self.participants)
+        self.token_ids = [x["tid"] for x in added]
+
+        result = self.replica.sync()
+        self.assertEqual(2, result["added"])
+        for participant in added:
+            self.assertIsNotNone(self.replica.get(participant["tid"]))
+
+    def test_sync_full_removes_deleted(self):
+        """A full sync should remove participants deleted from the survey."""
+        added = self.api.token.add_participants(
+            survey_id=self.survey_id, participant_data=self.participants)
+        self.replica.sync()
+        self.api.token.delete_participants(
+            survey_id=self.survey_id, token_ids=[added[0]["tid"]])
+        self.token_ids = [added[1]["tid"]]
+
+        self.replica.sync(full=True)
+        self.assertIsNone(self.replica.get(added[0]["tid"]))
+        self.assertIsNotNone(self.replica.get(added[1]["tid"]))
+
+
+class TestParticipantReplicaStandIn(unittest.TestCase):
+
+    def setUp(self):
+        self.remote_control = remote_control = RemoteControl()
+        self.survey = remote_control.add_survey(participants=3)
+        server = StandInServer(remote_control)
+        server.start()
+        self.addCleanup(server.stop)
+        self.api = LimeSurvey(server.url, "admin")
+        self.api.open("admin")
+        self.replica = ParticipantReplica(self.api, self.survey.sid)
+        self.addCleanup(self.replica.close)
+
+    def test_sync_incremental_dates(self):
+        """An incremental sync should pick up newly completed participants."""
+        self.replica.sync()
+        self.survey.add_participants(1)
+        self.survey.participants[1]["completed"] = "2030-01-01 10:00"
+        self.assertEqual({"added": 1, "updated": 1}, self.replica.sync())
+        self.assertEqual("2030-01-01 10:00", self.replica.get(1)["completed"])
+
+    def test_unknown_status(self):
+        """A status instead of a page should be raised as an error."""
+        with self.assertRaises(LimeSurveyError) as ctx:
+            self.replica._pull({"tid": ["BETWEEN", 1, 2]})
+        self.assertEqual("Illegal operator: BETWEEN", ctx.exception.status)
+
+    def count_listed(self):
+        """Count the participants listed by the client, in a list."""
+        listed = []
+        list_participants = self.api.token.list_participants
+
+        def counting(*args, **kwargs):
+            page = list_participants(*args, **kwargs)
+            listed.append(len(page))
+            return page
+        self.api.token.list_participants = counting
+        return listed
+
+    def test_sync_incremental_transfer(self):
+        """An incremental sync without changes should list few rows."""
+        survey = self.remote_control.add_survey(participants=50)
+        for tid, participant in survey.participants.items():
+            if tid <= 10:
+                participant["sent"] = "2030-01-01 10:{0:02d}".format(tid)
+        replica = ParticipantReplica(self.api, survey.sid, page_size=20)
+        self.addCleanup(replica.close)
+        replica.sync()
+        listed = self.count_listed()
+        self.assertEqual({"added": 0, "updated": 1}, replica.sync())
+        # The sent values that aren't "N" (fewer than the "N" ones).
+        self.assertEqual(10, sum(listed))
+
+        for participant in survey.participants.values():
+            participant["sent"] = "2030-01-01 09:00"
+        survey.participants[50]["sent"] = "2030-01-02 09:00"
+        replica.sync(full=True)
+        del listed[:]
+        self.assertEqual({"added": 0, "updated": 1}, replica.sync())
+        # The sent values at or after the latest (fewer than the others).
+        self.assertEqual(1, sum(listed))
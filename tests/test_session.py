@@ -0,0 +1,89 @@
+import os
+import queue
+import tempfile
+import unittest
+from limesurveyrc2api.session import (
+    FileSessionStore, MemorySessionStore, SessionPool)
+
+
+class TestMemorySessionStore(unittest.TestCase):
+
+    url = "http://localhost/limesurvey/index.php/admin/remotecontrol"
+
+    def make_store(self, **kwargs):
+        return MemorySessionStore(**kwargs)
+
+    def test_get_missing(self):
+        """Getting a key that was not stored should return None."""
+        self.assertIsNone(self.make_store().get(self.url, "admin"))
+
+    def test_set_get(self):
+        """Getting a stored key should return it, per url and username."""
+        store = self.make_store()
+        store.set(self.url, "admin", "key1")
+        self.assertEqual("key1", store.get(self.url, "admin"))
+        self.assertIsNone(store.get(self.url, "other"))
+
+    def test_get_expired(self):
+        """Getting a key older than max_age should return None."""
+        store = self.make_store(max_age=0)
+        store.set(self.url, "admin", "key1")
+        self.assertIsNone(store.get(self.url, "admin"))
+
+    def test_delete_other_key(self):
+        """Deleting a key that was already replaced should keep the new one."""
+        store = self.make_store()
+        store.set(self.url, "admin", "key2")
+        store.delete(self.url, "admin", "key1")
+        self.assertEqual("key2", store.get(self.url, "admin"))
+        store.delete(self.url, "admin", "key2")
+        self.assertIsNone(store.get(self.url, "admin"))
+
+
+class TestFileSessionStore(TestMemorySessionStore):
+
+    def setUp(self):
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.temp_dir.name, "session_keys.json")
+
+    def tearDown(self):
+        self.temp_dir.cleanup()
+
+    def make_store(self, **kwargs):
+        return FileSessionStore(self.path, **kwargs)
+
+    def test_shared_between_stores(self):
+        """A key stored by one store should be read by another one."""
+        self.make_store().set(self.url, "admin", "key1")
+        self.assertEqual("key1", self.make_store().get(self.url, "admin"))
+
+    def test_lock_reentrant(self):
+        """Store methods should work while the store lock is held."""
+        store = self.make_store()
+        with store.lock(self.url, "admin"):
+            store.set(self.url, "admin", "key1")
+            self.assertEqual("key1", store.get(self.url, "admin"))
+
+
+class TestSessionPool(unittest.TestCase):
+
+    def test_lease_exclusive(self):
+        """A leased key should not be leased again until it is returned."""
+        pool = SessionPool(["key1", "key2"])
+        with pool.lease() as lease1:
+            with pool.lease() as lease2:
+                self.assertNotEqual(lease1.session_key, lease2.session_key)
+                with self.assertRaises(queue.Empty):
+                    with pool.lease(timeout=0.01):
+                        pass
+        with pool.lease(timeout=0.01) as lease3:
+            self.assertIn(lease3.session_key, ["key1", "key2"])
+
+    def test_lease_replaced_key(self):
+        """A replaced key should be returned to the pool instead."""
+        pool = SessionPool(["key1"])
+        with pool.lease() as lease:
+            lease.session_key = "key2"
+        self.assertEqual(["key2"], pool.session_keys)
+        with pool.lease(timeout=0.01) as lease:
+            self.assertEqual("key2", lease.session_key)
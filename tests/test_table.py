@@ -0,0 +1,72 @@
+import io
+import unittest
+from limesurveyrc2api.table import ParticipantTable
+
+
+class TestParticipantTable(unittest.TestCase):
+
+    participants = [
+        {"tid": "1", "token": "a", "completed": "N",
+         "participant_info": {"email": "a@example.com", "firstname": "A"}},
+        {"tid": "2", "token": "b", "completed": "2020-01-01 10:00",
+         "participant_info": {"email": "b@example.com", "firstname": "B"}},
+        {"tid": "3", "token": "c", "completed": "N", "attribute_1": "x",
+         "participant_info": {"email": "c@example.com", "firstname": "C"}}]
+
+    def setUp(self):
+        self.table = ParticipantTable(self.participants)
+
+    def test_columns(self):
+        """Rows should be flattened into typed columns."""
+        self.assertEqual(3, len(self.table))
+        self.assertEqual([1, 2, 3], self.table.column("tid"))
+        self.assertEqual(
+            ["N", "2020-01-01 10:00", "N"], self.table.column("completed"))
+        self.assertEqual(
+            ["N", "2020-01-01 10:00"],
+            self.table.columns["completed"].categories)
+        self.assertEqual(
+            ["a@example.com", "b@example.com", "c@example.com"],
+            self.table.column("email"))
+
+    def test_late_field_filled(self):
+        """A field first seen in a later row should be None before it."""
+        self.assertEqual([None, None, "x"], self.table.column("attribute_1"))
+
+    def test_rows(self):
+        """Rows should be records with a slot per field."""
+        row = self.table.row(1)
+        self.assertEqual(2, row.tid)
+        self.assertEqual("B", row.firstname)
+        self.assertFalse(hasattr(row, "__dict__"))
+        self.assertEqual(row, list(self.table)[1])
+
+    def test_fields_selected(self):
+        """Only the given fields should be kept, in order."""
+        table = ParticipantTable(self.participants, fields=["email", "tid"])
+        self.assertEqual(["email", "tid"], table.fields)
+        self.assertEqual({"email": "c@example.com", "tid": 3},
+                         table.row(-1).as_dict())
+
+    def test_to_csv(self):
+        """CSV output should have a header, and empty values for None."""
+        table = ParticipantTable(
+            self.participants, fields=["tid", "attribute_1"])
+        output = io.StringIO(newline="")
+        table.to_csv(output)
+        self.assertEqual(
+            "tid,attribute_1\r\n1,\r\n2,\r\n3,x\r\n", output.getvalue())
+
+    def test_to_buffers(self):
+        """Buffers should follow the Arrow array layouts."""
+        buffers = self.table.to_buffers()
+        self.assertEqual([1, 2, 3], list(buffers["tid"]["values"]))
+        token = buffers["token"]
+        self.assertEqual([0, 1, 2, 3], list(token["offsets"]))
+        self.assertEqual(b"abc", token["data"])
+        attribute = buffers["attribute_1"]
+        self.assertEqual(b"\x04", attribute["validity"])
+        completed = buffers["completed"]
+        self.assertEqual([0, 1, 0], list(completed["indices"]))
+        self.assertEqual(
+            b"N2020-01-01 10:00", completed["dictionary"]["data"])
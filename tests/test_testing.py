@@ -0,0 +1,98 @@
+import time
+import unittest
+from limesurveyrc2api.exceptions import LimeSurveyError
+from limesurveyrc2api.limesurvey import LimeSurvey
+from limesurveyrc2api.policy import RetryPolicy
+from limesurveyrc2api.testing import (
+    DISCONNECT, RemoteControl, StandInServer, TRUNCATE)
+
+
+class TestStandInServer(unittest.TestCase):
+
+    def setUp(self):
+        self.remote_control = RemoteControl(email_batch_size=2)
+        self.survey = self.remote_control.add_survey(participants=3)
+        self.server = StandInServer(self.remote_control)
+        self.server.start()
+        self.addCleanup(self.server.stop)
+        self.api = LimeSurvey(
+            self.server.url, "admin",
+            retry_policy=RetryPolicy(max_attempts=2, backoff=0))
+        self.addCleanup(self.api.transport.close)
+
+    def test_open_invalid_password(self):
+        """Opening with a wrong password should fail like LimeSurvey."""
+        with self.assertRaises(LimeSurveyError) as ctx:
+            self.api.open("wrong")
+        self.assertEqual("Invalid user name or password", ctx.exception.status)
+
+    def test_list_participants(self):
+        """Participants should be listed, or the 'not found' status given."""
+        self.api.open("admin")
+        participants = self.api.token.list_participants(self.survey.sid)
+        self.assertEqual(3, len(participants))
+        empty = self.remote_control.add_survey()
+        with self.assertRaises(LimeSurveyError) as ctx:
+            self.api.token.list_participants(empty.sid)
+        self.assertEqual("No survey participants found.", ctx.exception.status)
+
+    def test_invite_batches(self):
+        """Invites should be sent in batches, with the number left to send."""
+        self.api.open("admin")
+        result = self.api.token.invite_participants(self.survey.sid, None)
+        self.assertEqual("1 left to send", result["status"])
+        self.assertEqual(2, len(self.remote_control.sent_emails))
+
+    def test_inject_http_status(self):
+        """An injected 503 should be retried by the client's policy."""
+        self.api.open("admin")
+        self.server.inject(503, method="list_surveys")
+        surveys = self.api.survey.list_surveys()
+        self.assertEqual([str(self.survey.sid)], [x["sid"] for x in surveys])
+        self.assertEqual(3, self.server.requests)
+
+    def test_inject_broken_response(self):
+        """
+        A dropped connection or truncated body should raise an error. The
+        truncated request has still been processed.
+        """
+        self.api.open("admin")
+        for error in (DISCONNECT, TRUNCATE):
+            self.server.inject(error)
+            with self.assertRaises(Exception):
+                self.api.token.add_participants(
+                    self.survey.sid, [{"email": "a@example.com"}])
+        self.assertEqual(4, len(self.survey.participants))
+
+    def test_expired_session(self):
+        """The client should re-authenticate when its session expires."""
+        self.api.open("admin")
+        old_key = self.api.session_key
+        self.remote_control.expire_sessions()
+        self.assertEqual(3, len(
+            self.api.token.list_participants(self.survey.sid)))
+        self.assertNotEqual(old_key, self.api.session_key)
+
+    def test_latency(self):
+        """Each response should be delayed by the latency."""
+        self.server.latency = 0.05
+        start = time.perf_counter()
+        self.api.open("admin")
+        self.assertLessEqual(0.05, time.perf_counter() - start)
+
+    def test_conditions(self):
+        """Only LimeSurvey's condition operators should be accepted."""
+        key = self.remote_control.call("get_session_key", ["admin", "admin"])
+
+        def listed(conditions):
+            return self.remote_control.call("list_participants", [
+                key, self.survey.sid, 0, 10, False, False, conditions])
+        self.assertEqual([2, 3], [
+            x["tid"] for x in listed({"tid": [">=", 2]})])
+        self.assertEqual([1, 3], [
+            x["tid"] for x in listed({"tid": ["IN", "1", "3"]})])
+        self.assertEqual(1, len(listed({"email": ["LIKE", "%2@example%"]})))
+        for operator in ("BETWEEN", "!="):
+            self.assertEqual(
+                {"status": "Illegal operator: " + operator},
+                listed({"tid": [operator, 1, 2]}))
@@ -0,0 +1,103 @@
+import unittest
+from limesurveyrc2api.limesurvey import LimeSurvey
+from limesurveyrc2api.tracing import (
+    current_span, RecordingTracer, start_span, traced)
+from limesurveyrc2api._concurrency import bounded_map
+from tests.test_metrics import StubTransport
+
+
+class Operations(object):
+
+    def __init__(self, tracer):
+        self.api = self
+        self.tracer = tracer
+
+    @traced
+    def count(self, survey_id, n):
+        for i in range(n):
+            with start_span("item", {"chunk.index": i}):
+                pass
+            yield current_span()
+
+    @traced
+    def fail(self, survey_id):
+        raise ValueError("failed")
+
+
+class TestTracing(unittest.TestCase):
+
+    def setUp(self):
+        self.tracer = RecordingTracer()
+
+    def test_no_tracer(self):
+        """Without a tracer, no span should be started."""
+        with start_span("operation") as span:
+            self.assertIsNone(span)
+        self.assertEqual([1, 2], list(bounded_map(lambda x: x, [1, 2])))
+        self.assertEqual([None], list(Operations(None).count(1, 1)))
+
+    def test_nesting(self):
+        """Spans should nest, and inherit the chunk index."""
+        with start_span("operation", {"survey_id": 1}, self.tracer) as root:
+            self.assertIs(root, current_span())
+            with start_span("chunk", {"chunk.index": 3}):
+                with start_span("query", {"rpc.method": "x"}) as query:
+                    pass
+        self.assertIsNone(current_span())
+        self.assertEqual(
+            {"rpc.method": "x", "chunk.index": 3}, query.attributes)
+        self.assertEqual(["chunk"], [
+            x.name for x in self.tracer.children(root)])
+        self.assertEqual([root], self.tracer.children(None))
+
+    def test_threads(self):
+        """Calls in bounded_map should nest under the caller's span."""
+        def work(item):
+            with start_span("item", {"chunk.index": item}) as span:
+                return span
+        with start_span("operation", tracer=self.tracer) as root:
+            spans = list(bounded_map(work, range(4), max_workers=2))
+        self.assertEqual([root] * 4, [x.parent for x in spans])
+
+    def test_traced_generator(self):
+        """A traced generator's span should only be current while it runs."""
+        operations = Operations(self.tracer)
+        spans = []
+        for span in operations.count(survey_id=5, n=3):
+            self.assertIsNone(current_span())
+            spans.append(span)
+        root = spans[0]
+        self.assertEqual("count", root.name)
+        self.assertEqual({"survey_id": 5}, root.attributes)
+        self.assertEqual(3, len(self.tracer.children(root)))
+        self.assertIsNotNone(root.end)
+
+    def test_traced_error(self):
+        """A traced method's error should be recorded on its span."""
+        with self.assertRaises(ValueError):
+            Operations(self.tracer).fail(1)
+        span = self.tracer.spans[0]
+        self.assertIsInstance(span.error, ValueError)
+
+    def test_bulk_query_spans(self):
+        """Queries of a bulk operation should nest under its chunks."""
+        added = [{"tid": "1", "email": "a"}, {"tid": "2", "email": "b"}]
+        transport = StubTransport(
+            [(200, "key"), (200, added[:1]), (200, added[1:])])
+        api = LimeSurvey("http://example.com", "admin", transport=transport,
+                         tracer=self.tracer)
+        api.open("password")
+        result = api.token.add_participants_bulk(
+            1, [{"email": "a"}, {"email": "b"}], chunk_size=1,
+            max_workers=1)
+        self.assertTrue(result.ok)
+        login, operation = self.tracer.children(None)
+        self.assertEqual("get_session_key", login.name)
+        self.assertEqual("add_participants_bulk", operation.name)
+        chunks = self.tracer.children(operation)
+        self.assertEqual([0, 1], [x.attributes["chunk.index"] for x in chunks])
+        query = self.tracer.children(chunks[1])[0]
+        self.assertEqual(
+            {"rpc.system": "jsonrpc", "rpc.method": "add_participants",
+             "survey_id": 1, "chunk.index": 1, "result.size": 1},
+            query.attributes)